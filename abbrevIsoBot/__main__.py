@@ -3,42 +3,92 @@
 The bot scrapes {{infobox journal}}s, computes ISO 4 abbreviations of titles,
 creates and fixes redirects and the `abbreviation` parameter.
 """
-import json
 import logging
 import re
 import sys
+import time
 from collections import defaultdict
 from datetime import datetime, timedelta, timezone
-from typing import Any, DefaultDict, Dict, Optional, Tuple
+from typing import Any, DefaultDict, Dict, List, NamedTuple, Optional, Set, \
+    Tuple
 from enum import auto, Flag
 from unidecode import unidecode
 
-import Levenshtein
 import pywikibot
 import pywikibot.data.api
 from pywikibot import Site
 
-from abbrevIsoBot import reports, state, fill, abbrevUtils, databases
-from utils import initLimits, printLimits, trySaving, tryPurging, \
-    getRedirectsToPage, getPagesWithTemplate, getInfoboxJournals
+from abbrevIsoBot import reports, state, fill, abbrevUtils, databases, ltwa, \
+    collisions, nearest, patchset
+from utils import initLimits, printLimits, printRunStats, trySaving, \
+    tryPurging, getRedirectsToPage, getPagesWithTemplate, getInfoboxJournals, \
+    isAllowedTitle, getPageState, prefetchPageStates, refreshPageStates, \
+    getExistingTitles, cachePage, normalizeTitle, initProfiling, phase, \
+    timedIter
 
 
 STATE_FILE_NAME = 'abbrevIsoBot/abbrevBotState.json'
+# Compact snapshot of the last published report rows, to report changes.
+REPORT_SNAPSHOT_FILE_NAME = 'abbrevIsoBot/reportSnapshot.json'
+# Command of a worker computing missing abbrevs during the run (see
+# `state.WorkerAbbrevProvider`), e.g. ['node', '../abbrevIso/worker.js'].
+# If None, $TOKENZERO_ABBREV_WORKER is used, if set; otherwise missing abbrevs
+# wait for exampleScript.js.
+ABBREV_WORKER_COMMAND: Optional[List[str]] = None
+# LTWA csv file, to compute missing abbrevs in-process instead (see `ltwa`),
+# if the matcher agrees with the stored abbrevs (`ltwa.makeProvider()`).
+LTWA_FILE_NAME: Optional[str] = None
+# After a full scrape with `report` (only that stage sweeps, once a week),
+# forget pages not scraped and titles whose abbrevs were not used since the
+# last STATE_MAX_AGE reports, except titles pinned by other bots (omicsBot's
+# lists); keep at most STATE_MAX_ABBREVS unpinned titles (the most recently
+# used ones), if not None.
+STATE_MAX_AGE = 8
+STATE_MAX_ABBREVS: Optional[int] = None
 # Dicts from issn to abbrev in NLM/PubMed or MathSciNet database.
 issnToAbbrev: Dict[str, Dict[str, str]] = {'nlm': {}, 'mathscinet': {}}
-
+# Abbrevs of all journals (from the previous scrape), to find collisions.
+abbrevIndex = collisions.AbbrevIndex()
+# ISO-4 redirects reported as belonging to another journal, to their targets.
+misattributedRedirects: Dict[str, str] = {}
+
+
+class LanguageMismatch(NamedTuple):
+    """An infobox abbrev that is the computed one for another language."""
+
+    pageTitle: str
+    infoboxId: int
+    # The abbreviation param, unsanitized.
+    infoboxAbbrev: str
+    computedAbbrev: str
+    matchingPatterns: str
+
+
+# Language mismatches found while fixing pages, to patch once all are found.
+languageMismatches: List[LanguageMismatch] = []
+# Number of titles of a patchlist fetched and abbreviated together.
+PATCHLIST_BATCH_SIZE = 500
+# Whether to write edits in patchsets as splices of the base revision,
+# instead of full old and new texts (see `patchset`).
+COMPACT_PATCHES = False
 # Patchset to propose for Stitchpitch
-patchset: Dict[str, Any] = {
-    'patchtype': 'list',
-    'slug': 'ISO-4 language interpretation fix',
-    'patches': []
-}
+patchWriter = patchset.PatchsetWriter('ISO-4 language interpretation fix',
+                                      compact=COMPACT_PATCHES)
+# Whether the local clock was already checked against the server's.
+_serverTimeChecked = False
 
 
 def main() -> None:
     """Execute the bot."""
     logging.basicConfig(level=logging.WARNING)
+    initProfiling('abbrevIsoBot')
     state.loadOrInitState(STATE_FILE_NAME)
+    ltwaProvider = ltwa.makeProvider(LTWA_FILE_NAME) if LTWA_FILE_NAME \
+        else None
+    if ltwaProvider is not None:
+        state.setAbbrevProvider(ltwaProvider)
+    else:
+        state.initAbbrevProvider(ABBREV_WORKER_COMMAND)
     # Initialize pywikibot.
     assert Site().code == 'en'
     initLimits(
@@ -67,11 +117,14 @@ def main() -> None:
     else:
         printHelp()
     state.saveState(STATE_FILE_NAME)
+    printRunStats()
 
 
 def printHelp() -> None:
     """Print a simple help message on available commands."""
     print("Use exactly one command of: scrape, fixpages, report, test, fill")
+    print("(report accepts --debug to also print verbose dumps)")
+    print("(all accept --profile[=cpu,mem] to write a profile to profiles/)")
 
 
 def doTest() -> None:
@@ -96,11 +149,26 @@ def doScrape(fixPages: bool = False, writeReport: bool = False) -> None:
         fixPages: Whether to actually fix any pages, or only scrape.
         writePages: Whether to write the reports.
     """
-    issnToAbbrev['nlm'] = databases.parseNLMDict()
-    issnToAbbrev['mathscinet'] = databases.parseMSNDict()
+    with phase('database load'):
+        issnToAbbrev['nlm'] = databases.parseNLMDict()
+        issnToAbbrev['mathscinet'] = databases.parseMSNDict()
     print(f'Loaded databases nlm={len(issnToAbbrev["nlm"])}'
           f' msn={len(issnToAbbrev["mathscinet"])}')
-    articles = getPagesWithTemplate('Infobox journal', content=True)
+    if fixPages:
+        with phase('collision index'):
+            abbrevIndex.rebuild(issnToAbbrev)
+            nCollisions = collisions.reportCollisions(abbrevIndex)
+        print(f'Indexed {len(abbrevIndex.sources)} abbrevs, '
+              f'{nCollisions} shared by several journals.')
+        with phase('nearest abbrevs'):
+            tree = nearest.buildAbbrevTree(abbrevIndex)
+            misattributedRedirects.clear()
+            misattributedRedirects.update(
+                nearest.reportMisattributedRedirects(abbrevIndex, tree))
+        print(f'Found {len(misattributedRedirects)} ISO-4 redirects closer '
+              f'to abbrevs of other journals.')
+    articles = timedIter(getPagesWithTemplate('Infobox journal', content=True),
+                         'enumeration')
     # articles = [pywikibot.Page(Site(), 'Asiatic Society of Japan')]
     # articles = [pywikibot.Page(Site(), 'Annals of Mathematics')]
     # Yields ~8000 pages.
@@ -110,23 +178,41 @@ def doScrape(fixPages: bool = False, writeReport: bool = False) -> None:
     if True:
         for i, page in enumerate(articles):
             print(f'--Scraping:\t{i}\t{page.title()}\t', end='', flush=True)
-            scrapePage(page)
+            with phase('parse'):
+                scrapePage(page)
             if fixPages:
-                fixPageRedirects(page)
+                with phase('fix redirects'):
+                    fixPageRedirects(page)
+    if fixPages:
+        with phase('language mismatch patches'):
+            nPatches = writeLanguageMismatchPatches()
+        print(f'Wrote {nPatches} language mismatch patches.')
     if writeReport:
-        reports.doReport(Site(), printOnly=False)
+        reports.doReport(Site(), printOnly=False,
+                         debug='--debug' in sys.argv,
+                         snapshotFileName=REPORT_SNAPSHOT_FILE_NAME)
+    if writeReport:
+        # Only now all still relevant pages and abbrevs have been marked as
+        # used. Other stages don't sweep, so a generation is one week.
+        stats = state.sweep(STATE_MAX_AGE, STATE_MAX_ABBREVS)
+        print(f'Swept state generation {stats.generation}: '
+              f'evicted {stats.pagesEvicted} pages, {stats.abbrevsEvicted} '
+              f'stale and {stats.abbrevsOverBudget} over-budget abbrevs, '
+              f'dropped {stats.redirectTextsDropped} redirect texts and '
+              f'{stats.patternsDropped} patterns; left {stats.pagesLeft} '
+              f'pages, {stats.abbrevsLeft} abbrevs.')
 
 
 def scrapePage(page: pywikibot.Page) -> None:
     """Scrape a page's infoboxes and redirects, save them in the `state`."""
     pageData: Any = {'infoboxes': [], 'redirects': {}}
     # Iterate over {{infobox journal}}s on `page`.
-    for infobox in getInfoboxJournals(page):
+    for infoboxId, infobox in enumerate(getInfoboxJournals(page)):
         print('I', end='', flush=True)
         pageData['infoboxes'].append(infobox)
         if 'title' in infobox and infobox['title'] != '':
             state.saveTitleToAbbrev(infobox['title'])
-        checkDBAbbrevs(page.title(), infobox)
+        checkDBAbbrevs(page.title(), infobox, infoboxId)
     # Iterate over pages that are redirects to `page`.
     for r in getRedirectsToPage(page.title(), namespaces=0,
                                 total=100, content=True):
@@ -138,7 +224,8 @@ def scrapePage(page: pywikibot.Page) -> None:
     print('', flush=True)
 
 
-def checkDBAbbrevs(pageTitle: str, infobox: Dict[str, str]) -> bool:
+def checkDBAbbrevs(pageTitle: str, infobox: Dict[str, str],
+                   infoboxId: int = 0) -> bool:
     """Check abbreviation from NLM/PubMed and MathSciNet databases."""
     issns = []
     if infobox.get('issn'):
@@ -157,7 +244,7 @@ def checkDBAbbrevs(pageTitle: str, infobox: Dict[str, str]) -> bool:
                         reports.reportBadDBAbbrev(
                             pageTitle, iTitle,
                             iAbbrev,
-                            infobox[t], shouldHave, issn, t)
+                            infobox[t], shouldHave, issn, t, infoboxId)
                     return False
                 else:
                     regexToCut = r'[^A-Za-z]'  # r'[ .:()\-]'
@@ -167,7 +254,7 @@ def checkDBAbbrevs(pageTitle: str, infobox: Dict[str, str]) -> bool:
                         reports.reportBadDBAbbrev(
                             pageTitle, iTitle,
                             iAbbrev,
-                            '', shouldHave, issn, t)
+                            '', shouldHave, issn, t, infoboxId)
                         return False
     return True
 
@@ -176,14 +263,28 @@ def fixPageRedirects(page: pywikibot.Page) -> int:
     """Fix redirects to given page."""
     title = page.title()
     pageData = state.getPageData(title)
-    (requiredRedirects, skip) = getRequiredRedirects(page)
+    with phase('required redirects'):
+        (requiredRedirects, skip) = getRequiredRedirects(page)
     nEditedPages = 0
+    with phase('existence checks'):
+        # Disallowed titles are rejected (once) before any query.
+        newRedirects = {rTitle for rTitle in requiredRedirects
+                        if rTitle not in pageData['redirects']
+                        and isAllowedTitle(rTitle)}
+        prefetchPageStates(rTitle for rTitle in newRedirects
+                           if not abbrevIndex.getOtherPages(rTitle, title))
     for rTitle, rCats in requiredRedirects.items():
         rNewContent = rcatSetToRedirectContent(title, rCats)
         # Attempt to create new redirect.
         if rTitle not in pageData['redirects']:
+            if rTitle not in newRedirects:
+                continue
+            if abbrevIndex.getOtherPages(rTitle, title):
+                print(f'--Skipping [[{rTitle}]], an abbrev shared with '
+                      f'other journals (see collisions report).')
+                continue
             try:
-                exists = pywikibot.Page(Site(), rTitle).exists()
+                exists = getPageState(rTitle).exists
             except pywikibot.exceptions.InvalidTitle:
                 exists = False
             if exists:
@@ -191,7 +292,7 @@ def fixPageRedirects(page: pywikibot.Page) -> int:
                       f'(not a redirect to [[{title}]]).')
                 if title == rTitle:
                     continue
-                if title not in pywikibot.Page(Site(), rTitle).text:
+                if title not in (getPageState(rTitle).text or ''):
                     reports.reportExistingOtherPage(title, rTitle)
             else:
                 print(f'--Creating redirect '
@@ -259,7 +360,9 @@ def fixPageRedirects(page: pywikibot.Page) -> int:
                     if cAbbrevAll != rTitle.replace('.', ''):
                         potentialAbbrevs.append((cAbbrevAll, rTitle))
         expectedAbbrevs = [a for a in expectedAbbrevs if a]
-        potentialAbbrevs = [(a, t) for (a, t) in potentialAbbrevs if a]
+        potentialIndex = abbrevUtils.SoftMatchIndex(
+            (a, t) for (a, t) in potentialAbbrevs if a)
+        requiredTree: Optional[nearest.BKTree] = None
         for rTitle, rContent in pageData['redirects'].items():
             if not re.search(r'R from ISO 4', rContent):
                 continue
@@ -271,25 +374,25 @@ def fixPageRedirects(page: pywikibot.Page) -> int:
                 if re.sub(r'\s*[:(].*', '', computedAbbrev) in rTitleDotless:
                     isExpected = True
                     break
+            if not isExpected and misattributedRedirects.get(rTitle) == title:
+                # Already reported as belonging to another journal.
+                continue
             if not isExpected:
                 # Find other titles in existing redirects
                 # that would ISO-4 abbreviate to it
-                potentials = [t for (a, t) in potentialAbbrevs
-                              if abbrevUtils.isSoftMatch(rTitleDotless, a)]
-                potentials = list(sorted(set(potentials)))
-                # Find closest computed abbrev.
-                bestAbbrev = ''
-                bestDist = len(rTitle)
-                for computedAbbrev in sorted(requiredRedirects):
-                    dist = Levenshtein.distance(rTitle, computedAbbrev)
-                    if dist < bestDist:
-                        bestDist = dist
-                        bestAbbrev = computedAbbrev
+                potentials = potentialIndex.getTitles(rTitleDotless)
+                # Find closest computed abbrev, in a tree built once per page
+                # (abbrevs len(rTitle) or more away lose to the empty one).
+                if requiredTree is None:
+                    requiredTree = nearest.BKTree(requiredRedirects)
+                bestDist, bestAbbrevs = requiredTree.nearest(
+                    rTitle, min(8, len(rTitle) - 1))
                 # Skip if closest abbrev. is far (assume it's from a former
                 # title, since there's a ton of cases like that).
                 if bestDist <= 8:
                     reports.reportSuperfluousRedirect(
-                        title, rTitle, rContent, bestAbbrev, potentials)
+                        title, rTitle, rContent,
+                        bestAbbrevs[0] if bestAbbrevs else '', potentials)
     return nEditedPages
 
 
@@ -332,7 +435,7 @@ def getRequiredRedirects(page: pywikibot.Page) \
         if ':' in iAbbrev[:5]:
             print(f'--Abbrev contains early colon, ignoring [[{title}]].')
             reports.reportTitleWithColon(
-                title, iTitle, iAbbrev)
+                title, iTitle, iAbbrev, infoboxId)
             skip = True
             continue
         hasISO4Redirect = \
@@ -347,33 +450,33 @@ def getRequiredRedirects(page: pywikibot.Page) \
         if cAbbrev is None or cAltAbbrev is None:
             skip = True
             continue
-        if (not abbrevUtils.isSoftMatch(iAbbrev, cAbbrev)
-                and not abbrevUtils.isSoftMatch(iAbbrev, cAltAbbrev)):
+        iAbbrevKey = abbrevUtils.softMatchKey(iAbbrev)
+        if (iAbbrevKey != abbrevUtils.softMatchKey(cAbbrev)
+                and iAbbrevKey != abbrevUtils.softMatchKey(cAltAbbrev)):
             print(f'--Abbreviations don\'t match, ignoring [[{title}]].')
             otherAbbrevs = list(state.getAllAbbrevs(name).values())
             otherAbbrevs = [a for a in otherAbbrevs
-                            if abbrevUtils.isSoftMatch(iAbbrev, a)]
+                            if abbrevUtils.softMatchKey(a) == iAbbrevKey]
             if otherAbbrevs:
                 reports.reportLanguageMismatch(
                     title, iTitle,
                     iAbbrev, cAbbrev, otherAbbrevs[0],
                     abbrevUtils.sanitizeField(infobox.get('language', '')),
                     abbrevUtils.sanitizeField(infobox.get('country', '')),
-                    cLang, state.getMatchingPatterns(name), hasISO4Redirect)
-                patch = makeLanguageMismatchPatch(
-                    page, infoboxId, infobox.get('abbreviation'), cAbbrev,
-                    state.getMatchingPatterns(name)
-                )
-                if patch is not None:
-                    patchset['patches'].append(patch)
-                    print(f'ADDED PATCH #{len(patchset["patches"])}!!!')
-                    with open('patchset.json', 'wt') as f:
-                        json.dump(patchset, f)
+                    cLang, state.getMatchingPatterns(name), hasISO4Redirect,
+                    infoboxId)
+                languageMismatches.append(LanguageMismatch(
+                    title, infoboxId, infobox.get('abbreviation'), cAbbrev,
+                    state.getMatchingPatterns(name)))
+                # Keep its revision for the patch (few pages, unlike all
+                # scraped ones).
+                cachePage(page)
             else:
                 reports.reportProperMismatch(
                     title, iTitle,
                     iAbbrev, cAbbrev, cLang,
-                    state.getMatchingPatterns(name), hasISO4Redirect)
+                    state.getMatchingPatterns(name), hasISO4Redirect,
+                    infoboxId)
             continue
         if iAbbrevDotless == iAbbrev:
             print(f'--Abbreviation is trivial (has no dots), '
@@ -381,7 +484,7 @@ def getRequiredRedirects(page: pywikibot.Page) \
             skip = True
             reports.reportTrivialAbbrev(
                 title, iTitle,
-                iAbbrev, pageData['redirects'])
+                iAbbrev, pageData['redirects'], infoboxId)
         else:
             result[iAbbrev] |= RCatSet.ISO4
             result[iAbbrevDotless] |= RCatSet.ISO4
@@ -549,39 +652,95 @@ def datetimeFromPWB(t: pywikibot.Timestamp) -> datetime:
     return d
 
 
-def makeLanguageMismatchPatch(
-        page: pywikibot.Page,
-        infoboxId: int,
-        infoboxAbbrev: str,
-        computedAbbrev: str,
-        matchingPatterns: str
-) -> Optional[Dict[str, Any]]:
-    """Make patchset for Stitchpitch: infobox param and redirects rcats."""
-    from unicodedata import normalize
-    import mwparserfromhell
-    startTimeStamp = datetime.now(timezone.utc).isoformat()
+def checkServerTime() -> None:
+    """Check that the local clock agrees with the server's (once per run)."""
+    global _serverTimeChecked  # pylint: disable=global-statement
+    if _serverTimeChecked:
+        return
     diff = datetimeFromPWB(Site().server_time()) - datetime.now(timezone.utc)
     if diff > timedelta(minutes=2) or -diff > timedelta(minutes=2):
         raise Exception('Local zone misconfigured or server timezone not UTC!')
-    latestRevision = page.latest_revision
-    mainEdit = {
+    _serverTimeChecked = True
+
+
+def getShouldHaveRedirects(computedAbbrev: str) -> List[str]:
+    """Return titles of ISO-4 redirects a patch makes sure exist."""
+    shouldHave = [computedAbbrev]
+    if computedAbbrev.replace('.', '') != computedAbbrev:
+        shouldHave.append(computedAbbrev.replace('.', ''))
+    return [abbrev for abbrev in shouldHave if isAllowedTitle(abbrev)]
+
+
+def writeLanguageMismatchPatches() -> int:
+    """Patch all `languageMismatches` found, return the number of patches.
+
+    Latest revisions of the pages, of their redirects (as saved in the state)
+    and of redirects to create are all fetched in batches first; the pages
+    cached when their mismatch was found are reused if still at the latest
+    revid.
+    Patches are streamed to `patchWriter`, assembled at the end.
+    """
+    if not languageMismatches:
+        return 0
+    checkServerTime()
+    titles = []
+    for mismatch in languageMismatches:
+        titles.append(mismatch.pageTitle)
+        titles.extend(state.getPageData(mismatch.pageTitle)['redirects'])
+        titles.extend(getShouldHaveRedirects(mismatch.computedAbbrev))
+    refreshPageStates(titles)
+    for mismatch in languageMismatches:
+        patch = makeLanguageMismatchPatch(mismatch)
+        if patch is not None:
+            patchWriter.add(patch)
+            print(f'ADDED PATCH #{patchWriter.nPatches}!!!')
+    languageMismatches.clear()
+    return patchWriter.close()
+
+
+def makeRevisionEdit(title: str, slug: str, newText: str,
+                     startTimeStamp: str) -> Dict[str, Any]:
+    """Make an edit patch of a page's cached latest revision."""
+    pageState = getPageState(title)
+    assert pageState.timestamp is not None
+    return {
         'patchtype': 'edit',  # implies 'nocreate': True
-        'slug': f'{infoboxAbbrev} → {computedAbbrev}',
-        'details': matchingPatterns,
-        'title': page.title(),
+        'slug': slug,
+        'title': title,
         'summary': 'Fix ISO-4 abbreviation to use all language rules.',
         'minor': True,
-        'basetimestamp': datetimeFromPWB(latestRevision.timestamp).isoformat(),
+        'basetimestamp': datetimeFromPWB(pageState.timestamp).isoformat(),
         'starttimestamp': startTimeStamp,
-        'oldtext': latestRevision.text,
-        'oldrevid': latestRevision.revid
+        'oldtext': pageState.text,
+        'oldrevid': pageState.revid,
+        'text': newText
     }
+
+
+def makeLanguageMismatchPatch(
+        mismatch: LanguageMismatch) -> Optional[Dict[str, Any]]:
+    """Make patchset for Stitchpitch: infobox param and redirects rcats.
+
+    Uses the cached states of pages, see `writeLanguageMismatchPatches()`.
+    """
+    from unicodedata import normalize
+    import mwparserfromhell
+    title, infoboxId, infoboxAbbrev, computedAbbrev, matchingPatterns = \
+        mismatch
+    startTimeStamp = datetime.now(timezone.utc).isoformat()
+    pageState = getPageState(title)
+    if not pageState.exists or pageState.text is None:
+        print(f'Skipping patch for "{title}": page is gone.')
+        return None
+    mainEdit = makeRevisionEdit(title, f'{infoboxAbbrev} → {computedAbbrev}',
+                                pageState.text, startTimeStamp)
+    mainEdit['details'] = matchingPatterns
     if datetime.fromisoformat(mainEdit['basetimestamp']) > \
        datetime.fromisoformat(startTimeStamp) - timedelta(hours=5):
-        print(f'Skipping patch for "{page.title()}":'
+        print(f'Skipping patch for "{title}":'
               f' edited a short while ago ago.')
         return None
-    code = mwparserfromhell.parse(normalize('NFC', latestRevision.text))
+    code = mwparserfromhell.parse(normalize('NFC', pageState.text))
     foundInfobox = None  # type: Optional[mwparserfromhell.Template]
     foundId = -1
     for t in code.filter_templates():
@@ -592,12 +751,12 @@ def makeLanguageMismatchPatch(
                 foundInfobox = t
                 break
     if not foundInfobox:
-        print(f'Skipping patch for "{page.title()}":'
+        print(f'Skipping patch for "{title}":'
               f' infobox #{infoboxId} not found.')
         return None
     foundAbbrev = str(foundInfobox.get('abbreviation').value)
     if foundAbbrev.strip() != infoboxAbbrev:
-        print(f'Skipping patch for "{page.title()}":'
+        print(f'Skipping patch for "{title}":'
               f' infobox abbrev mismatch (comments?).')
         return None
     foundInfobox.get('abbreviation').value = \
@@ -609,20 +768,22 @@ def makeLanguageMismatchPatch(
 
     regex = r' *{{\s*(r|R) from ISO ?4( abbreviation)?\s*}} *\n?'
     abbrevRegex = r'{{\s*(r|R)(edirect)? (from )?(common )?ab[a-z]*\s*}}'
-    for rPage in getRedirectsToPage(page.title(), namespaces=0,
-                                    total=100, content=True):
-        rTitle = rPage.title()
-        rRevision = rPage.latest_revision
+    for rTitle in state.getPageData(title)['redirects']:
+        rState = getPageState(rTitle)
+        if not rState.isRedirect() or rState.text is None or \
+           rState.redirectTarget.partition('#')[0] != normalizeTitle(title):
+            print(f'Skipping patch for page no longer a redirect: {rTitle}')
+            continue
+        rText = rState.text
         cAbbrev = abbrevUtils.stripTitle(computedAbbrev.lower())
         if cAbbrev + ' ' in rTitle.lower() + ' ' or \
            cAbbrev.replace('.', '') + ' ' in rTitle.lower() + ' ':
-            newtext = rRevision.text
+            newtext = rText
             if re.search(regex, newtext):
                 print(f'Skipping patch for existing page, already marked: {rTitle}')
                 groupDetails += 'ok: ' + rTitle + '\n'
                 continue
-            if not isReplaceableRedirect(rRevision.text, page.title(),
-                                         RCatSet.ISO4):
+            if not isReplaceableRedirect(rText, title, RCatSet.ISO4):
                 print(f'Skipping patch for unreplaceable page: {rTitle}')
                 groupDetails += 'unrepl: ' + rTitle + '\n'
                 continue
@@ -630,34 +791,13 @@ def makeLanguageMismatchPatch(
                 newtext = re.sub(abbrevRegex, '{{R from ISO 4}}', newtext, 1)
             else:
                 newtext += '\n{{R from ISO 4}}'
-            markPatch = {
-                'patchtype': 'edit',
-                'slug': 'mark new?',
-                'title': rTitle,
-                'summary': 'Fix ISO-4 abbreviation to use all language rules.',
-                'minor': True,
-                'basetimestamp':
-                    datetimeFromPWB(rRevision.timestamp).isoformat(),
-                'starttimestamp': startTimeStamp,
-                'oldtext': rRevision.text,
-                'oldrevid': rRevision.revid,
-                'text': newtext
-            }
-            patches.append(markPatch)
-        elif re.search(regex, rRevision.text):
-            unmarkPatch = {
-                'patchtype': 'edit',
-                'slug': 'unmark old',
-                'title': rTitle,
-                'summary': 'Fix ISO-4 abbreviation to use all language rules.',
-                'minor': True,
-                'basetimestamp':
-                    datetimeFromPWB(rRevision.timestamp).isoformat(),
-                'starttimestamp': startTimeStamp,
-                'oldtext': rRevision.text,
-                'oldrevid': rRevision.revid,
-                'text': re.sub(regex, '{{R from abbreviation}}\n', rRevision.text)
-            }
+            patches.append(makeRevisionEdit(rTitle, 'mark new?', newtext,
+                                            startTimeStamp))
+        elif re.search(regex, rText):
+            unmarkPatch = makeRevisionEdit(
+                rTitle, 'unmark old',
+                re.sub(regex, '{{R from abbreviation}}\n', rText),
+                startTimeStamp)
             if infoboxAbbrev.lower() in rTitle.lower() or \
                infoboxAbbrev.replace('.', '').lower() in rTitle.lower():
                 patches.append(unmarkPatch)
@@ -666,21 +806,21 @@ def makeLanguageMismatchPatch(
                 groupDetails += 'unrecog ISO-4: ' + rTitle + '\n'
         else:
             groupDetails += '??: ' + rTitle + '\n'
-    shouldHave = [computedAbbrev]
-    if computedAbbrev.replace('.', '') != computedAbbrev:
-        shouldHave.append(computedAbbrev.replace('.', ''))
 
-    for abbrev in shouldHave:
-        rPage = pywikibot.Page(Site(), abbrev)
-        if not rPage.exists():
+    for abbrev in getShouldHaveRedirects(computedAbbrev):
+        try:
+            exists = getPageState(abbrev).exists
+        except pywikibot.exceptions.InvalidTitle:
+            continue
+        if not exists:
             createPatch = {
                 'patchtype': 'create',
                 'slug': 'create',
-                'title': rPage.title(),
+                'title': normalizeTitle(abbrev),
                 'summary': 'R from ISO-4 abbreviation of journal title.',
                 'minor': True,
                 'starttimestamp': startTimeStamp,
-                'text': '#REDIRECT[[' + page.title() + ']]\n\n'
+                'text': '#REDIRECT[[' + title + ']]\n\n'
                            '{{R from ISO 4}}\n'
             }
             patches.append(createPatch)
@@ -693,53 +833,115 @@ def makeLanguageMismatchPatch(
     }
 
 
+def getPatchlistName(title: str) -> str:
+    """Return the name to abbreviate for a title in a patchlist."""
+    return re.sub(r'\s*(.{6})\s*[-:–(].*', r'\1', title)
+
+
 def doPatchlist(filename: str) -> None:
+    """Make a patchset creating ISO-4 redirects to titles listed in a file.
+
+    Each line with a [[link]] (to a redirect to a journal) gives a title.
+    Lines are processed in batches of PATCHLIST_BATCH_SIZE: missing abbrevs
+    are computed, disallowed redirect titles are dropped, redirect targets and
+    existence of redirects to create are fetched in batched queries, then
+    patch groups are streamed to the file.
+    """
     startTimeStamp = datetime.now(timezone.utc).isoformat()
+    titles = []
+    with open(filename) as f:
+        for line in f:
+            m = re.search(r'\[\[([^\[\]]+)\]\]', line)
+            if m:
+                titles.append(m.group(1))
+    print(f'Read {len(titles)} titles from {filename}.', flush=True)
     # Patchset to propose for Stitchpitch
-    result: Dict[str, Any] = {
-        'patchtype': 'list',
-        'slug': 'ISO-4 redirect creation',
+    writer = patchset.PatchsetWriter('ISO-4 redirect creation',
+                                     compact=COMPACT_PATCHES)
+    start = time.perf_counter()
+    for i in range(0, len(titles), PATCHLIST_BATCH_SIZE):
+        batch = titles[i:i + PATCHLIST_BATCH_SIZE]
+        with phase('patchlist abbrevs'):
+            for title in batch:
+                state.saveTitleToAbbrev(getPatchlistName(title), 'all')
+            state.computePendingAbbrevs()
+        rTitles: Dict[str, Optional[str]] = {
+            title: state.tryGetAbbrev(getPatchlistName(title), 'all')
+            for title in batch}
+        sources = {title: getPatchlistSources(rTitle) if rTitle else []
+                   for title, rTitle in rTitles.items()}
+        with phase('patchlist existence checks'):
+            prefetchPageStates(batch)
+            existing = getExistingTitles(
+                srcTitle for src in sources.values() for srcTitle in src)
+        with phase('patchlist patches'):
+            for title in batch:
+                patchgroup = makePatchlistGroup(
+                    title, rTitles[title], sources[title], existing,
+                    startTimeStamp)
+                if patchgroup is not None:
+                    writer.add(patchgroup)
+        done = i + len(batch)
+        seconds = time.perf_counter() - start
+        print(f'Patchlist: {done}/{len(titles)} titles, '
+              f'{writer.nPatches} patch groups in {seconds:.1f}s '
+              f'({done / max(seconds, 1e-9):.1f} titles/s).', flush=True)
+    writer.close(writeEmpty=True)
+
+
+def getPatchlistSources(rTitle: str) -> List[str]:
+    """Return allowed titles of redirects to create: `rTitle` and dotless."""
+    src = [rTitle]
+    rTitleDotless = rTitle.replace('.', '')
+    if rTitleDotless != rTitle:
+        src.append(rTitleDotless)
+    return [srcTitle for srcTitle in src if isAllowedTitle(srcTitle)]
+
+
+def makePatchlistGroup(title: str, rTitle: Optional[str], src: List[str],
+                       existing: Set[str], startTimeStamp: str) \
+        -> Optional[Dict[str, Any]]:
+    """Make a patch group creating redirects from `src` titles to `title`.
+
+    `src` are the allowed titles among `rTitle` and its dotless version,
+    `existing` contains those that exist. Uses the cached state of `title`,
+    see `doPatchlist()`.
+    """
+    if rTitle is None:
+        return None
+    try:
+        pageState = getPageState(title)
+    except pywikibot.exceptions.InvalidTitle:
+        print(f'Skipping invalid title: [[{title}]].')
+        return None
+    if not pageState.isRedirect():
+        print(f'Skipping [[{title}]]: not a redirect.')
+        return None
+    target = pageState.redirectTarget
+    name = getPatchlistName(title)
+    patchgroup = {
+        'patchtype': 'group',
+        'slug': f'{title} – {rTitle}',
+        'details': f'<pre>{target}</pre>\n\n' + state.getMatchingPatterns(name),
         'patches': []
     }
-    with open(filename) as f:
-        for line in f:
-            title = re.search(r'\[\[([^\[\]]+)\]\]', line).group(1)
-            page = pywikibot.Page(Site(), title)
-            target = page.getRedirectTarget().title()
-            name = re.sub(r'\s*(.{6})\s*[-:–(].*', r'\1', title)
-            rTitle = state.tryGetAbbrev(name, 'all')
-            if rTitle is None:
-                continue
-            patchgroup = {
-                'patchtype': 'group',
-                'slug': f'{title} – {rTitle}',
-                'details': f'<pre>{target}</pre>\n\n' + state.getMatchingPatterns(name),
-                'patches': []
-            }
-            print(patchgroup['slug'])
-            src = [rTitle]
-            rTitleDotless = rTitle.replace('.', '')
-            if rTitleDotless != rTitle:
-                src.append(rTitleDotless)
-            for srcTitle in src:
-                rPage = pywikibot.Page(Site(), srcTitle)
-                if rPage.exists():
-                    print(f"Already exists: [[{srcTitle}]].")
-                    continue
-                createPatch = {
-                    'patchtype': 'create',
-                    'slug': 'create',
-                    'title': rPage.title(),
-                    'summary': 'R from ISO-4 abbreviation of journal title (supervised).',
-                    'minor': True,
-                    'starttimestamp': startTimeStamp,
-                    'text': '#REDIRECT[[' + target + ']]\n\n'
-                            '{{R from ISO 4}}\n'
-                }
-                patchgroup['patches'].append(createPatch)
-            result['patches'].append(patchgroup)
-    with open('patchset.json', 'wt') as f:
-        json.dump(result, f)
+    print(patchgroup['slug'])
+    for srcTitle in src:
+        if srcTitle in existing:
+            print(f"Already exists: [[{srcTitle}]].")
+            continue
+        createPatch = {
+            'patchtype': 'create',
+            'slug': 'create',
+            'title': normalizeTitle(srcTitle),
+            'summary': 'R from ISO-4 abbreviation of journal title (supervised).',
+            'minor': True,
+            'starttimestamp': startTimeStamp,
+            'text': '#REDIRECT[[' + target + ']]\n\n'
+                    '{{R from ISO 4}}\n'
+        }
+        patchgroup['patches'].append(createPatch)
+    return patchgroup
 
 
 if __name__ == '__main__':
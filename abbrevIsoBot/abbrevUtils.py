@@ -1,7 +1,10 @@
 """Common utility functions: getLanguage() and isSoftMatch()."""
 
 import re
-from typing import Dict
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Cuts a dependent title (subtitle, series, comment), see `isSoftMatch()`.
+_DEPENDENT_TITLE_REGEX = re.compile(r'\s*[\-\(:–,].*')
 
 
 def getLanguage(infobox: Dict[str, str]) -> str:
@@ -45,6 +48,38 @@ def isSoftMatch(infoboxAbbrev: str, computedAbbrev: str) -> bool:
     return False
 
 
+def softMatchKey(abbrev: str) -> str:
+    """Return a key such that `isSoftMatch(a, b)` iff the keys are equal.
+
+    That's the lowercased abbrev with any dependent title cut (abbrevs that
+    are equal when lowercased are equal when also cut). `isSoftMatch()` is
+    kept as the reference; the benchmarks check both agree.
+    """
+    return _DEPENDENT_TITLE_REGEX.sub('', abbrev.lower())
+
+
+class SoftMatchIndex:
+    """Titles by the soft-match key of their abbrevs, see `isSoftMatch()`."""
+
+    def __init__(self, pairs: Iterable[Tuple[str, str]] = ()) -> None:
+        """Index given pairs (abbrev, title)."""
+        self.index: Dict[str, Set[str]] = {}
+        for abbrev, title in pairs:
+            self.add(abbrev, title)
+
+    def add(self, abbrev: str, title: str) -> None:
+        """Note that `title` abbreviates to `abbrev`."""
+        self.index.setdefault(softMatchKey(abbrev), set()).add(title)
+
+    def __contains__(self, abbrev: str) -> bool:
+        """Return whether some indexed abbrev soft-matches `abbrev`."""
+        return softMatchKey(abbrev) in self.index
+
+    def getTitles(self, abbrev: str) -> List[str]:
+        """Return sorted titles with an abbrev soft-matching `abbrev`."""
+        return sorted(self.index.get(softMatchKey(abbrev), ()))
+
+
 def stripTitle(t: str) -> str:
     """Remove disambuig comments from wiki title (before computing abbrev)."""
     t = re.sub(r'\s*\(.*(ournal|agazine|eriodical|eview).*\)', '', t)
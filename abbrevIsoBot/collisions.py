@@ -0,0 +1,163 @@
+"""Corpus-wide index of abbreviations, to find journals sharing one.
+
+The index is built in one pass over the state (as saved by the previous
+scrape), before any page is fixed. An abbreviation (dotted or dotless)
+claimed by two or more pages is a collision: a redirect from it could only
+point to one of them, so instead of checking each such title for existence
+while fixing pages, they are all reported in a dedicated section.
+"""
+import re
+from typing import Dict, FrozenSet, Iterator, List, NamedTuple, Optional, \
+    Set, Tuple
+
+from abbrevIsoBot import abbrevUtils, reports, state
+
+# Sources of an abbreviation, in the order they are trusted.
+SOURCES = ['infobox', 'nlm', 'mathscinet', 'computed']
+
+
+class AbbrevSource(NamedTuple):
+    """Where a page claims an abbreviation."""
+
+    pageTitle: str
+    infoboxId: int
+    # One of SOURCES.
+    source: str
+
+
+class AbbrevIndex:
+    """Dict from abbreviations (dotted and dotless) to their sources."""
+
+    def __init__(self) -> None:
+        self.sources: Dict[str, List[AbbrevSource]] = {}
+        # Dict from existing redirect titles to the page they redirect to.
+        self.redirectTargets: Dict[str, str] = {}
+        # Dict from titles of redirects marked as ISO 4 to their target page
+        # and content.
+        self.iso4Redirects: Dict[str, Tuple[str, str]] = {}
+
+    def clear(self) -> None:
+        """Remove everything from the index."""
+        self.sources.clear()
+        self.redirectTargets.clear()
+        self.iso4Redirects.clear()
+
+    def add(self, abbrev: str, source: AbbrevSource) -> None:
+        """Add an abbreviation (and its dotless form) from a source."""
+        for form in {abbrev, abbrev.replace('.', '')}:
+            sources = self.sources.setdefault(form, [])
+            if source not in sources:
+                sources.append(source)
+
+    def getPages(self, abbrev: str) -> Set[str]:
+        """Return titles of pages claiming `abbrev`."""
+        return {s.pageTitle for s in self.sources.get(abbrev, ())}
+
+    def getOtherPages(self, abbrev: str, pageTitle: str) -> Set[str]:
+        """Return titles of pages other than `pageTitle` claiming `abbrev`."""
+        return self.getPages(abbrev) - {pageTitle}
+
+    def getCollisions(self) -> Iterator[Tuple[str, List[AbbrevSource]]]:
+        """Yield abbrevs claimed by two or more pages, with their sources."""
+        for abbrev, sources in self.sources.items():
+            if len({s.pageTitle for s in sources}) >= 2:
+                yield abbrev, sources
+
+    def rebuild(self, issnToAbbrev: Dict[str, Dict[str, str]]) -> None:
+        """Index the abbrevs of all pages saved in the state.
+
+        `issnToAbbrev` is the dict from database ('nlm' or 'mathscinet') to
+        the dict from ISSN to abbrev.
+        """
+        self.clear()
+        for pageTitle, pageData in state.getPagesDict().items():
+            for rTitle, rContent in pageData['redirects'].items():
+                self.redirectTargets[rTitle] = pageTitle
+                if re.search(r'R from ISO 4', rContent):
+                    self.iso4Redirects[rTitle] = (pageTitle, rContent)
+            for infoboxId, infobox in enumerate(pageData['infoboxes']):
+                for source, abbrev in getInfoboxAbbrevs(
+                        pageTitle, infobox, issnToAbbrev):
+                    self.add(abbrev,
+                             AbbrevSource(pageTitle, infoboxId, source))
+
+
+def getInfoboxAbbrevs(pageTitle: str, infobox: Dict[str, str],
+                      issnToAbbrev: Dict[str, Dict[str, str]]) \
+        -> List[Tuple[str, str]]:
+    """Return (source, abbrev) pairs of an infobox (without computing any)."""
+    result = []
+    iAbbrev = abbrevUtils.sanitizeField(infobox.get('abbreviation', ''))
+    if iAbbrev not in ('', 'no') and '.' in iAbbrev:
+        result.append(('infobox', iAbbrev))
+    for db in ['nlm', 'mathscinet']:
+        abbrev = abbrevUtils.sanitizeField(infobox.get(db, ''))
+        if not abbrev:
+            for issn in [infobox.get('issn'), infobox.get('eissn')]:
+                if issn and not abbrev:
+                    abbrev = issnToAbbrev[db].get(issn.replace('–', '-'), '')
+        if abbrev:
+            result.append((db, abbrev))
+    name = (abbrevUtils.sanitizeField(infobox.get('title', ''))
+            or abbrevUtils.stripTitle(pageTitle))
+    if state.hasAbbrev(name, 'all'):
+        cAbbrev = state.getAbbrev(name, 'all')
+        if '.' in cAbbrev:
+            result.append(('computed', cAbbrev))
+    return result
+
+
+def describeSources(sources: List[AbbrevSource]) -> str:
+    """Return short wikitext listing pages and how they claim an abbrev."""
+    byPage: Dict[str, List[str]] = {}
+    for s in sorted(sources, key=lambda s: SOURCES.index(s.source)):
+        byPage.setdefault(s.pageTitle, [])
+        if s.source not in byPage[s.pageTitle]:
+            byPage[s.pageTitle].append(s.source)
+    return ', '.join(f'[[{page}]] ({"/".join(kinds)})'
+                     for page, kinds in sorted(byPage.items()))
+
+
+def getSuggestion(sources: List[AbbrevSource],
+                  currentTarget: Optional[str]) -> str:
+    """Return what should probably be done about a collision."""
+    kinds: Dict[str, Set[str]] = {}
+    for s in sources:
+        kinds.setdefault(s.pageTitle, set()).add(s.source)
+    # Pages where two sources agree, e.g. the infobox and computed abbrev.
+    confirmed = sorted(page for page in kinds if len(kinds[page]) >= 2)
+    claimed = sorted(page for page in kinds if kinds[page] != {'computed'})
+    if len(confirmed) == 1:
+        suggestion = (f'redirect to [[{confirmed[0]}]] (several sources '
+                      f'agree), check the others')
+    elif len(claimed) >= 2:
+        suggestion = 'disambiguation page needed'
+    elif claimed:
+        suggestion = (f'redirect to [[{claimed[0]}]] '
+                      f'(the only one using it), hatnotes on the others')
+    else:
+        suggestion = 'only computed: check which journal uses it'
+    if currentTarget:
+        suggestion += f'; now redirects to [[{currentTarget}]]'
+    return suggestion
+
+
+def reportCollisions(index: AbbrevIndex) -> int:
+    """Report all collisions in the index, return their number.
+
+    A dotted abbrev and its dotless form claimed by the same pages are
+    reported once, as the dotted one.
+    """
+    groups: Dict[Tuple[str, FrozenSet[str]], str] = {}
+    for abbrev, sources in index.getCollisions():
+        key = (abbrev.replace('.', ''),
+               frozenset(s.pageTitle for s in sources))
+        if key not in groups or ('.' in abbrev and '.' not in groups[key]):
+            groups[key] = abbrev
+    for abbrev in groups.values():
+        sources = index.sources[abbrev]
+        pages = sorted({s.pageTitle for s in sources})
+        reports.reportAbbrevCollision(
+            pages[0], abbrev, pages[1:], describeSources(sources),
+            getSuggestion(sources, index.redirectTargets.get(abbrev)))
+    return len(groups)
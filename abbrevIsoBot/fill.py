@@ -1,58 +1,230 @@
 """The bot action that fills some autimatizable abbrevs, see doFillAbbrev()."""
+import hashlib
+import json
 import re
-from typing import Optional
+import unicodedata
+from collections import defaultdict
+from typing import Any, DefaultDict, Dict, List, NamedTuple, Optional, Tuple
 
 import mwparserfromhell
 import pywikibot
 from pywikibot import Site
 
 from abbrevIsoBot import state
-from abbrevIsoBot import abbrevUtils
-from utils import trySaving, getInfoboxJournals
+from abbrevIsoBot import abbrevUtils, collisions, databases
+from utils import trySaving, getInfoboxJournalTemplates, getRedirectsToPages, \
+    getExistingTitles, parseRedirectTarget, phase, timedIter
+
+# Number of pages whose content and redirects are fetched together.
+FILL_BATCH_SIZE = 50
+# Edit summaries for each reason to fill an abbrev.
+FILL_SUMMARIES = {
+    'trivial': 'Filling trivial ISO-4 abbreviation. ',
+    'nlm': 'Filling ISO-4 abbreviation (matches NLM). ',
+    'mathscinet': 'Filling ISO-4 abbreviation (matches MathSciNet). ',
+    'redirect': 'Filling ISO-4 abbreviation (has an ISO-4 redirect). ',
+}
+# Infobox params that fills depend on, kept for skipped pages.
+FILL_PARAMS = ('title', 'language', 'country', 'abbreviation',
+               'issn', 'eissn', 'nlm', 'mathscinet')
 
 
 def doFillAbbrevs(scrapeLimit: Optional[int] = None) -> None:
     """Fill empty abbreviations in some automatizable cases.
 
-    Currently the cases are:
-    * abbreviation is equal to title, possibly without articles (a/the)
+    Currently the cases are (see `getFill()`):
+    * abbreviation is equal to title, possibly without articles (a/the),
+    * the NLM or MathSciNet abbrev is the computed one, up to dots,
+    * the computed abbrev has an existing ISO-4 redirect to the page.
+    Pages skipped in the previous run are not fetched again if their latest
+    revid and the fingerprint of what fills depend on (see `getFingerprints()`)
+    are unchanged.
     """
+    with phase('database load'):
+        issnToAbbrev = {'nlm': databases.parseNLMDict(),
+                        'mathscinet': databases.parseMSNDict()}
     catName = 'Category:Infobox journals with missing ISO 4 abbreviations'
     cat = pywikibot.Category(Site(), catName)
-    articles = cat.articles(namespaces=0, total=scrapeLimit, content=True)
-    for n, page in enumerate(articles):
-        print(f'--Scraping:\t{n}:\t[[{page.title()}]]', flush=True)
-        for i, infobox in enumerate(getInfoboxJournals(page)):
-            if infobox.get('abbreviation', '') != '':
-                print('--Skipping infobox that actually has non-empty abbrev')
-                continue
-            title = abbrevUtils.stripTitle(page.title())
-            if 'title' in infobox and infobox['title'] != title:
-                print('--Skipping infobox with different title than article',
-                      infobox['title'])
-                continue
-            cLang = abbrevUtils.getLanguage(infobox)
-            cAbbrev = state.tryGetAbbrev(title, cLang)
-            if cAbbrev is None:
-                continue
-            # If abbreviation is equal to title, up to "a/the" articles:
-            if cAbbrev == re.sub(r'(The|the|A|a)\s+', '', title):
-                print('--Filling "{}" with abbrev "{}"'.format(title, cAbbrev))
-                trySaving(page, fillAbbreviation(page.text, i, cAbbrev),
-                          'Filling trivial ISO-4 abbreviation. ',
-                          overwrite=True)
-
-
-def fillAbbreviation(pageText: str, whichInfobox: int, abbrev: str) -> str:
-    """Return pageText with changed abbreviation in specified infobox."""
-    p = mwparserfromhell.parse(pageText)
-    i = 0
-    for t in p.filter_templates():
-        if t.name.matches('infobox journal') or \
-           t.name.matches('Infobox Journal'):
-            if i == whichInfobox:
-                if t.has_param('title') and t.get('title')[0] == ' ':
-                    abbrev = ' ' + abbrev
-                t.add('abbreviation', abbrev, preserve_spacing=True)
-            i = i + 1
-    return str(p)
+    articles = timedIter(cat.articles(namespaces=0, total=scrapeLimit),
+                         'enumeration')
+    skipped = state.getFillSkipped()
+    newSkipped: Dict[str, Dict[str, Any]] = {}
+    pages = []
+    unchanged = {}
+    for page in articles:
+        entry = skipped.get(page.title())
+        # Entries of old states were just revids.
+        if isinstance(entry, dict) \
+           and entry['revid'] == page.latest_revision_id:
+            unchanged[page.title()] = page
+        else:
+            pages.append(page)
+    with phase('fill fingerprints'):
+        fingerprints = getFingerprints(
+            {title: skipped[title]['infoboxes'] for title in unchanged},
+            issnToAbbrev)
+    for title, page in unchanged.items():
+        if fingerprints[title] == skipped[title]['fingerprint']:
+            print(f'--Skipping [[{title}]], unchanged since last run.')
+            newSkipped[title] = skipped[title]
+        else:
+            pages.append(page)
+    print(f'Fetching {len(pages)} pages, {len(newSkipped)} unchanged skipped.',
+          flush=True)
+    # Dict from titles of pages with nothing to fill to (revid, infoboxes).
+    done: Dict[str, Tuple[int, List[Dict[str, str]]]] = {}
+    for i in range(0, len(pages), FILL_BATCH_SIZE):
+        batch = pages[i:i + FILL_BATCH_SIZE]
+        # Dict from page title to (title, text) of redirects to it.
+        redirects: DefaultDict[str, List[Tuple[str, str]]] = defaultdict(list)
+        with phase('fill fetch'):
+            for r in getRedirectsToPages([p.title() for p in batch],
+                                         content=True):
+                target = parseRedirectTarget(r.text)
+                if target:
+                    redirects[target.partition('#')[0]].append(
+                        (r.title(), r.text))
+            batch = list(Site().preloadpages(batch, content=True))
+        for n, page in enumerate(batch, i):
+            print(f'--Scraping:\t{n}:\t[[{page.title()}]]', flush=True)
+            with phase('fill'):
+                infoboxes = fillPage(page, redirects[page.title()],
+                                     issnToAbbrev)
+            if infoboxes is not None:
+                done[page.title()] = (page.latest_revision_id, infoboxes)
+    with phase('fill fingerprints'):
+        fingerprints = getFingerprints(
+            {title: infoboxes for title, (_, infoboxes) in done.items()},
+            issnToAbbrev)
+    for title, (revid, infoboxes) in done.items():
+        newSkipped[title] = {'revid': revid, 'infoboxes': infoboxes,
+                             'fingerprint': fingerprints[title]}
+    state.saveFillSkipped(newSkipped)
+
+
+def getFingerprints(pages: Dict[str, List[Dict[str, str]]],
+                    issnToAbbrev: Dict[str, Dict[str, str]]) -> Dict[str, str]:
+    """Return fingerprints of what fills of given pages depend on.
+
+    `pages` maps titles to their infoboxes' FILL_PARAMS. The fingerprint
+    covers, for each infobox, its computed abbrev, its database abbrevs and
+    which of the would-be ISO-4 redirects exist (queried in batches, without
+    content), but not the page text, whose revid is compared instead.
+    """
+    cAbbrevs = {title: [getComputedAbbrev(title, infobox)
+                        for infobox in infoboxes]
+                for title, infoboxes in pages.items()}
+    existing = getExistingTitles(
+        rTitle for abbrevs in cAbbrevs.values() for cAbbrev in abbrevs
+        if cAbbrev for rTitle in (cAbbrev, cAbbrev.replace('.', '')))
+    result = {}
+    for title, infoboxes in pages.items():
+        data = []
+        for infobox, cAbbrev in zip(infoboxes, cAbbrevs[title]):
+            dbAbbrevs = [
+                abbrev for source, abbrev
+                in collisions.getInfoboxAbbrevs(title, infobox, issnToAbbrev)
+                if source in ('nlm', 'mathscinet')]
+            rTitles = [rTitle for rTitle in
+                       ([cAbbrev, cAbbrev.replace('.', '')] if cAbbrev else [])
+                       if rTitle in existing]
+            data.append([cAbbrev, dbAbbrevs, rTitles])
+        result[title] = hashlib.sha1(
+            json.dumps(data).encode('utf-8')).hexdigest()
+    return result
+
+
+class Fill(NamedTuple):
+    """What to fill an infobox's abbreviation with, see `getFill()`."""
+
+    # None if nothing is filled.
+    abbrev: Optional[str]
+    # A key of FILL_SUMMARIES, or why nothing is filled.
+    reason: str
+
+
+def fillPage(page: pywikibot.Page, redirects: List[Tuple[str, str]],
+             issnToAbbrev: Dict[str, Dict[str, str]]) \
+        -> Optional[List[Dict[str, str]]]:
+    """Fill abbrevs in all infoboxes of a page, parsing it only once.
+
+    If the page is done with at its current revision (nothing can be filled,
+    and not because of abbrevs not computed yet), return the FILL_PARAMS of
+    its infoboxes, otherwise None.
+    """
+    code = mwparserfromhell.parse(unicodedata.normalize('NFC', page.text))
+    reasons = []
+    done = True
+    infoboxes = []
+    for i, (template, infobox) in enumerate(getInfoboxJournalTemplates(code)):
+        infoboxes.append({k: v for k, v in infobox.items()
+                          if k in FILL_PARAMS})
+        fill = getFill(page.title(), infobox, redirects, issnToAbbrev)
+        if fill.abbrev is None:
+            if fill.reason == 'not computed':
+                done = False
+            continue
+        print(f'--Filling infobox #{i} with abbrev "{fill.abbrev}" '
+              f'({fill.reason}).')
+        setAbbreviation(template, fill.abbrev)
+        if fill.reason not in reasons:
+            reasons.append(fill.reason)
+    if reasons:
+        trySaving(page, str(code),
+                  ''.join(FILL_SUMMARIES[r] for r in reasons),
+                  overwrite=True)
+        return None
+    return infoboxes if done else None
+
+
+def getFill(pageTitle: str, infobox: Dict[str, str],
+            redirects: List[Tuple[str, str]],
+            issnToAbbrev: Dict[str, Dict[str, str]]) -> Fill:
+    """Return what to fill an infobox's empty abbreviation with, if anything.
+
+    `redirects` are (title, text) of redirects to the page.
+    """
+    if infobox.get('abbreviation', '') != '':
+        print('--Skipping infobox that actually has non-empty abbrev')
+        return Fill(None, 'has abbrev')
+    title = abbrevUtils.stripTitle(pageTitle)
+    cAbbrev = getComputedAbbrev(pageTitle, infobox)
+    if cAbbrev is None:
+        return Fill(None, 'not computed')
+    # If abbreviation is equal to title, up to "a/the" articles:
+    if cAbbrev == re.sub(r'(The|the|A|a)\s+', '', title):
+        if 'title' in infobox and infobox['title'] != title:
+            print('--Skipping infobox with different title than article',
+                  infobox['title'])
+            return Fill(None, 'different title')
+        return Fill(cAbbrev, 'trivial')
+    if '.' not in cAbbrev:
+        return Fill(None, 'no source')
+    # If a database or an existing ISO-4 redirect confirms the computed one:
+    cAbbrevDotless = cAbbrev.replace('.', '')
+    for source, abbrev in collisions.getInfoboxAbbrevs(
+            pageTitle, infobox, issnToAbbrev):
+        if source in ('nlm', 'mathscinet') \
+           and abbrev.replace('.', '') == cAbbrevDotless:
+            return Fill(cAbbrev, source)
+    for rTitle, rText in redirects:
+        if rTitle in (cAbbrev, cAbbrevDotless) \
+           and re.search(r'R from ISO ?4', rText):
+            return Fill(cAbbrev, 'redirect')
+    return Fill(None, 'no source')
+
+
+def getComputedAbbrev(pageTitle: str,
+                      infobox: Dict[str, str]) -> Optional[str]:
+    """Return the computed abbrev of an infobox's title, None if pending."""
+    name = (abbrevUtils.sanitizeField(infobox.get('title', ''))
+            or abbrevUtils.stripTitle(pageTitle))
+    return state.tryGetAbbrev(name, abbrevUtils.getLanguage(infobox))
+
+
+def setAbbreviation(template: mwparserfromhell.nodes.Template,
+                    abbrev: str) -> None:
+    """Set the abbreviation param of an infobox, keeping its spacing."""
+    if template.has_param('title') and template.get('title')[0] == ' ':
+        abbrev = ' ' + abbrev
+    template.add('abbreviation', abbrev, preserve_spacing=True)
@@ -0,0 +1,322 @@
+"""Compute ISO 4 abbreviations in Python, from the LTWA.
+
+The List of Title Word Abbreviations (a CSV file from the ISSN International
+Centre, with columns WORD, ABBREVIATIONS and LANGUAGES, separated by tabs or
+semicolons) is loaded into a trie, so that all patterns matching a title are
+found in one pass over it. The rules are a simplification of abbrevIso.js:
+the longest matching pattern wins, whole-word patterns also match plurals,
+articles, prepositions and conjunctions are omitted, one-word titles are kept.
+
+Abbrevs computed here go to the shared state, where they drive redirect
+creation, so the bots only use the matcher if it computes enough of the
+abbrevs abbrevIso.js stored in the state the same, see `makeProvider()`.
+To compare with those, run:
+    python3 -m abbrevIsoBot.ltwa LTWA.csv [abbrevIsoBot/abbrevBotState.json]
+        [--show N]
+"""
+import argparse
+import csv
+import json
+import re
+import time
+import unicodedata
+from typing import Any, Dict, FrozenSet, Iterable, List, NamedTuple, \
+    Optional, Tuple
+
+from abbrevIsoBot import state
+
+# Languages of patterns that apply to titles in any language.
+UNIVERSAL_LANGUAGES = frozenset(['mul', 'lat', 'und'])
+# Words ISO 4 omits: articles, prepositions and conjunctions (lowercase).
+OMITTED_WORDS = frozenset([
+    '&', 'a', 'an', 'the', 'and', 'or', 'of', 'for', 'in', 'on', 'at', 'to',
+    'by', 'with', 'from',
+    'der', 'die', 'das', 'des', 'dem', 'den', 'und', 'für', 'fur', 'zur',
+    'zum', 'im',
+    'le', 'la', 'les', 'l', 'de', 'du', 'd', 'et', 'en', 'pour', 'sur',
+    'el', 'los', 'las', 'y', 'del', 'e', 'il', 'di', 'della', 'per',
+    'da', 'do', 'dos', 'em', 'para', 'i', 'w', 'z', 'na', 'dla'])
+# Endings a whole-word pattern (without '-') also matches, after the word.
+WORD_ENDINGS = frozenset(['', 's', 'es'])
+# Values of ABBREVIATIONS meaning the word is not abbreviated.
+NOT_ABBREVIATED = frozenset(['n.a.', 'n. a.', 'n.a', '–'])
+# Minimum fraction of abbrevs stored by abbrevIso.js that the matcher must
+# compute the same to be used, and minimum number of them to compare with.
+MIN_MATCH_RATE = 0.99
+MIN_VALIDATED_ABBREVS = 1000
+
+
+class Pattern(NamedTuple):
+    """A row of the LTWA."""
+
+    # As in the LTWA, e.g. 'academ-', '-acoustic' or 'journal'.
+    word: str
+    # E.g. 'acad.', or None if words matching the pattern are kept as is.
+    abbreviation: Optional[str]
+    languages: FrozenSet[str]
+    # Whether it matches the end (with '-' at the start of `word`).
+    startsInWord: bool
+    # Whether it matches the start (with '-' at the end of `word`).
+    endsInWord: bool
+
+    def format(self) -> str:
+        """Return the pattern as a line of matchingPatterns."""
+        return (f'{self.word}\t{self.abbreviation or "n.a."}\t'
+                f'{", ".join(sorted(self.languages))}')
+
+
+class Match(NamedTuple):
+    """A pattern matching `title[start:end]` (up to the end of a word)."""
+
+    start: int
+    end: int
+    # Length of the matched pattern, the longest one is preferred.
+    length: int
+    pattern: Pattern
+
+
+# Dict from characters to their folded form, see `fold()`.
+_foldedChars: Dict[str, str] = {}
+
+
+def fold(s: str) -> str:
+    """Return `s` lowercased without diacritics, with the same length."""
+    result = []
+    for c in s:
+        folded = _foldedChars.get(c)
+        if folded is None:
+            base = ''.join(d for d in unicodedata.normalize('NFKD', c)
+                           if not unicodedata.combining(d))
+            folded = _foldedChars[c] = base.lower()[:1] or c
+        result.append(folded)
+    return ''.join(result)
+
+
+def getPatternLanguages(language: str) -> Optional[FrozenSet[str]]:
+    """Return languages of patterns used for titles in `language`.
+
+    `language` is 'all' or a comma-separated list of ISO 639-2 codes;
+    None stands for all languages.
+    """
+    if language == 'all':
+        return None
+    return frozenset(language.split(',')) | UNIVERSAL_LANGUAGES
+
+
+class LTWA:
+    """A trie of LTWA patterns, see `loadLTWA()`."""
+
+    def __init__(self, patterns: Iterable[Pattern]) -> None:
+        # Nested dicts from a (folded) character to a subtrie,
+        # with the patterns ending at a node under the key ''.
+        self.trie: Dict[str, Any] = {}
+        self.size = 0
+        for pattern in patterns:
+            node = self.trie
+            for c in fold(pattern.word.strip('-')):
+                node = node.setdefault(c, {})
+            node.setdefault('', []).append(pattern)
+            self.size += 1
+
+    def matches(self, title: str) -> List[Match]:
+        """Return all matches of patterns in `title`, in any language."""
+        folded = fold(title)
+        n = len(folded)
+        isWord = [c.isalnum() for c in title]
+        # Dict from a position to the end of the word containing it.
+        wordEnd = [0] * (n + 1)
+        wordEnd[n] = n
+        for i in range(n - 1, -1, -1):
+            wordEnd[i] = wordEnd[i + 1] if isWord[i] else i
+        result = []
+        for i in range(n):
+            if not isWord[i]:
+                continue
+            atWordStart = i == 0 or not isWord[i - 1]
+            node = self.trie
+            j = i
+            while j < n:
+                node = node.get(folded[j])
+                if node is None:
+                    break
+                j += 1
+                for pattern in node.get('', ()):
+                    if not atWordStart and not pattern.startsInWord:
+                        continue
+                    end = wordEnd[j]
+                    if pattern.endsInWord or folded[j:end] in WORD_ENDINGS:
+                        result.append(Match(i, end, j - i, pattern))
+        return result
+
+    def abbreviate(self, title: str, language: str = 'all',
+                   matches: Optional[List[Match]] = None) -> str:
+        """Return the abbreviation of `title` using rules for `language`."""
+        if len(re.findall(r'\w+', title)) <= 1:
+            return title
+        if matches is None:
+            matches = self.matches(title)
+        omitted = [(m.start(), m.end()) for m in re.finditer(r'\w+|&', title)
+                   if m.group().lower() in OMITTED_WORDS
+                   and not (len(m.group()) == 1 and m.group().isupper())]
+        taken = [False] * len(title)
+        for start, end in omitted:
+            taken[start:end] = [True] * (end - start)
+        languages = getPatternLanguages(language)
+        chosen = []
+        for match in sorted(matches, key=lambda m: (-m.length, m.start)):
+            if ((languages is None
+                 or not match.pattern.languages.isdisjoint(languages))
+                    and not any(taken[match.start:match.end])):
+                taken[match.start:match.end] = [True] * (match.end
+                                                         - match.start)
+                chosen.append(match)
+        pieces = []
+        spans = sorted([(s, e, None) for s, e in omitted]
+                       + [(m.start, m.end, m) for m in chosen],
+                       key=lambda span: span[0])
+        position = 0
+        for start, end, match in spans:
+            pieces.append(title[position:start])
+            position = end
+            if match is None:
+                continue
+            original = title[start:end]
+            if match.pattern.abbreviation is None:
+                pieces.append(original)
+                continue
+            replacement = match.pattern.abbreviation.strip('-')
+            if original[:1].isupper():
+                replacement = replacement[:1].upper() + replacement[1:]
+            pieces.append(replacement)
+        pieces.append(title[position:])
+        result = re.sub(r'\s+', ' ', ''.join(pieces)).strip()
+        return re.sub(r' (?=[,:;.)])', '', result)
+
+    def abbreviateAll(self, titles: Dict[str, List[str]]) \
+            -> Dict[str, Dict[str, Optional[str]]]:
+        """Return abbrevs of many titles, like `AbbrevProvider.compute()`."""
+        result: Dict[str, Dict[str, Optional[str]]] = {}
+        for title, languages in titles.items():
+            matches = self.matches(title)
+            abbrevs: Dict[str, Optional[str]] = {
+                language: self.abbreviate(title, language, matches)
+                for language in languages}
+            abbrevs['matchingPatterns'] = '\n'.join(dict.fromkeys(
+                match.pattern.format()
+                for match in sorted(matches, key=lambda m: m.start)))
+            result[title] = abbrevs
+        return result
+
+
+def loadLTWA(fileName: str) -> LTWA:
+    """Load the LTWA from a CSV file."""
+    patterns = []
+    with open(fileName, 'rt', encoding='utf-8-sig', newline='') as f:
+        header = f.readline()
+        delimiter = '\t' if '\t' in header else ';'
+        columns = [c.strip().upper() for c in header.split(delimiter)]
+        iWord, iAbbrev, iLanguages = [
+            columns.index(c) if c in columns else i for i, c
+            in enumerate(['WORD', 'ABBREVIATIONS', 'LANGUAGES'])]
+        for row in csv.reader(f, delimiter=delimiter):
+            if len(row) <= max(iWord, iAbbrev, iLanguages):
+                continue
+            word = row[iWord].strip()
+            abbreviation: Optional[str] = row[iAbbrev].strip()
+            if not word.strip('-'):
+                continue
+            if not abbreviation or abbreviation.lower() in NOT_ABBREVIATED:
+                abbreviation = None
+            patterns.append(Pattern(
+                word=word, abbreviation=abbreviation,
+                languages=frozenset(
+                    lang.strip() for lang in row[iLanguages].split(',')
+                    if lang.strip()),
+                startsInWord=word.startswith('-'),
+                endsInWord=word.endswith('-')))
+    return LTWA(patterns)
+
+
+class LTWAAbbrevProvider(state.AbbrevProvider):
+    """Provider computing abbrevs in-process, see `state.AbbrevProvider`."""
+
+    simplified = True
+
+    def __init__(self, fileName: str) -> None:
+        self.ltwa = loadLTWA(fileName)
+
+    def compute(self, titles: Dict[str, List[str]]) \
+            -> Dict[str, Dict[str, Optional[str]]]:
+        """Compute abbrevs of given titles."""
+        return self.ltwa.abbreviateAll(titles)
+
+
+def makeProvider(fileName: str) -> Optional[LTWAAbbrevProvider]:
+    """Return a provider for an LTWA file, if validated against the state.
+
+    That is, if it computes at least MIN_MATCH_RATE of the abbrevs stored
+    in the state by abbrevIso.js the same (see `state.getReferenceAbbrevs()`),
+    over at least MIN_VALIDATED_ABBREVS of them. Otherwise return None.
+    """
+    provider = LTWAAbbrevProvider(fileName)
+    matchRate, nTotal = validate(provider.ltwa, state.getReferenceAbbrevs(),
+                                 show=0)
+    if nTotal < MIN_VALIDATED_ABBREVS or matchRate < MIN_MATCH_RATE:
+        print(f'Not using the LTWA matcher: {matchRate:.2%} of {nTotal} '
+              f'stored abbrevs computed the same (at least '
+              f'{MIN_MATCH_RATE:.0%} of {MIN_VALIDATED_ABBREVS} needed).')
+        return None
+    return provider
+
+
+def validate(ltwa: LTWA, abbrevs: Dict[str, Any],
+             show: int = 20) -> Tuple[float, int]:
+    """Compare computed abbrevs with `abbrevs` (from the state).
+
+    Print the first `show` differences and the throughput, return the
+    fraction of stored abbrevs computed the same and their number.
+    """
+    titles = {title: [language for language, abbrev in entry.items()
+                      if language != 'matchingPatterns'
+                      and isinstance(abbrev, str)]
+              for title, entry in abbrevs.items() if entry}
+    start = time.perf_counter()
+    computed = ltwa.abbreviateAll(titles)
+    seconds = time.perf_counter() - start
+    nSame = nTotal = 0
+    for title, languages in titles.items():
+        for language in languages:
+            nTotal += 1
+            if computed[title][language] == abbrevs[title][language]:
+                nSame += 1
+            elif nTotal - nSame <= show:
+                print(f'{language}\t{title}\n'
+                      f'\tstored:   {abbrevs[title][language]}\n'
+                      f'\tcomputed: {computed[title][language]}')
+    print(f'{ltwa.size} patterns, {len(titles)} titles in {seconds:.3f}s '
+          f'({len(titles) / max(seconds, 1e-9):.0f} titles/s).')
+    print(f'Same as stored: {nSame}/{nTotal} abbrevs.')
+    return nSame / max(nTotal, 1), nTotal
+
+
+def main() -> None:
+    """Validate the LTWA matcher against abbrevs stored in a state file."""
+    parser = argparse.ArgumentParser(
+        prog='python3 -m abbrevIsoBot.ltwa',
+        description='Compare LTWA abbrevs with those stored in the state.')
+    parser.add_argument('ltwa', help='LTWA csv file')
+    parser.add_argument('state', nargs='?',
+                        default='abbrevIsoBot/abbrevBotState.json')
+    parser.add_argument('--show', type=int, default=20,
+                        help='number of differences to print')
+    args = parser.parse_args()
+    with open(args.state, 'rt') as f:
+        data = json.load(f)
+    simplified = set(data.get('simplifiedAbbrevs', []))
+    abbrevs = {title: entry for title, entry in data['abbrevs'].items()
+               if title not in simplified}
+    validate(loadLTWA(args.ltwa), abbrevs, args.show)
+
+
+if __name__ == '__main__':
+    main()
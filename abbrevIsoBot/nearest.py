@@ -0,0 +1,101 @@
+"""Nearest known abbreviation to a redirect title, over all journals.
+
+A BK-tree (a metric tree in Levenshtein distance) of the infobox and computed
+abbrevs of all journals (see `collisions.AbbrevIndex`) answers "the closest
+known abbrev within distance k, and whose is it" without comparing to each.
+It's used to find ISO 4 redirects that point to one journal, while being
+(nearly) the abbrev of another one.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import Levenshtein
+
+from abbrevIsoBot import collisions, reports
+
+# Max distance from an ISO 4 redirect to another journal's abbrev for it to
+# be reported as misattributed.
+MAX_MISATTRIBUTED_DISTANCE = 2
+
+
+class BKTree:
+    """Set of strings, searchable by Levenshtein distance."""
+
+    def __init__(self, words: Iterable[str] = ()) -> None:
+        # Nodes are pairs (word, dict from distance to child node).
+        self.root: Optional[Tuple[str, Dict[int, Any]]] = None
+        self.size = 0
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str) -> None:
+        """Add a word (unless already present)."""
+        if self.root is None:
+            self.root = (word, {})
+            self.size += 1
+            return
+        node = self.root
+        while True:
+            d = Levenshtein.distance(word, node[0])
+            if d == 0:
+                return
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = (word, {})
+                self.size += 1
+                return
+            node = child
+
+    def nearest(self, word: str, maxDistance: int) -> Tuple[int, List[str]]:
+        """Return the least distance from `word` and the words at it.
+
+        Only words within `maxDistance` are considered; if there are none,
+        return `(maxDistance + 1, [])`.
+        """
+        bestDistance = maxDistance + 1
+        best: List[str] = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            d = Levenshtein.distance(word, node[0])
+            if d < bestDistance:
+                bestDistance = d
+                best = [node[0]]
+            elif d == bestDistance and d <= maxDistance:
+                best.append(node[0])
+            # By the triangle inequality, closer words can only be in
+            # children at distance (from node) within bestDistance of d.
+            for childDistance, child in node[1].items():
+                if abs(childDistance - d) <= bestDistance:
+                    stack.append(child)
+        return bestDistance, sorted(best)
+
+
+def buildAbbrevTree(index: collisions.AbbrevIndex) -> BKTree:
+    """Return a tree of infobox and computed abbrevs from the index."""
+    return BKTree(sorted(
+        abbrev for abbrev, sources in index.sources.items()
+        if any(s.source in ('infobox', 'computed') for s in sources)))
+
+
+def reportMisattributedRedirects(
+        index: collisions.AbbrevIndex, tree: BKTree,
+        maxDistance: int = MAX_MISATTRIBUTED_DISTANCE) -> Dict[str, str]:
+    """Report ISO 4 redirects closest to abbrevs of other journals.
+
+    That is, redirects whose nearest known abbrevs (within `maxDistance`)
+    are all claimed by other journals than the redirect's target.
+    Return dict from the titles of the reported redirects to their targets.
+    """
+    result = {}
+    for rTitle, (pageTitle, rContent) in sorted(index.iso4Redirects.items()):
+        if pageTitle in index.getPages(rTitle):
+            continue
+        distance, abbrevs = tree.nearest(rTitle, maxDistance)
+        if not abbrevs or any(pageTitle in index.getPages(a)
+                              for a in abbrevs):
+            continue
+        owners = sorted(set().union(*(index.getPages(a) for a in abbrevs)))
+        reports.reportMisattributedRedirect(
+            pageTitle, rTitle, rContent, abbrevs[0], owners, distance)
+        result[rTitle] = pageTitle
+    return result
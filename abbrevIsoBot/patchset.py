@@ -0,0 +1,221 @@
+"""Patchsets for Stitchpitch, streamed to a JSON-lines file.
+
+Each patch (usually a group of edits) is appended to `patchset.jsonl` as soon
+as it is made, so adding one costs only its own size and an interrupted run
+keeps the patches made so far. `PatchsetWriter.close()` then assembles them
+into the 'list' patch in `patchset.json` that Stitchpitch reads, without
+loading them all in memory.
+
+Optionally, edit patches are written compact: instead of the full `oldtext`
+and `text`, only a splice of the base revision (`oldrevid`) is kept:
+    'splice': {'offset': ..., 'delete': ..., 'insert': ...,
+               'oldsha1': ..., 'sha1': ...}
+meaning `text = oldtext[:offset] + insert + oldtext[offset + delete:]`, with
+hex SHA-1 digests of both texts (UTF-8) to validate them. To check a compact
+patchset, print sizes, or expand it back (fetching base revisions), run:
+    python3 -m abbrevIsoBot.patchset patchset.json [--expand OUT]
+"""
+import argparse
+import hashlib
+import json
+from typing import Any, Callable, Dict, Optional, TextIO, Tuple
+
+FILE_NAME = 'patchset.json'
+
+
+class PatchError(ValueError):
+    """A compact patch doesn't apply to its base text."""
+
+
+class PatchsetWriter:
+    """Writes patches to a stream, assembled into a patchset at the end."""
+
+    def __init__(self, slug: str, fileName: str = FILE_NAME,
+                 compact: bool = False) -> None:
+        self.slug = slug
+        self.fileName = fileName
+        self.streamFileName = fileName + 'l'
+        # Whether to write edits as splices, see `compactPatch()`.
+        self.compact = compact
+        self.nPatches = 0
+        self.stream: Optional[TextIO] = None
+
+    def add(self, patch: Dict[str, Any]) -> None:
+        """Append a patch to the stream (started anew on the first patch)."""
+        if self.stream is None:
+            self.stream = open(self.streamFileName, 'wt', encoding='utf-8')
+        if self.compact:
+            patch = compactPatch(patch)
+        self.stream.write(json.dumps(patch) + '\n')
+        self.stream.flush()
+        self.nPatches += 1
+
+    def close(self, writeEmpty: bool = False) -> int:
+        """Assemble the streamed patches into the patchset file.
+
+        Nothing is written if no patch was added, unless `writeEmpty`.
+        Return the number of patches; the writer can then be reused.
+        """
+        nPatches = self.nPatches
+        if self.stream is None and not writeEmpty:
+            return 0
+        if self.stream is not None:
+            self.stream.close()
+        # Same as json.dump() of the whole 'list' patch.
+        with open(self.fileName, 'wt', encoding='utf-8') as f:
+            f.write(json.dumps({'patchtype': 'list', 'slug': self.slug})[:-1]
+                    + ', "patches": [')
+            if self.stream is not None:
+                with open(self.streamFileName, 'rt', encoding='utf-8') as s:
+                    for i, line in enumerate(s):
+                        f.write((', ' if i else '') + line.rstrip('\n'))
+            f.write(']}')
+        self.stream = None
+        self.nPatches = 0
+        return nPatches
+
+
+def sha1(text: str) -> str:
+    """Return the hex SHA-1 digest of a text, encoded as UTF-8."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _commonPrefixLength(a: str, b: str) -> int:
+    """Return the length of the common prefix of `a` and `b`."""
+    # Binary search, comparing slices is much faster than characters.
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def makeSplice(oldText: str, newText: str) -> Dict[str, Any]:
+    """Return the smallest single splice turning `oldText` into `newText`.
+
+    For an edit of one infobox param this is exactly that param's span.
+    """
+    prefix = _commonPrefixLength(oldText, newText)
+    # The common suffix may not overlap the prefix.
+    maxSuffix = min(len(oldText), len(newText)) - prefix
+    suffix = _commonPrefixLength(oldText[::-1][:maxSuffix],
+                                 newText[::-1][:maxSuffix])
+    return {'offset': prefix,
+            'delete': len(oldText) - prefix - suffix,
+            'insert': newText[prefix:len(newText) - suffix],
+            'oldsha1': sha1(oldText),
+            'sha1': sha1(newText)}
+
+
+def applySplice(oldText: str, splice: Dict[str, Any]) -> str:
+    """Return the text resulting from a splice, validating both texts."""
+    if sha1(oldText) != splice['oldsha1']:
+        raise PatchError('Base text differs from the one the patch is for.')
+    offset, delete = splice['offset'], splice['delete']
+    if offset + delete > len(oldText):
+        raise PatchError('Splice out of the base text.')
+    newText = oldText[:offset] + splice['insert'] + oldText[offset + delete:]
+    if sha1(newText) != splice['sha1']:
+        raise PatchError('Patched text differs from the intended one.')
+    return newText
+
+
+def compactPatch(patch: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the patch with edits (also in groups/lists) as splices."""
+    if 'patches' in patch:
+        return {**patch,
+                'patches': [compactPatch(p) for p in patch['patches']]}
+    if patch['patchtype'] != 'edit' or 'oldtext' not in patch:
+        return patch
+    result = {k: v for k, v in patch.items() if k not in ('oldtext', 'text')}
+    result['splice'] = makeSplice(patch['oldtext'], patch['text'])
+    return result
+
+
+def expandPatch(patch: Dict[str, Any],
+                getText: Callable[[str, int], str]) -> Dict[str, Any]:
+    """Return the patch with splices replaced by full `oldtext` and `text`.
+
+    `getText(title, revid)` returns the text of a base revision.
+    Raises PatchError if some splice doesn't apply.
+    """
+    if 'patches' in patch:
+        return {**patch, 'patches': [expandPatch(p, getText)
+                                     for p in patch['patches']]}
+    if 'splice' not in patch:
+        return patch
+    oldText = getText(patch['title'], patch['oldrevid'])
+    try:
+        text = applySplice(oldText, patch['splice'])
+    except PatchError as e:
+        raise PatchError(f'[[{patch["title"]}]] '
+                         f'(revid {patch["oldrevid"]}): {e}') from e
+    result = {k: v for k, v in patch.items() if k != 'splice'}
+    result['oldtext'] = oldText
+    result['text'] = text
+    return result
+
+
+def countEdits(patch: Dict[str, Any]) -> Dict[str, int]:
+    """Return the number of full and compact edits in a patch."""
+    if 'patches' in patch:
+        result = {'full': 0, 'compact': 0}
+        for p in patch['patches']:
+            for kind, n in countEdits(p).items():
+                result[kind] += n
+        return result
+    return {'full': int('oldtext' in patch), 'compact': int('splice' in patch)}
+
+
+def getOldTexts(patch: Dict[str, Any]) -> Dict[Tuple[str, int], str]:
+    """Return dict from (title, revid) to base texts of full edits."""
+    if 'patches' in patch:
+        result = {}
+        for p in patch['patches']:
+            result.update(getOldTexts(p))
+        return result
+    if 'oldtext' not in patch:
+        return {}
+    return {(patch['title'], patch['oldrevid']): patch['oldtext']}
+
+
+def fetchRevisionText(title: str, revid: int) -> str:
+    """Return the text of a revision, from the wiki."""
+    import pywikibot
+    return pywikibot.Page(pywikibot.Site(), title).getOldVersion(revid)
+
+
+def main() -> None:
+    """Verify a patchset, print its sizes and optionally expand it."""
+    parser = argparse.ArgumentParser(
+        prog='python3 -m abbrevIsoBot.patchset',
+        description='Verify a (compact) patchset, compare sizes.')
+    parser.add_argument('patchset', help='patchset json file')
+    parser.add_argument('--expand', metavar='OUT',
+                        help='write the patchset with full texts to OUT')
+    args = parser.parse_args()
+    with open(args.patchset, 'rt', encoding='utf-8') as f:
+        patchset = json.load(f)
+    edits = countEdits(patchset)
+    print(f'{edits["full"]} full edits, {edits["compact"]} compact edits.')
+    # Full texts are either in the patchset or fetched from the wiki.
+    full = expandPatch(patchset, fetchRevisionText)
+    compact = compactPatch(full)
+    oldTexts = getOldTexts(full)
+    if expandPatch(compact, lambda t, r: oldTexts[(t, r)]) != full:
+        raise PatchError('Compact patchset does not expand back.')
+    sizes = {name: len(json.dumps(p).encode('utf-8'))
+             for name, p in [('full', full), ('compact', compact)]}
+    print(f'Verified. Size full: {sizes["full"]} bytes, compact: '
+          f'{sizes["compact"]} bytes '
+          f'({sizes["compact"] / max(sizes["full"], 1):.1%}).')
+    if args.expand:
+        with open(args.expand, 'wt', encoding='utf-8') as f:
+            json.dump(full, f)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,112 +3,365 @@
 Mismatch means the abbrv written in the infobox exists, but is not a soft match
 for the automatically computed one (equal up to some cuts, see isSoftMatch()).
 """
+import hashlib
+import io
+import json
 import re
-from time import sleep
-from typing import Any, Dict, List  # pylint: disable=unused-import
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from pprint import pp
+from time import monotonic, sleep
+from typing import Any, Dict, List, NamedTuple, Optional, TextIO, \
+    Tuple
 from unicodedata import normalize
 
 import pywikibot
 
 from abbrevIsoBot import state, abbrevUtils
-
-
-
-# Each list contains tuples: [page title, infobox title, infobox abbrev, ..?].
+from utils import phase
+
+
+class ColonRow(NamedTuple):
+    """Title containing colons early on, skipped for safety."""
+    pageTitle: str
+    infoboxTitle: str
+    infoboxAbbrev: str
+    infoboxId: int = 0  # Index of the infobox on the page.
+
+
+class TrivialAbbrevRow(NamedTuple):
+    """Trivial abbrev (dotted abbreviation with no dots), skipped for safety."""
+    pageTitle: str
+    infoboxTitle: str
+    infoboxAbbrev: str
+    allRedirects: Dict[str, str]  # From redirect title to its content.
+    infoboxId: int = 0  # Index of the infobox on the page.
+
+
+class ExistingPageRow(NamedTuple):
+    """Page that already exists and does not redirect to expected page."""
+    pageTitle: str
+    redirectTitle: str
+
+
+class ExistingRedirectRow(NamedTuple):
+    """Redirect that already exists with some unexpected rcats or params."""
+    pageTitle: str
+    redirectTitle: str
+    redirectContent: str
+
+
+class SuperfluousRedirectRow(NamedTuple):
+    """Existing iso4 redirect that we would not add."""
+    pageTitle: str
+    redirectTitle: str
+    redirectContent: str
+    exampleExpectedRedirectTitle: str
+    potentialTitles: List[str]  # Titles that would abbreviate to this one.
+
+
+class MisattributedRedirectRow(NamedTuple):
+    """Existing iso4 redirect closest to the abbrev of another journal."""
+    pageTitle: str  # The redirect's target.
+    redirectTitle: str
+    redirectContent: str
+    closestAbbrev: str
+    closestAbbrevPageTitles: List[str]  # Journals with that abbrev.
+    distance: int
+
+
+class AbbrevCollisionRow(NamedTuple):
+    """Abbrev claimed by several journals, a redirect can't serve them all."""
+    pageTitle: str  # The first of the journals' pages.
+    redirectTitle: str  # The abbrev.
+    otherPageTitles: List[str]
+    sources: str  # Wikitext describing which page claims it how.
+    suggestion: str
+
+
+class MismatchRow(NamedTuple):
+    """Mismatch between IJ abbrev parameter and abbrevIso computed abbrev."""
+    pageTitle: str
+    infoboxTitle: str
+    infoboxAbbrev: str
+    computedAbbrev: str
+    computedLang: str
+    matchingPatterns: str
+    hasISO4Redirect: bool
+    infoboxId: int = 0  # Index of the infobox on the page.
+
+
+class LanguageMismatchRow(NamedTuple):
+    """Mismatch where changing the language would give a match."""
+    pageTitle: str
+    infoboxTitle: str
+    infoboxAbbrev: str
+    computedAbbrev: str
+    otherComputedAbbrev: str
+    infoboxLanguage: str
+    infoboxCountry: str
+    computedLanguage: str
+    matchingPatterns: str
+    hasISO4Redirect: bool
+    infoboxId: int = 0  # Index of the infobox on the page.
+
+
+class BadDBAbbrevRow(NamedTuple):
+    """Abbrev not matching database (NLM/MathSciNet) abbrev or missing."""
+    pageTitle: str
+    infoboxTitle: str
+    infoboxAbbrev: str
+    paramAbbrev: str
+    dbAbbrev: str
+    issn: str
+    whichDb: str
+    infoboxId: int = 0  # Index of the infobox on the page.
+
+
+# Rows reported during the scrape, for each report section.
 __report = {
-    # Titles containing colons early on, skipped for safety.
     'colon': [],
-    # Trivial abbrevs (dotted abbreviations with no dots), skipped for safety.
-    # Also in tuple: dict of all existing redirects (from rTitle to rContent).
     'nodots': [],
-    # Pages that already exists and do not redirect to expected page.
     'existingpage': [],
-    # Redirects that already exists with some unexpected rcats or parameters.
-    # Not in tuple: infobox title.
-    # Also in tuple: redirect's content.
     'existingredirect': [],
-    # Existing iso4 redirects that we would not add.
-    # Not in tuple: infobox title.
-    # Also in tuple: redirect content, example of expected redirect title.
     'iso4redirect': [],
-    # Mismatch between IJ abbrev parameter and abbrevIso computated abbrev.
-    # Also in tuple: computed abbrev, deduced language, matchingPatterns,
-    #   list of redirect titles that would abbreviate to this one.
+    'collision': [],
+    'misattributed': [],
     'mismatch': [],
-    # Mismatch where changing the language would give a match.
-    # Also in tuple: computed abbrev, other lang computed abbrev,
-    #   infobox language, country, deduced language, matchingPatterns.
     'mismatchLang': [],
-    # Abbrevs not matching database (NLM/MathSciNet) abbrev or missin.
-    # Also in tuple: nlm/mathscinet param, db abbrev, db issn, db.
     'badDbAbbrev': []
 }  # type: Dict[str, List[Any]]
 
 
-def doReport(site: pywikibot.Site, printOnly: bool = False) -> None:
-    """Build and save all reports."""
-    # printReportOnInfoboxPerPageNumbers()
-    mReport = getOverallStats()
-    mReport += getShortMismatchReport()
-
-    mLongReport = getOverallStats()
-    mLongReport += getLongMismatchReport()
-    mLongReport += getLanguageMismatchReport()
-
-    oReport = ("The following is a list of journals or redirects that the bot"
-               "skipped or considered unusual.\n\n")
-    oReport += getColonInTitleReport()
-    oReport += getTrivialAbbrevReport()
-    oReport += getExistingRedirectReport()
-    oReport += getExistingPageReport()
-    oReport += getSuperfluousRedirectReport()
-
-    dbReport = getBadDBAbbrevReport()
-
-    if not printOnly:
-        page = pywikibot.Page(site, u"User:TokenzeroBot/abbrev params")
-        page.text = dbReport
-        page.save(u'New report.', minor=False)
-        sleep(20)
-    print(dbReport)
-
-    if not printOnly:
-        page = pywikibot.Page(site, u"User:TokenzeroBot/ISO 4 unusual")
-        page.text = oReport
-        page.save(u'New report.', minor=False)
-        sleep(20)
-    print(oReport)
-
-    if not printOnly:
-        page = pywikibot.Page(site, u"User:TokenzeroBot/ISO 4")
-        page.text = mReport
-        page.save(u'New report.', minor=False)
-        sleep(20)
-    print(mReport)
-
-    if not printOnly:
-        page = pywikibot.Page(site, u"User:TokenzeroBot/ISO 4 mismatches")
-        page.text = mLongReport
-        page.save(u'New report.', minor=False)
-        sleep(20)
-    print(mLongReport)
+class OverallStats(NamedTuple):
+    """Numbers of infobox-journals by how their abbrev compares to ours."""
+    nTotal: int
+    nWithoutAbbrev: int  # With no (human) abbreviation parameter.
+    nMissingAbbrev: int  # With no computed abbreviation.
+    nExactMatch: int  # With exact match.
+    nCompatMatch: int  # With match up to e.g. removing parens.
+    nMismatch: int
+
+
+class Aggregate(NamedTuple):
+    """Everything the reports are rendered from, computed in one pass."""
+    stats: OverallStats
+    # Titles of pages with i infoboxes, for each i.
+    infoboxesPerPage: Dict[int, List[str]]
+    # Sorted rows for each report section (same keys as `__report`).
+    rows: Dict[str, List[Any]]
+
+
+# Snapshot of report rows: {'date': isoformat, 'rows': {rowKey: rowHash}}.
+Snapshot = Dict[str, Any]
+
+
+def doReport(site: pywikibot.Site, printOnly: bool = False,
+             debug: bool = False,
+             snapshotFileName: Optional[str] = None) -> None:
+    """Build and save all reports.
+
+    With `debug`, also print pages with an empty abbrev and the histogram
+    of infoboxes per page.
+    If `snapshotFileName` is given, also report changes since the snapshot
+    saved there by the previous run, and save a new one (unless `printOnly`).
+    """
+    with phase('report aggregate'):
+        agg = aggregateReports(debug=debug)
+    if debug:
+        printReportOnInfoboxPerPageNumbers(agg)
+
+    with phase('report render'):
+        reports = renderReports(agg)
+        snapshot = None
+        if snapshotFileName:
+            snapshot = makeSnapshot(agg.rows)
+            previous = loadSnapshot(snapshotFileName)
+            if previous is None:
+                print('No previous report snapshot, '
+                      'skipping the changes report.')
+            else:
+                reports.append((u"User:TokenzeroBot/ISO 4 changes",
+                                getDeltaReport(previous, snapshot, agg.rows)))
+
+    with phase('report publish'):
+        publisher = ReportPublisher(site)
+        for title, report in reports:
+            if not printOnly:
+                publisher.publish(title, report)
+            print(report)
+        publisher.wait()
+    # Only move on to the new snapshot once the changes report is saved.
+    if snapshot is not None and not printOnly:
+        saveSnapshot(snapshotFileName, snapshot)
+
+
+def renderReports(agg: Aggregate) -> List[Tuple[str, str]]:
+    """Return the (title, wikitext) of each report page."""
+    out = io.StringIO()
+    writeOverallStats(out, agg.stats)
+    writeShortMismatchReport(out, agg.rows['mismatch'])
+    mReport = out.getvalue()
+
+    out = io.StringIO()
+    writeOverallStats(out, agg.stats)
+    writeLongMismatchReport(out, agg.rows['mismatch'])
+    writeLanguageMismatchReport(out, agg.rows['mismatchLang'])
+    mLongReport = out.getvalue()
+
+    out = io.StringIO()
+    out.write("The following is a list of journals or redirects that the bot"
+              "skipped or considered unusual.\n\n")
+    writeColonInTitleReport(out, agg.rows['colon'])
+    writeTrivialAbbrevReport(out, agg.rows['nodots'])
+    writeExistingRedirectReport(out, agg.rows['existingredirect'])
+    writeExistingPageReport(out, agg.rows['existingpage'])
+    writeSuperfluousRedirectReport(out, agg.rows['iso4redirect'])
+    writeMisattributedRedirectReport(out, agg.rows['misattributed'])
+    writeAbbrevCollisionReport(out, agg.rows['collision'])
+    oReport = out.getvalue()
+
+    out = io.StringIO()
+    writeBadDBAbbrevReport(out, agg.rows['badDbAbbrev'])
+    dbReport = out.getvalue()
+
+    return [(u"User:TokenzeroBot/abbrev params", dbReport),
+            (u"User:TokenzeroBot/ISO 4 unusual", oReport),
+            (u"User:TokenzeroBot/ISO 4", mReport),
+            (u"User:TokenzeroBot/ISO 4 mismatches", mLongReport)]
+
+
+class ReportPublisher:
+    """Saves report pages, skipping the ones that did not change.
+
+    Each report's content is hashed and compared to the hash stored in the
+    state (or, if there's none, to the page's current content).
+    Reports longer than `maxSize` are split into subpages at section
+    headings, with the main page linking to them. Subpages left over from
+    a longer report are turned into redirects to the main page.
+    Saves are submitted to a small thread pool, paced so that two saves
+    start at least `interval` seconds apart (instead of sleeping after each).
+    """
+
+    def __init__(self, site: pywikibot.Site, maxSize: int = 500000,
+                 interval: float = 20, workers: int = 2) -> None:
+        self.site = site
+        self.maxSize = maxSize
+        self.interval = interval
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.futures: List[Future] = []
+        self.lock = threading.Lock()
+        self.lastSave = -interval
+
+    def publish(self, title: str, text: str) -> None:
+        """Save report (or its changed subpages), unless unchanged."""
+        parts = splitReport(text, self.maxSize)
+        if len(parts) == 1:
+            self.submit(title, text)
+            parts = []
+        else:
+            index = (f"The report is split into {len(parts)} parts:\n"
+                     + ''.join(f"* [[{title}/{i}]]\n"
+                               for i in range(1, len(parts) + 1)))
+            self.submit(title, index)
+            for i, part in enumerate(parts, start=1):
+                self.submit(f'{title}/{i}', part)
+        # Subpages are numbered from 1 and all saved ones have a hash.
+        i = len(parts) + 1
+        while state.getReportHash(f'{title}/{i}') is not None:
+            self.retire(f'{title}/{i}', title)
+            i += 1
+
+    def submit(self, title: str, text: str) -> None:
+        """Queue saving a single page, unless its content is unchanged."""
+        contentHash = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        storedHash = state.getReportHash(title)
+        if storedHash is None:
+            # MediaWiki strips trailing whitespace from saved content.
+            page = pywikibot.Page(self.site, title)
+            if page.exists() and page.text == text.rstrip():
+                storedHash = contentHash
+        if storedHash == contentHash:
+            print(f'Report unchanged, skipping: [[{title}]]', flush=True)
+            state.saveReportHash(title, contentHash)
+            return
+        self.futures.append(
+            self.executor.submit(self.save, title, text, contentHash))
+
+    def retire(self, title: str, target: str) -> None:
+        """Queue redirecting a subpage no longer used to the main page."""
+        print(f'Report part no longer used: [[{title}]]', flush=True)
+        self.futures.append(self.executor.submit(
+            self.save, title, f'#REDIRECT [[{target}]]\n', None,
+            u'Report part no longer used.'))
+
+    def save(self, title: str, text: str, contentHash: Optional[str],
+             summary: str = u'New report.') -> None:
+        """Save a page, waiting until `interval` passed since the last one.
+
+        The hash of the content is saved to the state, or with None, the
+        stored one is dropped (the page is no longer a report).
+        """
+        with self.lock:
+            delay = self.lastSave + self.interval - monotonic()
+            if delay > 0:
+                sleep(delay)
+            self.lastSave = monotonic()
+        page = pywikibot.Page(self.site, title)
+        page.text = text
+        page.save(summary, minor=False)
+        if contentHash is None:
+            state.deleteReportHash(title)
+        else:
+            state.saveReportHash(title, contentHash)
+        print(f'Report saved: [[{title}]]', flush=True)
+
+    def wait(self) -> None:
+        """Wait for all queued saves, raise the first error if any failed."""
+        self.executor.shutdown(wait=True)
+        for future in self.futures:
+            future.result()
+
+
+def splitReport(text: str, maxSize: int) -> List[str]:
+    """Split report into parts of at most `maxSize` characters if possible.
+
+    Splits only before section headings, so a single too long section
+    makes a part longer than `maxSize`.
+    """
+    if len(text) <= maxSize:
+        return [text]
+    parts: List[str] = []
+    current = ''
+    for section in re.split(r'(?m)^(?===)', text):
+        if current and len(current) + len(section) > maxSize:
+            parts.append(current)
+            current = ''
+        current += section
+    if current:
+        parts.append(current)
+    return parts
 
 
 def reportTitleWithColon(pageTitle: str,
                          infoboxTitle: str,
-                         infoboxAbbrev: str) -> None:
+                         infoboxAbbrev: str,
+                         infoboxId: int = 0) -> None:
     """Report infobox abbreviation that contains a colon.
 
     These may be tricky dependent titles or mishandled as interwiki links,
     so we just skip and report them.
     """
-    __report['colon'].append([pageTitle, infoboxTitle, infoboxAbbrev])
+    __report['colon'].append(ColonRow(pageTitle, infoboxTitle, infoboxAbbrev,
+                                      infoboxId))
 
 
 def reportTrivialAbbrev(pageTitle: str,
                         infoboxTitle: str,
                         infoboxAbbrev: str,
-                        allRedirects: List[str]) -> None:
+                        allRedirects: Dict[str, str],
+                        infoboxId: int = 0) -> None:
     """Report abbrev that has not dots.
 
     (Nothing abbreviated except possibly for cutting short word).
@@ -116,8 +369,8 @@ def reportTrivialAbbrev(pageTitle: str,
     a scientific term as their title (e.g. Nature),
     so creating a redirect could lead to confusion.
     """
-    __report['nodots'].append([pageTitle, infoboxTitle, infoboxAbbrev,
-                               allRedirects])
+    __report['nodots'].append(TrivialAbbrevRow(
+        pageTitle, infoboxTitle, infoboxAbbrev, allRedirects, infoboxId))
 
 
 def reportExistingOtherPage(pageTitle: str,
@@ -126,7 +379,7 @@ def reportExistingOtherPage(pageTitle: str,
 
     These are usually disambuigation pages.
     """
-    __report['existingpage'].append([pageTitle, redirectTitle])
+    __report['existingpage'].append(ExistingPageRow(pageTitle, redirectTitle))
 
 
 def reportExistingOtherRedirect(pageTitle: str,
@@ -137,8 +390,8 @@ def reportExistingOtherRedirect(pageTitle: str,
     Unexpected means with some unexpected rcats or parameters
     (like {{R from move}}).
     """
-    __report['existingredirect'].append([pageTitle,
-                                         redirectTitle, redirectContent])
+    __report['existingredirect'].append(ExistingRedirectRow(
+        pageTitle, redirectTitle, redirectContent))
 
 
 def reportSuperfluousRedirect(pageTitle: str,
@@ -150,10 +403,35 @@ def reportSuperfluousRedirect(pageTitle: str,
 
     `exampleExpectedRedirectTitle` is one of the required redirect titles.
     """
-    __report['iso4redirect'].append([pageTitle,
-                                     redirectTitle, redirectContent,
-                                     exampleExpectedRedirectTitle,
-                                     potentialTitles])
+    __report['iso4redirect'].append(SuperfluousRedirectRow(
+        pageTitle, redirectTitle, redirectContent,
+        exampleExpectedRedirectTitle, potentialTitles))
+
+
+def reportMisattributedRedirect(pageTitle: str,
+                                redirectTitle: str,
+                                redirectContent: str,
+                                closestAbbrev: str,
+                                closestAbbrevPageTitles: List[str],
+                                distance: int) -> None:
+    """Report ISO-4 redirect that seems to belong to another journal.
+
+    `closestAbbrev` is the known abbrev nearest to `redirectTitle` (at
+    Levenshtein `distance`), claimed by `closestAbbrevPageTitles` only.
+    """
+    __report['misattributed'].append(MisattributedRedirectRow(
+        pageTitle, redirectTitle, redirectContent,
+        closestAbbrev, closestAbbrevPageTitles, distance))
+
+
+def reportAbbrevCollision(pageTitle: str,
+                          redirectTitle: str,
+                          otherPageTitles: List[str],
+                          sources: str,
+                          suggestion: str) -> None:
+    """Report an abbrev claimed by several journals (see `collisions`)."""
+    __report['collision'].append(AbbrevCollisionRow(
+        pageTitle, redirectTitle, otherPageTitles, sources, suggestion))
 
 
 def reportProperMismatch(pageTitle: str,
@@ -162,12 +440,12 @@ def reportProperMismatch(pageTitle: str,
                          computedAbbrev: str,
                          computedLang: str,
                          matchingPatterns: str,
-                         hasISO4Redirect: bool) -> None:
+                         hasISO4Redirect: bool,
+                         infoboxId: int = 0) -> None:
     """Report abbrev mismatch, where switching the language would not help."""
-    __report['mismatch'].append([pageTitle, infoboxTitle,
-                                 infoboxAbbrev, computedAbbrev,
-                                 computedLang, matchingPatterns,
-                                 hasISO4Redirect])
+    __report['mismatch'].append(MismatchRow(
+        pageTitle, infoboxTitle, infoboxAbbrev, computedAbbrev,
+        computedLang, matchingPatterns, hasISO4Redirect, infoboxId))
 
 
 def reportLanguageMismatch(pageTitle: str,
@@ -179,7 +457,8 @@ def reportLanguageMismatch(pageTitle: str,
                            infoboxCountry: str,
                            computedLanguage: str,
                            matchingPatterns: str,
-                           hasISO4Redirect: bool) -> None:
+                           hasISO4Redirect: bool,
+                           infoboxId: int = 0) -> None:
     """Report abbrev mismatch caused by language.
 
     That is, report mismatches that would not be a mismatch if we switched
@@ -192,11 +471,11 @@ def reportLanguageMismatch(pageTitle: str,
     `matchingPatterns` is the string that lists patterns that applied to the
     title when computing the abbreviation.
     """
-    __report['mismatchLang'].append([pageTitle, infoboxTitle, infoboxAbbrev,
-                                     computedAbbrev, otherComputedAbbrev,
-                                     infoboxLanguage, infoboxCountry,
-                                     computedLanguage, matchingPatterns,
-                                     hasISO4Redirect])
+    __report['mismatchLang'].append(LanguageMismatchRow(
+        pageTitle, infoboxTitle, infoboxAbbrev,
+        computedAbbrev, otherComputedAbbrev,
+        infoboxLanguage, infoboxCountry,
+        computedLanguage, matchingPatterns, hasISO4Redirect, infoboxId))
 
 
 def reportBadDBAbbrev(pageTitle: str,
@@ -205,10 +484,12 @@ def reportBadDBAbbrev(pageTitle: str,
                       paramAbbrev: str,
                       dbAbbrev: str,
                       issn: str,
-                      whichDb: str) -> None:
+                      whichDb: str,
+                      infoboxId: int = 0) -> None:
     """Report abbrev missing or mismatching w.r.t. NLM/PubMed or MathSciNet."""
-    __report['badDbAbbrev'].append([pageTitle, infoboxTitle, infoboxAbbrev,
-                                    paramAbbrev, dbAbbrev, issn, whichDb])
+    __report['badDbAbbrev'].append(BadDBAbbrevRow(
+        pageTitle, infoboxTitle, infoboxAbbrev,
+        paramAbbrev, dbAbbrev, issn, whichDb, infoboxId))
 
 
 def wikiEscape(s: str) -> str:
@@ -246,137 +527,133 @@ class WikiTable:
         """Append a row to the table."""
         self.rows.append(list(cells))
 
-    def __str__(self) -> str:
-        """Return wikicode for the full table."""
-        result = "{| class='wikitable sortable'\n"
-        result += "|-\n! " + (" !! ".join(self.header)) + "\n"
+    def write(self, out: TextIO) -> None:
+        """Write wikicode for the full table to `out`."""
+        out.write("{| class='wikitable sortable'\n")
+        out.write("|-\n! " + (" !! ".join(self.header)) + "\n")
         for row in self.rows:
-            result += "|-\n| " + (" || ".join(row)) + "\n"
-        result += "|}\n"
-        return result
+            out.write("|-\n| " + (" || ".join(row)) + "\n")
+        out.write("|}\n")
 
-
-def printReportOnInfoboxPerPageNumbers() -> None:
-    """Print report on number of pages with i infoboxes, for each i."""
-    print("==Number of infoboxes per page==")
-    result: Dict[int, List[str]] = {}
-    for title, page in state.getPagesDict().items():
-        length = len(page['infoboxes'])
-        if length not in result:
-            result[length] = []
-        result[length].append(title)
-    for i in result:
-        print("There are", len(result[i]), "pages with", i, "infoboxes.")
-        if i == 0 or i >= 5:
-            for title in result[i]:
-                print("[[", title, "]]")
+    def __str__(self) -> str:
+        """Return wikicode for the full table."""
+        out = io.StringIO()
+        self.write(out)
+        return out.getvalue()
 
 
+def aggregateReports(debug: bool = False) -> Aggregate:
+    """Compute stats, histogram and sorted report rows in one pass.
 
-# from pprint import pp
-
-# def y() -> str:
-#     for title, page in state.getPagesDict().items():
-#             # if title == "Off Our Backs":
-#             print("C" * 100)
-#             pp(title)
-#             pp(page)
-#             print("D" * 100)
-#             for infobox in page['infoboxes']:
-#                 t = re.sub(r'\s*\(.*(ournal|agazine|eriodical|eview)s?\)', '',
-#                            title)
-#                 name = infobox.get('title', t)
-#                 if 'abbreviation' not in infobox or infobox['abbreviation'] == '':
-#                     print("XXX EMPTY", title)
-#                     pp(page)
-
-
-def getOverallStats() -> str:
-    """Return wikitext with number of infobox-journals, mismatches, etc."""
-    nTotal = 0  # In total.
-    nIJsWithoutAbbrev = 0  # With no (human) abbreviation parameter.
-    nIJsWithMissingAbbrev = 0  # With no computed abbreviation.
-    nIJsWithExactMatch = 0  # With exact match.
-    nIJsWithCompatMatch = 0  # With match up to e.g. removing parens.
-    nIJsWithMismatch = 0  # With mismatch.
-    from pprint import pp
+    With `debug`, print each page that has an empty abbreviation.
+    """
+    nTotal = 0
+    nWithoutAbbrev = 0
+    nMissingAbbrev = 0
+    nExactMatch = 0
+    nCompatMatch = 0
+    nMismatch = 0
+    infoboxesPerPage: Dict[int, List[str]] = {}
     for title, page in state.getPagesDict().items():
+        infoboxesPerPage.setdefault(len(page['infoboxes']), []).append(title)
         for infobox in page['infoboxes']:
             t = re.sub(r'\s*\(.*(ournal|agazine|eriodical|eview)s?\)', '',
                        title)
             name = infobox.get('title', t)
             nTotal += 1
-            if 'abbreviation' not in infobox or infobox['abbreviation'] == '':                
-                nIJsWithoutAbbrev += 1
-                print("AAA EMPTY", title)
-                pp(page)
+            if 'abbreviation' not in infobox or infobox['abbreviation'] == '':
+                nWithoutAbbrev += 1
+                if debug:
+                    print("Empty abbreviation:", title)
+                    pp(page)
+                continue
+            iabbrev = infobox['abbreviation']
+            try:
+                altName = abbrevUtils.stripTitle(title)
+                cLang = abbrevUtils.getLanguage(infobox)
+                cabbrev = state.getAbbrev(name or altName, cLang)
+            except state.NotComputedYetError:
+                print(f"Still no computed abbrev for {title!r} {name!r} {cLang!r}")
+                nMissingAbbrev += 1
+                continue
+            cabbrev = normalize('NFC', cabbrev).strip()
+            if iabbrev == cabbrev:
+                nExactMatch += 1
+            elif abbrevUtils.isSoftMatch(iabbrev.lower(), cabbrev.lower()):
+                nCompatMatch += 1
             else:
-                iabbrev = infobox['abbreviation']
-                try:
-                    altName = abbrevUtils.stripTitle(title)
-                    cLang = abbrevUtils.getLanguage(infobox)
-                    cabbrev = state.getAbbrev(name or altName, cLang)
-                except state.NotComputedYetError:
-                    print(f"Still no computed abbrev for {title!r} {name!r} {cLang!r}")
-                    nIJsWithMissingAbbrev += 1
-                    continue
-                cabbrev = normalize('NFC', cabbrev).strip()
-                if iabbrev == cabbrev:
-                    nIJsWithExactMatch += 1
-                elif abbrevUtils.isSoftMatch(iabbrev.lower(), cabbrev.lower()):
-                    nIJsWithCompatMatch += 1
-                else:
-                    nIJsWithMismatch += 1
-    return ("Out of {} [[Template:Infobox journal|infobox journals]],\n"
-            "{} have an empty ''abbreviation'' parameter,\n"
-            "{} have the same as guessed by the bot,\n"
-            "{} have something different.\n"
-            "({} have no computed abbreviation)\n\n").format(
-                nTotal,
-                nIJsWithoutAbbrev,
-                nIJsWithExactMatch + nIJsWithCompatMatch,
-                nIJsWithMismatch,
-                nIJsWithMissingAbbrev)
-
-
-def getShortMismatchReport() -> str:
-    """Get the shorter wiki report on mismatches.
+                nMismatch += 1
+    rows = {key: sorted(value) for key, value in __report.items()}
+    rows['badDbAbbrev'].sort(key=lambda row: (row.whichDb, row))
+    return Aggregate(
+        OverallStats(nTotal, nWithoutAbbrev, nMissingAbbrev,
+                     nExactMatch, nCompatMatch, nMismatch),
+        infoboxesPerPage,
+        rows)
+
+
+def printReportOnInfoboxPerPageNumbers(agg: Aggregate) -> None:
+    """Print report on number of pages with i infoboxes, for each i."""
+    print("==Number of infoboxes per page==")
+    for i, titles in agg.infoboxesPerPage.items():
+        print("There are", len(titles), "pages with", i, "infoboxes.")
+        if i == 0 or i >= 5:
+            for title in titles:
+                print("[[", title, "]]")
+
+
+def writeOverallStats(out: TextIO, stats: OverallStats) -> None:
+    """Write wikitext with number of infobox-journals, mismatches, etc."""
+    out.write(("Out of {} [[Template:Infobox journal|infobox journals]],\n"
+               "{} have an empty ''abbreviation'' parameter,\n"
+               "{} have the same as guessed by the bot,\n"
+               "{} have something different.\n"
+               "({} have no computed abbreviation)\n\n").format(
+                   stats.nTotal,
+                   stats.nWithoutAbbrev,
+                   stats.nExactMatch + stats.nCompatMatch,
+                   stats.nMismatch,
+                   stats.nMissingAbbrev))
+
+
+def writeShortMismatchReport(out: TextIO, rows: List[MismatchRow]) -> None:
+    """Write the shorter wiki report on mismatches.
 
     A costly template is used to display each mismatch,
     so we list fewer of them.
     """
-    r = ("The first 50 mismatches:\n"
-         "{| class='wikitable'\n|-\n"
-         "!page title\n"
-         "!infobox title\n"
-         "!infobox abbrv\n"
-         "!bot guess\n"
-         "!validate\n"
-         "!lang\n"
-         "! scope='column' style='width: 400px;' | matching LTWA patterns\n")
+    out.write("The first 50 mismatches:\n"
+              "{| class='wikitable'\n|-\n"
+              "!page title\n"
+              "!infobox title\n"
+              "!infobox abbrv\n"
+              "!bot guess\n"
+              "!validate\n"
+              "!lang\n"
+              "! scope='column' style='width: 400px;' | matching LTWA patterns\n")
     i = 0
-    for wikititle, infotitle, iabbrev, cabbrev, clang, \
-            matchingPatterns, hasISO4Redirect in sorted(__report['mismatch']):
-        if hasISO4Redirect:
+    for row in rows:
+        if row.hasISO4Redirect:
             continue
         i += 1
-        if infotitle == wikititle:
+        if i > 50:
+            break
+        infotitle = row.infoboxTitle
+        if infotitle == row.pageTitle:
             infotitle = ''
-        if i <= 50:
-            r += (f"|-\n{{{{ISO 4 mismatch"
-                  f" |pagename={wikititle}"
+        out.write(f"|-\n{{{{ISO 4 mismatch"
+                  f" |pagename={row.pageTitle}"
                   f" |title={wikiEscape(infotitle)}"
-                  f" |abbreviation={wikiEscape(iabbrev)}"
-                  f" |bot-guess={wikiEscape(cabbrev)}"
+                  f" |abbreviation={wikiEscape(row.infoboxAbbrev)}"
+                  f" |bot-guess={wikiEscape(row.computedAbbrev)}"
                   f"}}}}\n"
-                  f"|{(clang or '??')}\n"
-                  f"|{wikiPre(matchingPatterns)}\n")
-    r += "|}\n"
-    return r
+                  f"|{(row.computedLang or '??')}\n"
+                  f"|{wikiPre(row.matchingPatterns)}\n")
+    out.write("|}\n")
 
 
-def getLongMismatchReport() -> str:
-    """Get the longer wiki report on mismatches.
+def writeLongMismatchReport(out: TextIO, rows: List[MismatchRow]) -> None:
+    """Write the longer wiki report on mismatches.
 
     This one is a simple table, so we can afford listing more.
     """
@@ -389,35 +666,33 @@ def getLongMismatchReport() -> str:
                 "| matching LTWA patterns")]
     t1 = WikiTable(*headers)
     t2 = WikiTable(*headers)
-    for i, (wikititle, infotitle, iabbrev, cabbrev,
-            clang, matchingPatterns, hasISO4Redirect) \
-            in enumerate(sorted(__report['mismatch'])):
-        if infotitle == wikititle:
+    for row in rows[:201]:
+        infotitle = row.infoboxTitle
+        if infotitle == row.pageTitle:
             infotitle = ''
-        if i <= 200:
-            row = [f"[[{wikititle}]]",
-                   linkNoRedir(infotitle),
-                   linkNoRedir(iabbrev),
-                   linkNoRedir(cabbrev),
-                   clang or '??',
-                   wikiPre(matchingPatterns)]
-            if not hasISO4Redirect:
-                t1.appendRow(*row)
-            else:
-                t2.appendRow(*row)
-    return (
-        "== The first 200 mismatches ==\n"
-        + str(t1)
-        + "=== with existing redirect marked as ISO-4 ===\n"
-        "We separately list mismatches when there already is a redirect "
-        "categorized as ISO-4 (coming from the infobox abbrev), since it "
-        "was probably edited by a human with more care, and because "
-        "wrongly categorized redirects need to be fixed.\n"
-        + str(t2))
-
-
-def getLanguageMismatchReport() -> str:
-    """Get sub-report on mismatches that would match if lang would change."""
+        cells = [f"[[{row.pageTitle}]]",
+                 linkNoRedir(infotitle),
+                 linkNoRedir(row.infoboxAbbrev),
+                 linkNoRedir(row.computedAbbrev),
+                 row.computedLang or '??',
+                 wikiPre(row.matchingPatterns)]
+        if not row.hasISO4Redirect:
+            t1.appendRow(*cells)
+        else:
+            t2.appendRow(*cells)
+    out.write("== The first 200 mismatches ==\n")
+    t1.write(out)
+    out.write("=== with existing redirect marked as ISO-4 ===\n"
+              "We separately list mismatches when there already is a redirect "
+              "categorized as ISO-4 (coming from the infobox abbrev), since it "
+              "was probably edited by a human with more care, and because "
+              "wrongly categorized redirects need to be fixed.\n")
+    t2.write(out)
+
+
+def writeLanguageMismatchReport(out: TextIO,
+                                rows: List[LanguageMismatchRow]) -> None:
+    """Write sub-report on mismatches that would match if lang would change."""
     headers = ["page title",
                "infobox title",
                "infobox abbrv",
@@ -429,57 +704,55 @@ def getLanguageMismatchReport() -> str:
                 "| matching LTWA patterns")]
     t1 = WikiTable(*headers)
     t2 = WikiTable(*headers)
-    for i, (wikititle, infotitle, iabbrev, cabbrev, _othercabbrev,
-            ilang, icountry, clang, matchingPatterns, hasISO4Redirect) \
-            in enumerate(sorted(__report['mismatchLang'])):
-        if i > 50:
-            break
-        if infotitle == wikititle:
+    for row in rows[:51]:
+        infotitle = row.infoboxTitle
+        if infotitle == row.pageTitle:
             infotitle = ''
-        row = [f"[[{wikititle}]]",
-               linkNoRedir(infotitle),
-               linkNoRedir(iabbrev),
-               linkNoRedir(cabbrev),
-               wikiEscape(ilang),
-               wikiEscape(icountry),
-               clang or '??',
-               wikiPre(matchingPatterns)]
-        if not hasISO4Redirect:
-            t1.appendRow(*row)
+        cells = [f"[[{row.pageTitle}]]",
+                 linkNoRedir(infotitle),
+                 linkNoRedir(row.infoboxAbbrev),
+                 linkNoRedir(row.computedAbbrev),
+                 wikiEscape(row.infoboxLanguage),
+                 wikiEscape(row.infoboxCountry),
+                 row.computedLanguage or '??',
+                 wikiPre(row.matchingPatterns)]
+        if not row.hasISO4Redirect:
+            t1.appendRow(*cells)
         else:
-            t2.appendRow(*row)
-    return (
+            t2.appendRow(*cells)
+    out.write(
         "== Wrong language rules? ==\n"
         "First 50 mismatches where just changing the language between 'eng'"
         " and 'all' would give a match (this affect which rules from the "
         "[[LTWA]] are used). This means that either the bot wrongly guessed "
         " the language to use (based on country and lang infobox params), or"
-        " that the editor applied non-English rules to an English title.\n"
-        + str(t1)
-        + "=== with existing redirects marked as ISO-4 ===\n"
-        + str(t2))
+        " that the editor applied non-English rules to an English title.\n")
+    t1.write(out)
+    out.write("=== with existing redirects marked as ISO-4 ===\n")
+    t2.write(out)
 
 
-def getColonInTitleReport() -> str:
-    """Get sub-report on abbrevs containing colons.
+def writeColonInTitleReport(out: TextIO, rows: List[ColonRow]) -> None:
+    """Write sub-report on abbrevs containing colons.
 
     Colons may be impossible in wiki code because of inter-wiki syntax.
     """
     table = WikiTable("page title", "infobox title", "infobox abbrv")
-    for wikititle, infotitle, iabbrev in sorted(__report['colon']):
-        if infotitle == wikititle:
+    for row in rows:
+        infotitle = row.infoboxTitle
+        if infotitle == row.pageTitle:
             infotitle = ''
-        table.appendRow(f"[[{wikititle}]]",
+        table.appendRow(f"[[{row.pageTitle}]]",
                         linkNoRedir(infotitle),
-                        linkNoRedir(iabbrev))
-    return (
-        "== Abbreviations containing colons ==\n"
-        "(within first 4 characters; skipped by the bot for safety)\n"
-        + str(table))
+                        linkNoRedir(row.infoboxAbbrev))
+    out.write("== Abbreviations containing colons ==\n"
+              "(within first 4 characters; skipped by the bot for safety)\n")
+    table.write(out)
 
 
-def getTrivialAbbrevReport() -> str:
-    """Get report on abbrevs without abbreviated words.
+def writeTrivialAbbrevReport(out: TextIO,
+                             rows: List[TrivialAbbrevRow]) -> None:
+    """Write report on abbrevs without abbreviated words.
 
     These could create misleading redirects.
     """
@@ -487,80 +760,80 @@ def getTrivialAbbrevReport() -> str:
                       "infobox title",
                       "infobox abbrv",
                       "ISO-4 redirects")
-    for wikititle, infotitle, iabbrev, redirects in sorted(__report['nodots']):
-        if infotitle in (wikititle, iabbrev, ''):
+    for row in rows:
+        redirects = row.allRedirects
+        infotitle = row.infoboxTitle
+        if infotitle in (row.pageTitle, row.infoboxAbbrev, ''):
             infotitle = ''
         s = []
         for rTitle, rContent in sorted(redirects.items()):
             if 'ISO' in rContent:
                 s.append(linkNoRedir(rTitle))
-        if iabbrev not in redirects.keys() \
+        if row.infoboxAbbrev not in redirects.keys() \
                 and infotitle not in redirects.keys() and not s:
             continue
-        table.appendRow(f"[[{wikititle}]]",
+        table.appendRow(f"[[{row.pageTitle}]]",
                         linkNoRedir(infotitle),
-                        linkNoRedir(iabbrev),
+                        linkNoRedir(row.infoboxAbbrev),
                         ', '.join(s))
-    return (
+    out.write(
         "== Abbreviations without abbreviated words ==\n"
         "(skipped by the bot for safety)\n"
-        "All the redirects marked as ISO-4 here may be wrong or confusing.\n"
-        + str(table))
+        "All the redirects marked as ISO-4 here may be wrong or confusing.\n")
+    table.write(out)
 
 
-def getExistingRedirectReport() -> str:
-    """Get sub-report on unexpected existing redirects.
+def writeExistingRedirectReport(out: TextIO,
+                                rows: List[ExistingRedirectRow]) -> None:
+    """Write sub-report on unexpected existing redirects.
 
     This includes unexpected rcats or parameters,
     which we don't want to overwrite.
     """
     table = WikiTable("page title", "infobox abbrv", "redirect content")
-    for wikititle, iabbrev, content \
-            in sorted(__report['existingredirect']):
-        if '#' in content[5:]:
+    for row in rows:
+        if '#' in row.redirectContent[5:]:
             continue
-        table.appendRow(f"[[{wikititle}]]",
-                        linkNoRedir(iabbrev),
-                        wikiPre(content, nowiki=True))
-    return (
-        "== Unusual redirects ==\n"
-        "Redirects (to the page we came from) that already exists "
-        "with some unexpected rcats or parameters.\n"
-        + str(table))
+        table.appendRow(f"[[{row.pageTitle}]]",
+                        linkNoRedir(row.redirectTitle),
+                        wikiPre(row.redirectContent, nowiki=True))
+    out.write("== Unusual redirects ==\n"
+              "Redirects (to the page we came from) that already exists "
+              "with some unexpected rcats or parameters.\n")
+    table.write(out)
 
 
-def getExistingPageReport() -> str:
-    """Get sub-report on pre-existing pages.
+def writeExistingPageReport(out: TextIO, rows: List[ExistingPageRow]) -> None:
+    """Write sub-report on pre-existing pages.
 
     These are non-redirect pages and redirects to unrelated pages,
     which we don't want to overwrite.
     """
     table = WikiTable("page title", "r. from infobox abbrev")
-    for wikititle, iabbrev in sorted(__report['existingpage']):
-        table.appendRow(f"[[{wikititle}]]",
-                        linkNoRedir(iabbrev))
-    return (
-        "== Unusual redirect pages ==\n"
-        "Pages that already exist, "
-        "redirecting to something unexpected or not a redirect at all "
-        " (may be wrong or may need a [[WP:HAT|hatnote]]):\n"
-        + str(table))
-
-
-def getSuperfluousRedirectReport() -> str:
-    """Get sub-report on ISO-4-categorized redirects that we would not add."""
+    for row in rows:
+        table.appendRow(f"[[{row.pageTitle}]]",
+                        linkNoRedir(row.redirectTitle))
+    out.write("== Unusual redirect pages ==\n"
+              "Pages that already exist, "
+              "redirecting to something unexpected or not a redirect at all "
+              " (may be wrong or may need a [[WP:HAT|hatnote]]):\n")
+    table.write(out)
+
+
+def writeSuperfluousRedirectReport(out: TextIO,
+                                   rows: List[SuperfluousRedirectRow]) -> None:
+    """Write sub-report on ISO-4-categorized redirects we would not add."""
     table = WikiTable("page title",
                       "the redirect",
                       "infobox abbreviation",
                       "existing redirects")
-    for wikititle, rTitle, _rContent, \
-            expectedRedirect, potentials in sorted(__report['iso4redirect']):
-        table.appendRow(f"[[{wikititle}]]",
-                        linkNoRedir(rTitle),
-                        wikiEscape(expectedRedirect),
-                        ', '.join(linkNoRedir(t) for t in potentials))
-        # wikiPre(_rContent, nowiki=True)"
-    return (
+    for row in rows:
+        table.appendRow(f"[[{row.pageTitle}]]",
+                        linkNoRedir(row.redirectTitle),
+                        wikiEscape(row.exampleExpectedRedirectTitle),
+                        ', '.join(linkNoRedir(t)
+                                  for t in row.potentialTitles))
+    out.write(
         "== Existing unexpected ISO-4 redirects ==\n"
         "Redirects marked as ISO-4 that the bot would not add. "
         "Very different ones are probably valid, like from former titles "
@@ -568,12 +841,51 @@ def getSuperfluousRedirectReport() -> str:
         "Similar ones are probably a mistake. "
         "For ''PLoS'' vs ''PLOS'' I'd say both are valid.\n"
         "Existing redirects show titles that would abbreviate "
-        "to the questioned one.\n"
-        + str(table))
-
-
-def getBadDBAbbrevReport() -> str:
-    """Get sub-report on bad abbrevs comparing to NLM or MathSciNet."""
+        "to the questioned one.\n")
+    table.write(out)
+
+
+def writeMisattributedRedirectReport(
+        out: TextIO, rows: List[MisattributedRedirectRow]) -> None:
+    """Write sub-report on ISO-4 redirects to the wrong journal."""
+    table = WikiTable("the redirect",
+                      "redirects to",
+                      "closest abbreviation",
+                      "distance",
+                      "abbreviation of")
+    for row in rows:
+        table.appendRow(linkNoRedir(row.redirectTitle),
+                        f"[[{row.pageTitle}]]",
+                        wikiEscape(row.closestAbbrev),
+                        str(row.distance),
+                        ', '.join(f"[[{t}]]"
+                                  for t in row.closestAbbrevPageTitles))
+    out.write(
+        "== ISO-4 redirects to the wrong journal? ==\n"
+        "Redirects marked as ISO-4 whose closest known abbreviations "
+        "(from infoboxes or computed, over all journals) belong to other "
+        "journals, not to the one they redirect to.\n")
+    table.write(out)
+
+
+def writeAbbrevCollisionReport(out: TextIO,
+                               rows: List[AbbrevCollisionRow]) -> None:
+    """Write sub-report on abbrevs claimed by several journals."""
+    table = WikiTable("abbreviation", "journals", "suggestion")
+    for row in rows:
+        table.appendRow(linkNoRedir(row.redirectTitle),
+                        row.sources,
+                        row.suggestion)
+    out.write(
+        "== Abbreviations shared by several journals ==\n"
+        "Abbreviations (from infoboxes, NLM/MathSciNet or computed) that "
+        "more than one journal would get a redirect from. The bot creates "
+        "none of these redirects.\n")
+    table.write(out)
+
+
+def writeBadDBAbbrevReport(out: TextIO, rows: List[BadDBAbbrevRow]) -> None:
+    """Write sub-report on bad abbrevs comparing to NLM or MathSciNet."""
     table = WikiTable("page title",
                       "infobox title",
                       "(ISO 4) abbreviation=",
@@ -581,17 +893,15 @@ def getBadDBAbbrevReport() -> str:
                       "should be",
                       "issn",
                       "type")
-    for wikititle, infoboxTitle, infoboxAbbrev, paramAbbrev,\
-            dbAbbrev, issn, whichDb \
-            in sorted(__report['badDbAbbrev'], key=lambda x: (x[6], x)):
-        table.appendRow(f"[[{wikititle}]]",
-                        linkNoRedir(infoboxTitle),
-                        linkNoRedir(infoboxAbbrev),
-                        linkNoRedir(paramAbbrev),
-                        linkNoRedir(dbAbbrev),
-                        issn,
-                        whichDb)
-    return (
+    for row in rows:
+        table.appendRow(f"[[{row.pageTitle}]]",
+                        linkNoRedir(row.infoboxTitle),
+                        linkNoRedir(row.infoboxAbbrev),
+                        linkNoRedir(row.paramAbbrev),
+                        linkNoRedir(row.dbAbbrev),
+                        row.issn,
+                        row.whichDb)
+    out.write(
         "What the abbreviations should be according to bot's parse of"
         " NLM/MathSciNet data files. Parameters differing only in diacritics"
         " or non-alphabetic characters are not listed.\n\n"
@@ -602,5 +912,141 @@ def getBadDBAbbrevReport() -> str:
         " here] or [https://mathscinet.ams.org/mathscinet/search/newjCSV.html"
         " here]; the parsing process for MathSciNet is not perfect, so please"
         " double-check (search [https://mathscinet.ams.org/mathscinet"
-        "/searchjournals.html here] if you have access).\n"
-        + str(table))
+        "/searchjournals.html here] if you have access).\n")
+    table.write(out)
+
+
+# Short descriptions of report sections, used in the changes report.
+SECTION_NAMES = {
+    'colon': 'colon in abbrv',
+    'nodots': 'trivial abbrv',
+    'existingpage': 'existing page',
+    'existingredirect': 'unusual redirect',
+    'iso4redirect': 'unexpected ISO-4 redirect',
+    'collision': 'abbrv collision',
+    'misattributed': 'misattributed ISO-4 redirect',
+    'mismatch': 'mismatch',
+    'mismatchLang': 'language mismatch',
+    'badDbAbbrev': 'NLM/MathSciNet abbrv'
+}
+
+
+def rowKey(section: str, row: Any) -> str:
+    """Return key identifying the entry a row is about, stable across runs.
+
+    Rows about infoboxes are identified by the infobox's index on the page,
+    rows about redirects by the redirect's title.
+    """
+    if hasattr(row, 'infoboxId'):
+        entry = f'#{row.infoboxId}'
+    else:
+        entry = row.redirectTitle
+    return f'{section}\t{row.pageTitle}\t{entry}'
+
+
+def rowHash(row: Any) -> str:
+    """Return a short hash of row content, to detect changed entries."""
+    content = json.dumps(row, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:12]
+
+
+def makeSnapshot(rows: Dict[str, List[Any]]) -> Snapshot:
+    """Return a compact snapshot of all report rows."""
+    return {
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'rows': {rowKey(section, row): rowHash(row)
+                 for section, sectionRows in rows.items()
+                 for row in sectionRows}
+    }
+
+
+def loadSnapshot(fileName: str) -> Optional[Snapshot]:
+    """Load a snapshot saved by `saveSnapshot`, or None if there's none."""
+    try:
+        with open(fileName, 'rt') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def saveSnapshot(fileName: str, snapshot: Snapshot) -> None:
+    """Save snapshot to a json file."""
+    with open(fileName, 'wt') as f:
+        json.dump(snapshot, f, separators=(',', ':'))
+
+
+def getDeltaReport(previous: Snapshot, current: Snapshot,
+                   rows: Dict[str, List[Any]]) -> str:
+    """Get report on rows new, resolved or changed since `previous`.
+
+    Only the differing rows are rendered; resolved ones are described just
+    by their key, since the previous snapshot only keeps hashes.
+    """
+    prevRows: Dict[str, str] = previous['rows']
+    curRows: Dict[str, str] = current['rows']
+    new = curRows.keys() - prevRows.keys()
+    resolved = prevRows.keys() - curRows.keys()
+    changed = {key for key in curRows.keys() & prevRows.keys()
+               if curRows[key] != prevRows[key]}
+    shown = new | changed
+    rowsByKey = {}
+    for section, sectionRows in rows.items():
+        for row in sectionRows:
+            key = rowKey(section, row)
+            if key in shown:
+                rowsByKey[key] = row
+
+    out = io.StringIO()
+    out.write(f"Changes in the [[User:TokenzeroBot/ISO 4|ISO 4 reports]] "
+              f"since {previous['date']}: {len(new)} new, "
+              f"{len(resolved)} resolved and {len(changed)} changed "
+              f"entries.\n")
+    for heading, keys in [("New", new), ("Changed", changed)]:
+        table = WikiTable("report", "page title", "entry", "details")
+        for key in sorted(keys):
+            section, pageTitle, entry = key.split('\t')
+            table.appendRow(SECTION_NAMES[section],
+                            f"[[{pageTitle}]]",
+                            describeEntry(entry),
+                            describeRow(section, rowsByKey[key]))
+        out.write(f"== {heading} ==\n")
+        table.write(out)
+    table = WikiTable("report", "page title", "entry")
+    for key in sorted(resolved):
+        section, pageTitle, entry = key.split('\t')
+        table.appendRow(SECTION_NAMES.get(section, section),
+                        f"[[{pageTitle}]]",
+                        describeEntry(entry))
+    out.write("== Resolved ==\n")
+    table.write(out)
+    return out.getvalue()
+
+
+def describeEntry(entry: str) -> str:
+    """Return wikitext for the entry part of a row key."""
+    if entry.startswith('#'):
+        return f'infobox {int(entry[1:]) + 1}'
+    return linkNoRedir(entry)
+
+
+def describeRow(section: str, row: Any) -> str:
+    """Return short wikitext with the gist of a report row."""
+    if section in ('mismatch', 'mismatchLang'):
+        return (f"{linkNoRedir(row.infoboxAbbrev)} (bot guess: "
+                f"{linkNoRedir(row.computedAbbrev)})")
+    if section == 'badDbAbbrev':
+        return (f"{linkNoRedir(row.paramAbbrev)} (should be: "
+                f"{linkNoRedir(row.dbAbbrev)}, {row.whichDb})")
+    if section in ('colon', 'nodots'):
+        return linkNoRedir(row.infoboxAbbrev)
+    if section == 'existingredirect':
+        return wikiPre(row.redirectContent, nowiki=True)
+    if section == 'iso4redirect':
+        return wikiEscape(row.exampleExpectedRedirectTitle)
+    if section == 'misattributed':
+        return (f"{wikiEscape(row.closestAbbrev)} (of "
+                + ', '.join(f'[[{t}]]' for t in row.closestAbbrevPageTitles)
+                + ")")
+    if section == 'collision':
+        return ', '.join(f'[[{t}]]' for t in row.otherPageTitles)
+    return ''
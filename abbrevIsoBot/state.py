@@ -1,7 +1,17 @@
 """A module for the state, shared between runs and with abbrevIsoBot.js."""
 
+import atexit
 import json
-from typing import Any, Dict, Optional
+import os
+import queue
+import shlex
+import subprocess
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, \
+    Tuple, Union
+
+from utils import countStat, phase
 
 # `state` is a global variable maintained between runs.
 # state = {
@@ -14,7 +24,8 @@ from typing import Any, Dict, Optional
 #                           ...
 #             ],
 #             'redirects': {
-#                 'Redirect Page Title': 'Redirect Page Wikitext Content',
+#                 'Redirect Page Title': index in 'redirectTexts'
+#                     (or, in old states, the wikitext itself),
 #                 ...
 #             },
 #         },
@@ -24,12 +35,51 @@ from typing import Any, Dict, Optional
 #         'Wiki Page or Infobox Tile': {
 #             'eng': 'abbrevISO-computed abbreviation
 #                 using only eng,mul,lat,und LTWA rules',
-#             'all': 'using all rules'
+#             'all': 'using all rules',
+#             'matchingPatterns': list of indices in 'patterns'
+#                 (or, as abbrevIsoBot.js writes it, the lines joined by '\n')
+#         },
+#         ...
+#     },
+#     'redirectTexts': [
+#         'Redirect Page Wikitext Content, with the title of the page
+#             it redirects to replaced by TITLE_SENTINEL',
+#         ...
+#     ],
+#     'patterns': ['A line of matchingPatterns', ...],
+#     'generation': number of full scrapes that ended with `sweep()`,
+#     'pinned': {
+#         'root (e.g. a list file of omicsBot)': ['Title', ...]
+#             (titles whose abbrevs `sweep()` never evicts)
+#     },
+#     'lastSeen': {
+#         'pages': {'Wiki Page Title': last generation it was scraped in},
+#         'abbrevs': {'Title': last generation its abbrevs were used in},
+#     },
+#     'reports': {
+#         'Report Page Title': 'sha1 hexdigest of its last saved content',
+#         ...
+#     },
+#     'simplifiedAbbrevs': ['Title', ...] (titles whose abbrevs were computed
+#         by a provider with simplified rules, see `getReferenceAbbrevs()`),
+#     'fillSkipped': {
+#         'Wiki Page Title': {
+#             'revid': revid at which the fill job had nothing to fill,
+#             'infoboxes': [{'title': ..., 'issn': ..., ...}, ...]
+#                 (only the params fills depend on),
+#             'fingerprint': 'sha1 hexdigest of what fills depended on',
 #         },
 #         ...
 #     }
+# Most redirects have one of a few dozen texts, once the title is replaced,
+# and the same LTWA patterns match many titles, so these are stored once.
 __state = {}  # type: Dict[str, Dict[str, Any]]
 _stateFileName = ''
+# Stands for the page title in 'redirectTexts' (it can't appear in wikitext).
+TITLE_SENTINEL = '\0'
+# Dicts from strings to their indices in 'redirectTexts' and 'patterns'.
+_redirectTextIds: Dict[str, int] = {}
+_patternIds: Dict[str, int] = {}
 
 
 def loadOrInitState(stateFileName: str) -> None:
@@ -51,10 +101,174 @@ def loadOrInitState(stateFileName: str) -> None:
         else:
             print('Initiating empty bot state.')
             __state = {'pages': {}, 'abbrevs': {}}
+    __state.setdefault('generation', 0)
+    __state.setdefault('lastSeen', {'pages': {}, 'abbrevs': {}})
+    _internStrings()
+    _resetPendingAbbrevs()
+
+
+def _internStrings() -> None:
+    """Index the tables of shared strings, move any other strings into them.
+
+    Redirect texts from old states and patterns newly written by
+    abbrevIsoBot.js are not in the tables yet.
+    """
+    _redirectTextIds.clear()
+    _redirectTextIds.update(
+        (text, i) for i, text
+        in enumerate(__state.setdefault('redirectTexts', [])))
+    _patternIds.clear()
+    _patternIds.update(
+        (line, i) for i, line in enumerate(__state.setdefault('patterns', [])))
+    for pageTitle, pageData in __state['pages'].items():
+        redirects = pageData['redirects']
+        for rTitle, rText in redirects.items():
+            if isinstance(rText, str):
+                redirects[rTitle] = _encodeRedirectText(pageTitle, rText)
+    for abbrevs in __state['abbrevs'].values():
+        if abbrevs and isinstance(abbrevs.get('matchingPatterns'), str):
+            abbrevs['matchingPatterns'] = \
+                _encodePatterns(abbrevs['matchingPatterns'])
+
+
+def _intern(table: str, ids: Dict[str, int], s: str) -> int:
+    """Return index of `s` in the table of shared strings, adding it if new."""
+    i = ids.get(s)
+    if i is None:
+        i = len(__state[table])
+        __state[table].append(s)
+        ids[s] = i
+    return i
+
+
+def _encodeRedirectText(pageTitle: str, rText: str) -> Union[int, str]:
+    """Return the stored form of the text of a redirect to `pageTitle`."""
+    if TITLE_SENTINEL in rText or TITLE_SENTINEL in pageTitle:
+        return rText
+    return _intern('redirectTexts', _redirectTextIds,
+                   rText.replace(pageTitle, TITLE_SENTINEL))
+
+
+def _decodeRedirectText(pageTitle: str, rText: Union[int, str]) -> str:
+    """Return the text of a redirect to `pageTitle` from its stored form."""
+    if isinstance(rText, str):
+        return rText
+    return __state['redirectTexts'][rText].replace(TITLE_SENTINEL, pageTitle)
+
+
+def _encodePatterns(patterns: str) -> List[int]:
+    """Return the stored form of matching patterns."""
+    return [_intern('patterns', _patternIds, line)
+            for line in patterns.split('\n')]
+
+
+def _markAbbrevs(title: str) -> None:
+    """Note that abbrevs of `title` are still used, see `sweep()`."""
+    if title in __state['abbrevs']:
+        __state['lastSeen']['abbrevs'][title] = __state['generation']
+
+
+class SweepStats(NamedTuple):
+    """What `sweep()` removed from the state, and what's left."""
+
+    generation: int
+    pagesEvicted: int
+    abbrevsEvicted: int
+    # Evicted only because of the size budget.
+    abbrevsOverBudget: int
+    redirectTextsDropped: int
+    patternsDropped: int
+    pagesLeft: int
+    abbrevsLeft: int
+
+
+def pinAbbrevs(root: str, titles: Iterable[str]) -> None:
+    """Keep abbrevs of `titles` in the state, whenever they were last used.
+
+    Replaces the titles previously pinned for the same `root`, e.g. the list
+    file omicsBot is run on (such bots may run less often than `sweep()`).
+    """
+    __state.setdefault('pinned', {})[root] = sorted(set(titles))
+
+
+def sweep(maxAge: int, maxAbbrevs: Optional[int] = None) -> SweepStats:
+    """Remove stale entries and end the current generation.
+
+    Call this at the end of a full scrape, once per such scrape (the weekly
+    report). Pages that were not scraped and titles whose abbrevs were not
+    used (saved or read, by any bot) in this or the previous `maxAge - 1`
+    generations are removed, except titles pinned with `pinAbbrevs()`.
+    Entries from states older than this mechanism count as used now.
+    With `maxAbbrevs`, the least recently used unpinned titles beyond that
+    number are removed too. Strings no longer used are dropped from the
+    shared tables.
+    """
+    generation = __state['generation']
+    oldest = generation - maxAge + 1
+    pinned: Set[str] = set().union(*__state.get('pinned', {}).values())
+    evicted = {}
+    for table in ['pages', 'abbrevs']:
+        lastSeen = __state['lastSeen'][table]
+        stale = [title for title in __state[table]
+                 if lastSeen.setdefault(title, generation) < oldest
+                 and not (table == 'abbrevs' and title in pinned)]
+        for title in stale:
+            del __state[table][title]
+        for title in [t for t in lastSeen if t not in __state[table]]:
+            del lastSeen[title]
+        evicted[table] = len(stale)
+    overBudget = 0
+    if maxAbbrevs is not None and len(__state['abbrevs']) > maxAbbrevs:
+        lastSeen = __state['lastSeen']['abbrevs']
+        byAge = sorted((title for title in __state['abbrevs']
+                        if title not in pinned), key=lastSeen.__getitem__)
+        overBudget = max(0, len(byAge) - maxAbbrevs)
+        for title in byAge[:overBudget]:
+            del __state['abbrevs'][title]
+            del lastSeen[title]
+    if 'simplifiedAbbrevs' in __state:
+        __state['simplifiedAbbrevs'] = [
+            title for title in __state['simplifiedAbbrevs']
+            if title in __state['abbrevs']]
+    nTexts = len(__state['redirectTexts'])
+    nPatterns = len(__state['patterns'])
+    _dropUnusedStrings()
+    __state['generation'] = generation + 1
+    return SweepStats(
+        generation=generation,
+        pagesEvicted=evicted['pages'],
+        abbrevsEvicted=evicted['abbrevs'],
+        abbrevsOverBudget=overBudget,
+        redirectTextsDropped=nTexts - len(__state['redirectTexts']),
+        patternsDropped=nPatterns - len(__state['patterns']),
+        pagesLeft=len(__state['pages']),
+        abbrevsLeft=len(__state['abbrevs']))
+
+
+def _dropUnusedStrings() -> None:
+    """Rebuild the tables of shared strings with only the used ones."""
+    redirectTexts = __state['redirectTexts']
+    patterns = __state['patterns']
+    __state['redirectTexts'] = []
+    __state['patterns'] = []
+    _redirectTextIds.clear()
+    _patternIds.clear()
+    for pageData in __state['pages'].values():
+        redirects = pageData['redirects']
+        for rTitle, rText in redirects.items():
+            if isinstance(rText, int):
+                redirects[rTitle] = _intern('redirectTexts', _redirectTextIds,
+                                            redirectTexts[rText])
+    for abbrevs in __state['abbrevs'].values():
+        if abbrevs and isinstance(abbrevs.get('matchingPatterns'), list):
+            abbrevs['matchingPatterns'] = [
+                _intern('patterns', _patternIds, patterns[i])
+                for i in abbrevs['matchingPatterns']]
 
 
 def saveState(stateFileName: str) -> None:
     """Save `state` to `STATE_FILE_NAME`."""
+    computePendingAbbrevs()
     print(f"BBB Saving to {stateFileName}")
     with open(stateFileName, 'wt') as f:
         json.dump(__state, f)
@@ -65,8 +279,239 @@ def dump() -> str:
     return json.dumps(__state, indent="\t")
 
 
+# Environment variable with a command (split like a shell would) that runs an
+# abbreviation worker, see `WorkerAbbrevProvider`.
+ABBREV_WORKER_ENV = 'TOKENZERO_ABBREV_WORKER'
+# Max number of titles sent to the provider in one request.
+ABBREV_BATCH_SIZE = 200
+# Seconds to wait for a worker's response before giving up on it.
+ABBREV_WORKER_TIMEOUT = 300
+
+
+class AbbrevProviderError(RuntimeError):
+    """Raised when an abbreviation provider fails."""
+
+
+class AbbrevProvider(ABC):
+    """Computes abbreviations of titles missing them in the state."""
+
+    # Whether abbrevs are computed with rules simplified from abbrevIso.js,
+    # so they are not used to validate such providers, see
+    # `getReferenceAbbrevs()`.
+    simplified = False
+
+    @abstractmethod
+    def compute(self, titles: Dict[str, List[str]]) \
+            -> Dict[str, Dict[str, Optional[str]]]:
+        """Return computed abbrevs of given titles.
+
+        `titles` is a dict from title to the languages to compute, each
+        'all' or a comma-separated list of ISO 639-2 codes.
+        The result is a dict from title to a dict from language to abbrev
+        (or None), also with 'matchingPatterns' (lines joined by '\\n').
+        Titles missing from the result are counted as failed.
+        Raises AbbrevProviderError if the provider can't be used anymore.
+        """
+
+    def close(self) -> None:
+        """Release any resources held by the provider."""
+
+
+class WorkerAbbrevProvider(AbbrevProvider):
+    """Provider asking a long-lived worker process, in JSON lines.
+
+    For each request the worker reads a line {"titles": {title: languages}}
+    from stdin and writes a line {"abbrevs": {title: abbrevs}} (in the format
+    of `AbbrevProvider.compute()`) or {"error": message} to stdout, within
+    `timeout` seconds. See `benchmarks/abbrevWorker.py` for a stub worker.
+    """
+
+    def __init__(self, command: List[str],
+                 timeout: float = ABBREV_WORKER_TIMEOUT) -> None:
+        self.command = command
+        self.timeout = timeout
+        self.process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            encoding='utf-8')
+        # Lines of the worker's stdout, then '' at its end. They are read by
+        # a thread, so that waiting for one can time out.
+        self.lines: queue.Queue = queue.Queue()
+        threading.Thread(target=self._readLines, daemon=True).start()
+        atexit.register(self.close)
+
+    def _readLines(self) -> None:
+        """Put lines written by the worker into `self.lines`, until its end."""
+        assert self.process.stdout
+        try:
+            for line in self.process.stdout:
+                self.lines.put(line)
+        except OSError:
+            pass
+        finally:
+            self.lines.put('')
+
+    def compute(self, titles: Dict[str, List[str]]) \
+            -> Dict[str, Dict[str, Optional[str]]]:
+        """Send a request to the worker and wait for the response."""
+        assert self.process.stdin
+        try:
+            self.process.stdin.write(json.dumps({'titles': titles}) + '\n')
+            self.process.stdin.flush()
+        except OSError as e:
+            raise AbbrevProviderError(f'Worker {self.command}: {e}') from e
+        try:
+            line = self.lines.get(timeout=self.timeout)
+        except queue.Empty:
+            self.process.kill()
+            raise AbbrevProviderError(
+                f'Worker {self.command} did not answer '
+                f'in {self.timeout}s.') from None
+        if not line:
+            raise AbbrevProviderError(f'Worker {self.command} exited '
+                                      f'with {self.process.wait()}.')
+        try:
+            response = json.loads(line)
+        except ValueError as e:
+            raise AbbrevProviderError(
+                f'Worker {self.command} sent invalid JSON: {line!r}') from e
+        if 'error' in response:
+            raise AbbrevProviderError(
+                f'Worker {self.command}: {response["error"]}')
+        return response['abbrevs']
+
+    def close(self) -> None:
+        """Close the worker's input and wait for it to exit."""
+        if self.process.poll() is None:
+            assert self.process.stdin
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+
+# The provider computing abbrevs during the run, if any.
+_abbrevProvider: Optional[AbbrevProvider] = None
+# Dict from titles to compute to their languages missing an abbrev.
+_pendingAbbrevs: Dict[str, Set[str]] = {}
+# Pairs (title, language) already sent to the provider, so that failures are
+# not sent again in the same run.
+_requestedAbbrevs: Set[Tuple[str, str]] = set()
+
+
+def initAbbrevProvider(command: Optional[List[str]] = None) -> None:
+    """Compute missing abbrevs during the run, with a worker if configured.
+
+    The worker is run with `command` or else $TOKENZERO_ABBREV_WORKER. Without
+    either, missing abbrevs are left for exampleScript.js, between runs.
+    """
+    if command is None and os.environ.get(ABBREV_WORKER_ENV):
+        command = shlex.split(os.environ[ABBREV_WORKER_ENV])
+    if command:
+        print(f'Computing abbrevs with worker: {command}')
+        setAbbrevProvider(WorkerAbbrevProvider(command))
+
+
+def setAbbrevProvider(provider: Optional[AbbrevProvider]) -> None:
+    """Set (or unset, with None) the provider computing missing abbrevs."""
+    global _abbrevProvider  # pylint: disable=global-statement
+    if _abbrevProvider is not None:
+        _abbrevProvider.close()
+    _abbrevProvider = provider
+    _resetPendingAbbrevs()
+
+
+def _resetPendingAbbrevs() -> None:
+    """Start over with all missing abbrevs in the state as pending."""
+    _pendingAbbrevs.clear()
+    _requestedAbbrevs.clear()
+    if _abbrevProvider is not None:
+        for title in __state['abbrevs']:
+            _addPendingAbbrevs(title)
+
+
+def _addPendingAbbrevs(title: str) -> None:
+    """Note the missing abbrevs of `title`, if a provider can compute them."""
+    abbrevs = __state['abbrevs'][title] or {}
+    languages = {language for language, abbrev in abbrevs.items()
+                 if abbrev is None and language != 'matchingPatterns'}
+    if abbrevs.get('matchingPatterns') is None:
+        languages.add('all')
+    languages = {language for language in languages
+                 if (title, language) not in _requestedAbbrevs}
+    if languages:
+        _pendingAbbrevs.setdefault(title, set()).update(languages)
+
+
+def computePendingAbbrevs() -> int:
+    """Compute pending abbrevs with the provider, in batches.
+
+    Return the number of titles computed. If the provider fails, it is
+    dropped for the rest of the run (abbrevs stay missing, as without one).
+    """
+    if _abbrevProvider is None or not _pendingAbbrevs:
+        return 0
+    nComputed = 0
+    # Titles computed by a provider with simplified rules.
+    simplified: Set[str] = set()
+    with phase('abbrev provider'):
+        while _pendingAbbrevs:
+            batch = {}
+            for title in list(_pendingAbbrevs)[:ABBREV_BATCH_SIZE]:
+                languages = _pendingAbbrevs.pop(title)
+                batch[title] = sorted(languages)
+                _requestedAbbrevs.update((title, lang) for lang in languages)
+            try:
+                result = _abbrevProvider.compute(batch)
+            except AbbrevProviderError as e:
+                print(f'Abbrev provider failed, not using it anymore: {e}')
+                setAbbrevProvider(None)
+                break
+            countStat('abbrev provider requests')
+            for title, abbrevs in result.items():
+                if title not in batch:
+                    continue
+                saveTitleToAbbrev(title)
+                entry = __state['abbrevs'][title]
+                for language in batch[title]:
+                    entry[language] = abbrevs.get(language)
+                patterns = abbrevs.get('matchingPatterns')
+                if isinstance(patterns, str):
+                    entry['matchingPatterns'] = _encodePatterns(patterns)
+                if _abbrevProvider.simplified:
+                    simplified.add(title)
+                nComputed += 1
+    if simplified:
+        __state['simplifiedAbbrevs'] = sorted(
+            simplified.union(__state.get('simplifiedAbbrevs', [])))
+    countStat('abbrevs computed', nComputed)
+    return nComputed
+
+
+def getReferenceAbbrevs() -> Dict[str, Dict[str, Any]]:
+    """Return dict from title to abbrevs, as computed by abbrevIso.js.
+
+    Abbrevs computed by providers with simplified rules are left out, so
+    that such providers can be validated against these.
+    """
+    simplified = set(__state.get('simplifiedAbbrevs', []))
+    return {title: abbrevs for title, abbrevs in __state['abbrevs'].items()
+            if title not in simplified}
+
+
+def _computeNow(title: str, language: Optional[str] = None) -> None:
+    """Compute missing abbrevs of `title` (and all pending), if possible."""
+    if _abbrevProvider is not None:
+        saveTitleToAbbrev(title, language)
+        computePendingAbbrevs()
+
+
 def saveTitleToAbbrev(title: str, language: Optional[str] = None) -> None:
-    """Save `title` for computing its abbrev later with exampleScript.js."""
+    """Save `title` for computing its abbrev later with exampleScript.js.
+
+    With an abbreviation provider, it will be computed in the next batch
+    (when some missing abbrev is needed, or before saving the state).
+    """
     if title not in __state['abbrevs']:
         __state['abbrevs'][title] = {
             'all': None,
@@ -76,6 +521,9 @@ def saveTitleToAbbrev(title: str, language: Optional[str] = None) -> None:
     if language is not None:
         if language not in __state['abbrevs'][title]:
             __state['abbrevs'][title][language] = None
+    _markAbbrevs(title)
+    if _abbrevProvider is not None:
+        _addPendingAbbrevs(title)
 
 
 class NotComputedYetError(LookupError):
@@ -88,10 +536,14 @@ class NotComputedYetError(LookupError):
 
 
 def hasAbbrev(title: str, language: Optional[str] = None) -> bool:
-    """Return whetever the abbrev for given title is saved and computed."""
+    """Return whetever the abbrev for given title is saved and computed.
+
+    This never asks the abbreviation provider.
+    """
     if title not in __state['abbrevs']:
         return False
-    elif language is None:
+    _markAbbrevs(title)
+    if language is None:
         return bool(__state['abbrevs'][title])
     elif language not in __state['abbrevs'][title]:
         return False
@@ -105,11 +557,14 @@ def getAbbrev(title: str, language: str) -> str:
     `language` should be 'all' or comma-separated list of ISO 639-2 codes,
     e.g. 'eng' for English. Multilingual 'mul' is always appended anyway.
     """
+    if not hasAbbrev(title, language):
+        _computeNow(title, language)
     if (title not in __state['abbrevs']
             or not __state['abbrevs'][title]
             or language not in __state['abbrevs'][title]
             or not __state['abbrevs'][title][language]):
         raise NotComputedYetError(title)
+    _markAbbrevs(title)
     return __state['abbrevs'][title][language]
 
 
@@ -126,8 +581,10 @@ def tryGetAbbrev(title: str, language: str) -> Optional[str]:
 
 def getAllAbbrevs(title: str) -> Dict[str, str]:
     """Return dict from language to abbrev, for a given title to abbreviate."""
+    _computeNow(title)
     if title not in __state['abbrevs'] or not __state['abbrevs'][title]:
         raise NotComputedYetError(title)
+    _markAbbrevs(title)
     result = __state['abbrevs'][title].copy()
     result.pop('matchingPatterns')
     return result
@@ -135,11 +592,17 @@ def getAllAbbrevs(title: str) -> Dict[str, str]:
 
 def getMatchingPatterns(title: str) -> str:
     """Return matching LTWA patterns for given title to abbreviate."""
+    if not (__state['abbrevs'].get(title) or {}).get('matchingPatterns'):
+        _computeNow(title)
     if (title not in __state['abbrevs']
             or not __state['abbrevs'][title]
             or 'matchingPatterns' not in __state['abbrevs'][title]):
         raise NotComputedYetError(title)
-    return __state['abbrevs'][title]['matchingPatterns']
+    _markAbbrevs(title)
+    patterns = __state['abbrevs'][title]['matchingPatterns']
+    if isinstance(patterns, list):
+        return '\n'.join(__state['patterns'][i] for i in patterns)
+    return patterns
 
 
 def savePageData(pageTitle: str, pageData: Dict[str, Any]) -> None:
@@ -156,14 +619,46 @@ def savePageData(pageTitle: str, pageData: Dict[str, Any]) -> None:
             }
         }
     """
-    __state['pages'][pageTitle] = pageData
+    __state['pages'][pageTitle] = dict(pageData, redirects={
+        rTitle: _encodeRedirectText(pageTitle, rText)
+        for rTitle, rText in pageData['redirects'].items()})
+    __state['lastSeen']['pages'][pageTitle] = __state['generation']
 
 
 def getPageData(pageTitle: str) -> Dict[str, Any]:
     """Return latest saved page data (in a scrape run of the script)."""
-    return __state['pages'][pageTitle]
+    pageData = __state['pages'][pageTitle]
+    return dict(pageData, redirects={
+        rTitle: _decodeRedirectText(pageTitle, rText)
+        for rTitle, rText in pageData['redirects'].items()})
 
 
 def getPagesDict() -> Dict[str, Dict[str, Any]]:
     """Return dictionary from pageTitle to pageData."""
-    return __state['pages']
+    return {pageTitle: getPageData(pageTitle)
+            for pageTitle in __state['pages']}
+
+
+def getReportHash(reportTitle: str) -> Optional[str]:
+    """Return the hash of the last saved content of a report page, if any."""
+    return __state.get('reports', {}).get(reportTitle)
+
+
+def saveReportHash(reportTitle: str, contentHash: str) -> None:
+    """Save the hash of the content just saved to a report page."""
+    __state.setdefault('reports', {})[reportTitle] = contentHash
+
+
+def deleteReportHash(reportTitle: str) -> None:
+    """Forget the hash of a report page no longer saved as a report."""
+    __state.get('reports', {}).pop(reportTitle, None)
+
+
+def getFillSkipped() -> Dict[str, Dict[str, Any]]:
+    """Return dict from titles of pages the fill job skipped to entries."""
+    return __state.get('fillSkipped', {})
+
+
+def saveFillSkipped(skipped: Dict[str, Dict[str, Any]]) -> None:
+    """Save the pages skipped by the fill job (replacing the previous ones)."""
+    __state['fillSkipped'] = skipped
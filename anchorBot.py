@@ -1,24 +1,44 @@
 #!/usr/bin/env python3
-"""A bot foradding anchors to redirects to a given list page."""
+"""A bot for adding anchors to redirects to given list pages.
+
+With `--omics`, the list pages are the targets of all omicsLists/ files
+configured with `anchor = true`.
+"""
+import glob
 import logging
 import re
 import sys
-from typing import List, Tuple
+from typing import Dict, List
 
 import pywikibot
 import pywikibot.data.api
 from pywikibot import Site
 
-from utils import initLimits, getRedirectsToPage, trySaving
+import omicsBot
+from utils import initLimits, getRedirectsToPages, parseRedirectTarget, \
+    preloadPages, printRunStats, trySaving, initProfiling, phase, timedIter
+
+
+# Redirects to list pages that should not get an anchor.
+EXCEPTIONS = [
+    'List of Hindawi academic journals',
+    'Hindawi academic journal',
+    'List of MDPI academic journals',
+    'List of MDPI journals',
+    'List of Dove Medical Press academic journals',
+    'List of Dove Press academic journals',
+    'List of Medknow Publications academic journals',
+    'List of Nature Research journals']
 
 
 def main() -> None:
     """Execute the bot."""
     logging.basicConfig(level=logging.WARNING)
-    if len(sys.argv) != 2:
-        print(f'Usage: {sys.argv[0]} "Title of List Page"')
+    initProfiling('anchorBot')
+    if len(sys.argv) < 2:
+        print(f'Usage: {sys.argv[0]} "Title of List Page" ...')
+        print(f'       {sys.argv[0]} --omics [omicsLists/file.txt ...]')
         return
-    listTitle = sys.argv[1]
 
     # Initialize pywikibot.
     assert Site().code == 'en'
@@ -29,93 +49,112 @@ def main() -> None:
         botTrial=False
     )
 
-    listPage = pywikibot.Page(Site(), listTitle)
-    if not listPage.exists():
-        raise Exception(f'Page [[{listTitle}]] does not exist.')
-    print(f'List: [[{listTitle}]]')
-    # for rTitle, anchor in parseList(listPage.text):
-    #     fixRedirectAnchor(rTitle, anchor, listTitle)
-    exceptions = [
-        'List of Hindawi academic journals',
-        'Hindawi academic journal',
-        'List of MDPI academic journals',
-        'List of MDPI journals',
-        'List of Dove Medical Press academic journals',
-        'List of Dove Press academic journals',
-        'List of Medknow Publications academic journals',
-        'List of Nature Research journals']
-    for rPage in getRedirectsToPage(listTitle, namespaces=0, content=True):
-        rTitle = rPage.title()
-        if rTitle not in exceptions:
-            fixRedirectAnchor(rTitle, getPredictedAnchor(rTitle), listTitle)
-
-
-def parseList(page: str) -> List[Tuple[str, str]]:
-    """Parse given wikicode of a List page."""
-    result: List[Tuple[str, str]] = []
-    currentSection = ''
-    for part in page.split('==='):  # Sometimes should be ==
-        part = part.strip()
-        if len(part) == 1:
-            currentSection = part
+    # Dict from list page title to titles expected to redirect to it.
+    listTitles: Dict[str, List[str]] = {}
+    if sys.argv[1] == '--omics':
+        filenames = sys.argv[2:] or sorted(glob.glob('omicsLists/*.txt'))
+        with phase('list config'):
+            listTitles = getOmicsAnchorLists(filenames)
+    else:
+        listTitles = {listTitle: [] for listTitle in sys.argv[1:]}
+    for listPage in preloadPages(listTitles):
+        if not listPage.exists():
+            raise Exception(f'Page [[{listPage.title()}]] does not exist.')
+        print(f'List: [[{listPage.title()}]]')
+    fixListAnchors(listTitles)
+    printRunStats()
+
+
+def getOmicsAnchorLists(filenames: List[str]) -> Dict[str, List[str]]:
+    """Return list pages targeted by omicsBot lists with `anchor = true`.
+
+    The result is a dict from list page title to journal titles in the lists.
+    """
+    result: Dict[str, List[str]] = {}
+    for filename in filenames:
+        try:
+            configLines, titleLines = omicsBot.readListFile(filename)
+            config = omicsBot.Config(configLines, checkPages=False)
+        except Exception as err:  # pylint: disable=broad-except
+            print(f'Skipping list [{filename}]: {err}')
             continue
-        if not currentSection:
+        if not config.anchor:
             continue
-
-        for line in re.findall(r"^\*''(.*)''$", part, re.MULTILINE):
-            m = re.search(r'^\[\[([^\|]+)(\|.*)?\]\]$', line)
-            if m:
-                result.append((m.group(1), currentSection))
-            else:
-                if '[' not in line:
-                    result.append((line, currentSection))
-                else:
-                    print('WARNING: unexpected "[" in: ' + repr(line))
+        titles = result.setdefault(config.rTarget, [])
+        for _lineNumber, line in titleLines:
+            if config.lang:
+                line = line.split(';', 1)[-1].strip()
+            titles.append(line.replace('(journal)', '').strip())
     return result
 
 
-def fixRedirectAnchor(rTitle: str, anchor: str, target: str) -> bool:
-    """Add an anchor to given redirect page."""
-    rPage = pywikibot.Page(Site(), rTitle)
-    addJournal = False
-    if rPage.exists() and not rPage.isRedirectPage():
-        addJournal = True
-        if 'journal' in rTitle.lower():
-            print(f'Skip: [[{rTitle}]] already exists, '
-                  'title already has "journal".', flush=True)
-            return False
-        for cat in rPage.categories():
-            if 'journal' in cat.title().lower():
+def fixListAnchors(listTitles: Dict[str, List[str]]) -> None:
+    """Add anchors to all redirects to given list pages.
+
+    `listTitles` is a dict from list page title to journal titles expected
+    to redirect to it (possibly with ' (journal)' added), which are only
+    checked and reported if no such redirect was found.
+    Redirects are fetched with their content in batches, targets and anchors
+    are parsed locally from that content.
+    """
+    redirects: Dict[str, str] = {}
+    for rPage in timedIter(getRedirectsToPages(listTitles, namespaces=0,
+                                               content=True),
+                           'redirect fetch'):
+        if rPage.title() not in EXCEPTIONS:
+            redirects[rPage.title()] = rPage.text
+    print(f'Got {len(redirects)} redirects to {len(listTitles)} lists.',
+          flush=True)
+    with phase('anchor fixes'):
+        for rTitle, rText in sorted(redirects.items()):
+            fixRedirectAnchorText(rTitle, rText, getPredictedAnchor(rTitle),
+                                  list(listTitles))
+
+    # Listed titles with no redirect found: check why, in a single batch.
+    missing = [title for titles in listTitles.values() for title in titles
+               if title not in redirects
+               and title + ' (journal)' not in redirects]
+    for page in timedIter(preloadPages(missing, categories=True),
+                          'category check'):
+        rTitle = page.title()
+        if page.exists() and not page.isRedirectPage():
+            if 'journal' in rTitle.lower():
+                print(f'Skip: [[{rTitle}]] already exists, '
+                      'title already has "journal".', flush=True)
+                continue
+            if any('journal' in cat.title().lower()
+                   for cat in page.categories()):
                 print(f'Skip: [[{rTitle}]] already exists, '
                       'has category containing "journal".', flush=True)
-                return False
-    if addJournal:
-        rPage = pywikibot.Page(Site(), rTitle + ' (journal)')
-    if not rPage.exists() or not rPage.isRedirectPage():
-        print(f'Not exists/not a redirect: [[{rPage.title()}]]', flush=True)
-        return False
-    # Page.title() actually contains anchor, if redirect had one.
-    actualTarget = rPage.getRedirectTarget().title().split('#', 1)
-    if actualTarget[0] != target:
+                continue
+            rTitle = rTitle + ' (journal)'
+        elif page.exists():
+            print(f'Not a redirect to these lists: [[{rTitle}]]', flush=True)
+            continue
+        print(f'Not exists/not a redirect: [[{rTitle}]]', flush=True)
+
+
+def fixRedirectAnchorText(rTitle: str, rText: str, anchor: str,
+                          targets: List[str]) -> bool:
+    """Add an anchor to given redirect, given its current wikitext.
+
+    The redirect is skipped if it does not point to one of `targets`,
+    or already has a different anchor.
+    """
+    actualTarget = (parseRedirectTarget(rText) or '').split('#', 1)
+    if actualTarget[0] not in targets:
         print(f'Not a redirect to this list: '
-              f'[[{rPage.title()}]] -> [[{actualTarget[0]}]]', flush=True)
+              f'[[{rTitle}]] -> [[{actualTarget[0]}]]', flush=True)
         return False
     if len(actualTarget) > 1:
         if actualTarget[1] != anchor:
             print(f'WARNING: Anchor mismatch: '
-                  f'[[{rPage.title()}]] -> [[{actualTarget[0]}]].'
+                  f'[[{rTitle}]] -> [[{actualTarget[0]}]].'
                   f'Is "{actualTarget[1]}" should be "{anchor}".')
             return False
         else:
             return True
-    predictedAnchor = getPredictedAnchor(rTitle)
-    if predictedAnchor != anchor:
-        print(f'WARNING: Anchor mismatch: '
-              f'[[{rPage.title()}]] -> [[{actualTarget[0]}]].'
-              f'Predicted "{predictedAnchor}" should be "{anchor}".')
-        return False
 
-    rText = rPage.text
     rNewText = re.sub(r'''(
                               \#\s*REDIRECT\s*\[\[
                               [^\]\#]+             # title
@@ -125,13 +164,13 @@ def fixRedirectAnchor(rTitle: str, anchor: str, target: str) -> bool:
                       '\\1#' + anchor + ']]',
                       rText, count=1, flags=re.VERBOSE)
     if rText == rNewText:
-        print(f'Nothing to do on: [[{rPage.title()}]]')
+        print(f'Nothing to do on: [[{rTitle}]]')
         return True
-    print(f'===CHANGING [[{rPage.title()}]] FROM==================')
+    print(f'===CHANGING [[{rTitle}]] FROM==================')
     print(rText)
     print('==========TO===========')
     print(rNewText + '\n\n', flush=True)
-    trySaving(rPage, rNewText,
+    trySaving(pywikibot.Page(Site(), rTitle), rNewText,
               'Add anchor to redirect, as it points to a long list.',
               overwrite=True)
     return True
@@ -13,12 +13,13 @@ from pywikibot import Site
 
 import utils
 from utils import getCategoryAsSet, getPagesWithTemplate, getRedirectsToPage, \
-    trySaving
+    trySaving, phase, timedIter
 
 
 def main() -> None:
     """Run the bot."""
     logging.basicConfig(level=logging.WARNING)
+    utils.initProfiling('andBot')
     # Initialize pywikibot.
     assert Site().code == 'en'
     utils.initLimits(
@@ -30,33 +31,36 @@ def main() -> None:
 
     EnglishWordList.init()
 
-    journals: Set[str] = getCategoryAsSet('Academic journals by language')
-    magazines: Set[str] = getCategoryAsSet('Magazines by language')
-
-    # Let 'foreign' be the set of page titles in a language-category
-    # other than English, or in the multilingual category.
-    foreign: Set[str] = set()
-    foreign = foreign | journals
-    foreign = foreign | magazines
-    foreign = foreign - getCategoryAsSet('English-language journals')
-    foreign = foreign - getCategoryAsSet('English-language magazines')
-    foreign = foreign | getCategoryAsSet('Multilingual journals')
-    foreign = foreign | getCategoryAsSet('Multilingual magazines')
-
-    for page in chain(
+    with phase('category load'):
+        journals: Set[str] = getCategoryAsSet('Academic journals by language')
+        magazines: Set[str] = getCategoryAsSet('Magazines by language')
+
+        # Let 'foreign' be the set of page titles in a language-category
+        # other than English, or in the multilingual category.
+        foreign: Set[str] = set()
+        foreign = foreign | journals
+        foreign = foreign | magazines
+        foreign = foreign - getCategoryAsSet('English-language journals')
+        foreign = foreign - getCategoryAsSet('English-language magazines')
+        foreign = foreign | getCategoryAsSet('Multilingual journals')
+        foreign = foreign | getCategoryAsSet('Multilingual magazines')
+
+    for page in timedIter(chain(
             journals,
             magazines,
             getPagesWithTemplate('Infobox journal'),
             getPagesWithTemplate('Infobox Journal'),
             getPagesWithTemplate('Infobox magazine'),
-            getPagesWithTemplate('Infobox Magazine')):
+            getPagesWithTemplate('Infobox Magazine')), 'enumeration'):
         pageTitle = page if isinstance(page, str) else page.title()
         try:
             makeAmpersandRedirects(pageTitle, foreign)
-            for rPage in getRedirectsToPage(pageTitle, namespaces=0):
+            for rPage in timedIter(getRedirectsToPage(pageTitle, namespaces=0),
+                                   'redirect fetch'):
                 makeAmpersandRedirects(rPage.title(), foreign, pageTitle)
         except pywikibot.exceptions.TitleblacklistError:
             print('Skipping (title blacklist error): ', pageTitle)
+    utils.printRunStats()
 
 
 def makeAmpersandRedirects(
@@ -100,10 +104,11 @@ def makeAmpersandRedirects(
             #     return False
     if not rTitle:
         return False
+    if not utils.isAllowedTitle(rTitle):
+        return False
     # Try creating a redirect from rTitle to pageTitle.
-    rPage = pywikibot.Page(Site(), rTitle)
     # Skip if the page already exists.
-    if rPage.exists():
+    if utils.getPageState(rTitle).exists:
         print('Skipping (already exists): ', rTitle)
         return False
     # Create the redirect.
@@ -113,6 +118,7 @@ def makeAmpersandRedirects(
         f'{{{{R from modification}}}}\n'
     )
     summary = 'Redirect between ampersand/and variant.'
+    rPage = pywikibot.Page(Site(), rTitle)
     return trySaving(rPage, rNewContent, summary, overwrite=False)
 
 
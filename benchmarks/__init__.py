@@ -0,0 +1,6 @@
+"""Offline benchmarks of the bots' hot paths, see `python -m benchmarks -h`.
+
+A synthetic corpus of journal articles and redirects (`corpus.py`) is served
+by an in-process fake MediaWiki site (`fakesite.py`), so no request ever
+reaches Wikipedia. Results are saved as JSON, to compare between commits.
+"""
@@ -0,0 +1,511 @@
+"""Run the offline benchmarks and save results as JSON.
+
+Usage (from the repository root):
+    python -m benchmarks [--articles N] [--seed S] [--repeat R]
+                         [--only NAME ...] [--output FILE]
+    python -m benchmarks --compare OLD.json NEW.json [--threshold 1.1]
+
+Each benchmark is timed `repeat` times (the best time is reported), then run
+once more under tracemalloc for the peak and retained memory. The number of
+API requests pywikibot would have sent is counted in the first timed run.
+`--compare` prints the ratios between two result files and exits with 1
+if some benchmark got slower by more than `threshold`.
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+os.environ.setdefault('PYWIKIBOT_NO_USER_CONFIG', '2')
+
+# pylint: disable=wrong-import-position
+import pywikibot  # noqa: E402
+
+import andBot  # noqa: E402
+import utils  # noqa: E402
+import variantBot  # noqa: E402
+from abbrevIsoBot import __main__ as bot  # noqa: E402
+from abbrevIsoBot import abbrevUtils, collisions, databases, ltwa, \
+    nearest, patchset, reports, state  # noqa: E402
+from benchmarks import corpus as corpusModule  # noqa: E402
+from benchmarks.fakesite import FakePage, FakeSite, install  # noqa: E402
+
+
+# The repository root, from which the stub worker is run.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# Each abbrev variant is soft-matched against this many following ones (in
+# sorted order, so that variants of the same abbrev are compared).
+SOFT_MATCH_WINDOW = 25
+# Suffixes making variants of abbrevs for soft-matching: subtitles, series,
+# comments, dashes.
+SOFT_MATCH_SUFFIXES = ['', ': Ser. A', ' (Online)', ' – Suppl.', ' - B',
+                       ', Sect. C', '-Rev.']
+
+
+class Benchmark(NamedTuple):
+    """A benchmark: `run()` returns the number of items it processed."""
+
+    name: str
+    run: Callable[[], int]
+    # Called (untimed) before each run.
+    setup: Optional[Callable[[], None]] = None
+
+
+@contextlib.contextmanager
+def quiet() -> Iterator[None]:
+    """Silence the bots' (very verbose) output."""
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            yield
+
+
+def resetRun() -> None:
+    """Forget everything a previous run cached or reported."""
+    utils._pageCache.clear()  # pylint: disable=protected-access
+    utils.initLimits(editsLimits={'default': 10**9}, brfaNumber=2,
+                     onlySimulateEdits=True)
+    for rows in vars(reports)['__report'].values():
+        rows.clear()
+    bot.languageMismatches.clear()
+
+
+def startWorker(timeout: float = state.ABBREV_WORKER_TIMEOUT) \
+        -> state.WorkerAbbrevProvider:
+    """Start the stub worker (`benchmarks.abbrevWorker`) as a provider."""
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        return state.WorkerAbbrevProvider(
+            [sys.executable, '-m', 'benchmarks.abbrevWorker'], timeout)
+    finally:
+        os.chdir(cwd)
+
+
+def checkWorkerErrors() -> None:
+    """Check that failures of the stub worker are handled.
+
+    A title it can't abbreviate gets None, while a worker that exits or stops
+    answering raises AbbrevProviderError.
+    """
+    worker = startWorker()
+    assert worker.compute({'FAIL Journal': ['all']}) == \
+        {'FAIL Journal': {'all': None, 'matchingPatterns': None}}
+    worker.close()
+    for title in ['CRASH Journal', 'HANG Journal']:
+        worker = startWorker(timeout=1)
+        try:
+            worker.compute({title: ['all']})
+        except state.AbbrevProviderError as e:
+            print(f'Worker error detected: {e}')
+        else:
+            raise AssertionError(f'Worker error not detected: {title}')
+        finally:
+            worker.close()
+
+
+def makeBenchmarks(corpus: corpusModule.Corpus, paths: Dict[str, str],
+                   site: FakeSite) -> List[Benchmark]:
+    """Return the suite, in an order where each can use the previous ones."""
+    articles: List[pywikibot.Page] = []
+    variants: List[Any] = []
+    reported: List[bool] = []
+
+    def parseNLM() -> int:
+        nlm: Dict[str, str] = {}
+        for j in databases.parseNLM(paths['nlm']):
+            if j.medAbbr:
+                if j.issnOnline:
+                    nlm[j.issnOnline] = j.medAbbr
+                if j.issnPrint:
+                    nlm[j.issnPrint] = j.medAbbr
+        bot.issnToAbbrev['nlm'] = nlm
+        return len(nlm)
+
+    def parseMSN() -> int:
+        msn = {j.issn: j.abbrev for j in databases.parseMSN(paths['msn'])
+               if j.issn}
+        bot.issnToAbbrev['mathscinet'] = msn
+        return len(msn)
+
+    def setupScrape() -> None:
+        resetRun()
+        state.loadOrInitState(paths['state'])
+
+    def scrape() -> int:
+        n = 0
+        for page in utils.getPagesWithTemplate('Infobox journal',
+                                               content=True):
+            bot.scrapePage(page)
+            n += 1
+        return n
+
+    def ensureScraped() -> None:
+        if not state.getPagesDict():
+            parseNLM()
+            parseMSN()
+            setupScrape()
+            scrape()
+
+    def setupArticles() -> None:
+        resetRun()
+        ensureScraped()
+        articles[:] = [FakePage(site, title, loaded=True, content=True)
+                       for title in corpus.articles]
+
+    def requiredRedirects() -> int:
+        return sum(len(bot.getRequiredRedirects(page)[0])
+                   for page in articles)
+
+    def fixRedirects() -> int:
+        for page in articles:
+            bot.fixPageRedirects(page)
+        return len(articles)
+
+    def setupPatches() -> None:
+        # Like `doScrape()`: pages and redirects are cached while scraping.
+        setupArticles()
+        scrape()
+        for page in articles:
+            bot.getRequiredRedirects(page)
+
+    def languageMismatchPatches() -> int:
+        return bot.writeLanguageMismatchPatches()
+
+    fullPatchsets: List[Dict[str, Any]] = []
+
+    def setupCompactPatches() -> None:
+        if not fullPatchsets:
+            setupPatches()
+            bot.writeLanguageMismatchPatches()
+            with open(patchset.FILE_NAME, 'rt', encoding='utf-8') as f:
+                fullPatchsets.append(json.load(f))
+
+    def compactPatches() -> int:
+        # Compact, then check that it expands back.
+        full = fullPatchsets[0]
+        oldTexts = patchset.getOldTexts(full)
+        compact = patchset.compactPatch(full)
+        assert patchset.expandPatch(
+            compact, lambda t, r: oldTexts[(t, r)]) == full
+        return patchset.countEdits(compact)['compact']
+
+    patchlistTitles = sorted(
+        title for title, text in corpus.pages.items()
+        if utils.parseRedirectTarget(text) and '.' not in title)
+
+    def setupPatchlist() -> None:
+        resetRun()
+        ensureScraped()
+        with open('patchlist.txt', 'wt') as f:
+            for title in patchlistTitles:
+                f.write(f'* [[{title}]]\n')
+
+    def patchlist() -> int:
+        bot.doPatchlist('patchlist.txt')
+        return len(patchlistTitles)
+
+    def validRedirects() -> int:
+        n = 0
+        for title, pageData in state.getPagesDict().items():
+            for rContent in pageData['redirects'].values():
+                for strict in [True, False]:
+                    bot.isValidISO4Redirect(rContent, title,
+                                            bot.RCatSet.ISO4, strict)
+                    n += 1
+        return n
+
+    def collisionIndex() -> int:
+        bot.abbrevIndex.rebuild(bot.issnToAbbrev)
+        return collisions.reportCollisions(bot.abbrevIndex)
+
+    def misattributed() -> int:
+        tree = nearest.buildAbbrevTree(bot.abbrevIndex)
+        nearest.reportMisattributedRedirects(bot.abbrevIndex, tree)
+        return len(bot.abbrevIndex.iso4Redirects)
+
+    def setupNearest() -> None:
+        setupArticles()
+        bot.abbrevIndex.rebuild(bot.issnToAbbrev)
+
+    def setupReport() -> None:
+        # Like `doScrape()`, with rows from both scraping and fixing pages.
+        if not reported:
+            parseNLM()
+            parseMSN()
+            setupScrape()
+            scrape()
+            articles[:] = [FakePage(site, title, loaded=True, content=True)
+                           for title in corpus.articles]
+            fixRedirects()
+            reported.append(True)
+
+    def report() -> int:
+        reports.doReport(site, printOnly=True)
+        return sum(map(len, vars(reports)['__report'].values()))
+
+    def setupAmpersand() -> None:
+        resetRun()
+        andBot.EnglishWordList.wordSet = set(corpus.vocabulary)
+
+    def ampersand() -> int:
+        for title in corpus.pages:
+            andBot.makeAmpersandRedirects(title, corpus.foreign)
+        return len(corpus.pages)
+
+    ltwaTitles = {title: ['all', 'eng'] for title in corpus.state['abbrevs']}
+    matchers: List[ltwa.LTWA] = []
+
+    def setupLTWA() -> None:
+        if not matchers:
+            matchers.append(ltwa.loadLTWA(paths['ltwa']))
+
+    def abbreviate() -> int:
+        return len(matchers[0].abbreviateAll(ltwaTitles))
+
+    workers: List[state.WorkerAbbrevProvider] = []
+
+    def setupWorker() -> None:
+        if not workers:
+            checkWorkerErrors()
+            workers.append(startWorker())
+
+    def computeWithWorker() -> int:
+        titles = list(ltwaTitles)
+        for i in range(0, len(titles), state.ABBREV_BATCH_SIZE):
+            batch = {title: ltwaTitles[title]
+                     for title in titles[i:i + state.ABBREV_BATCH_SIZE]}
+            result = workers[0].compute(batch)
+            for title in batch:
+                assert result[title]['all'] == \
+                    corpus.state['abbrevs'][title]['all']
+        return len(titles)
+
+    softMatchAbbrevs = sorted(set(
+        variant
+        for entry in corpus.state['abbrevs'].values()
+        for abbrev in [entry['all'], entry['eng']]
+        for suffix in SOFT_MATCH_SUFFIXES
+        for variant in [abbrev + suffix, (abbrev + suffix).lower(),
+                        abbrev.upper() + suffix]))
+
+    def softMatch() -> int:
+        # Keys must make the same decisions as the reference isSoftMatch().
+        keys = [abbrevUtils.softMatchKey(a) for a in softMatchAbbrevs]
+        n = 0
+        for i, a in enumerate(softMatchAbbrevs):
+            for j in range(i, min(i + SOFT_MATCH_WINDOW,
+                                  len(softMatchAbbrevs))):
+                b = softMatchAbbrevs[j]
+                assert (keys[i] == keys[j]) == abbrevUtils.isSoftMatch(a, b), \
+                    (a, b)
+                n += 1
+        return n
+
+    iso4Titles = [title for title, text in corpus.pages.items()
+                  if 'ISO' in text and '.' in title]
+
+    def variantTitles() -> int:
+        variants[:] = []
+        for title in iso4Titles:
+            target = utils.parseRedirectTarget(corpus.pages[title]) or ''
+            for variant in variantBot.getVariantRedirects(title):
+                if variant not in (title, title.replace('.', '')):
+                    variants.append((variant, target))
+        return len(iso4Titles)
+
+    def setupVariants() -> None:
+        resetRun()
+        if not variants:
+            variantTitles()
+            resetRun()
+
+    def variantRedirects() -> int:
+        for variant, target in variants:
+            variantBot.makeVariantRedirect(variant, target)
+        return len(variants)
+
+    return [
+        Benchmark('databases.parseNLM', parseNLM),
+        Benchmark('databases.parseMSN', parseMSN),
+        Benchmark('scrapePage', scrape, setupScrape),
+        Benchmark('getRequiredRedirects', requiredRedirects, setupArticles),
+        Benchmark('fixPageRedirects', fixRedirects, setupArticles),
+        Benchmark('writeLanguageMismatchPatches', languageMismatchPatches,
+                  setupPatches),
+        Benchmark('patchset.compactPatch', compactPatches,
+                  setupCompactPatches),
+        Benchmark('doPatchlist', patchlist, setupPatchlist),
+        Benchmark('isValidISO4Redirect', validRedirects, ensureScraped),
+        Benchmark('collisions.AbbrevIndex', collisionIndex, setupArticles),
+        Benchmark('nearest.reportMisattributedRedirects', misattributed,
+                  setupNearest),
+        Benchmark('reports.doReport', report, setupReport),
+        Benchmark('abbrevUtils.softMatchKey', softMatch),
+        Benchmark('ltwa.abbreviateAll', abbreviate, setupLTWA),
+        Benchmark('state.WorkerAbbrevProvider', computeWithWorker,
+                  setupWorker),
+        Benchmark('andBot.makeAmpersandRedirects', ampersand,
+                  setupAmpersand),
+        Benchmark('variantBot.getVariantRedirects', variantTitles, resetRun),
+        Benchmark('variantBot.makeVariantRedirect', variantRedirects,
+                  setupVariants),
+    ]
+
+
+def measure(benchmark: Benchmark, repeat: int,
+            site: FakeSite) -> Dict[str, Any]:
+    """Run a benchmark, return its time, memory use and API requests."""
+    times = []
+    apiCalls: Dict[str, int] = {}
+    items = 0
+    for i in range(repeat):
+        with quiet():
+            if benchmark.setup:
+                benchmark.setup()
+            gc.collect()
+            before = Counter(site.calls)
+            start = time.perf_counter()
+            items = benchmark.run()
+            times.append(time.perf_counter() - start)
+        if i == 0:
+            apiCalls = dict(site.calls - before)
+    # Allocations, in a separate run (tracing slows everything down).
+    with quiet():
+        if benchmark.setup:
+            benchmark.setup()
+        gc.collect()
+        tracemalloc.start()
+        benchmark.run()
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {'seconds': min(times),
+            'meanSeconds': sum(times) / len(times),
+            'items': items,
+            'peakKB': peak // 1024,
+            'retainedKB': retained // 1024,
+            'apiCalls': apiCalls}
+
+
+def gitCommit() -> str:
+    """Return the current commit, with '+' appended if the tree is dirty."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'],
+                                capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '-uno'],
+                               capture_output=True, text=True,
+                               check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('+' if dirty else '')
+
+
+def runSuite(args: argparse.Namespace) -> Dict[str, Any]:
+    """Generate the corpus, run selected benchmarks, return the results."""
+    result: Dict[str, Any] = {
+        'commit': gitCommit(),
+        'date': datetime.now(timezone.utc).isoformat(),
+        'params': {'articles': args.articles, 'seed': args.seed,
+                   'repeat': args.repeat, 'python': sys.version.split()[0]},
+        'results': {}
+    }
+    corpus = corpusModule.makeCorpus(args.articles, args.seed)
+    print(f'Corpus: {len(corpus.articles)} articles, '
+          f'{len(corpus.pages)} pages.', flush=True)
+    site = FakeSite(corpus.pages)
+    with quiet():
+        install(site)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # The bots write some files (like patchset.json) to the cwd.
+        os.chdir(tmp)
+        try:
+            paths = corpusModule.writeCorpus(corpus, tmp)
+            with quiet():
+                state.loadOrInitState(paths['state'])
+            for benchmark in makeBenchmarks(corpus, paths, site):
+                if args.only and benchmark.name not in args.only:
+                    continue
+                r = measure(benchmark, args.repeat, site)
+                result['results'][benchmark.name] = r
+                calls = sum(r['apiCalls'].values())
+                print(f'{benchmark.name:<36} {r["seconds"]:9.4f}s '
+                      f'{r["peakKB"]:9d}KB peak {calls:7d} requests '
+                      f'({r["items"]} items)', flush=True)
+        finally:
+            os.chdir(cwd)
+    return result
+
+
+def compare(oldFileName: str, newFileName: str, threshold: float) -> bool:
+    """Print the comparison of two results, return whether none regressed."""
+    with open(oldFileName) as f:
+        old = json.load(f)
+    with open(newFileName) as f:
+        new = json.load(f)
+    print(f'old: {old["commit"]} {old["params"]}')
+    print(f'new: {new["commit"]} {new["params"]}')
+    if old['params'] != new['params']:
+        print('Warning: different parameters, ratios may be meaningless.')
+    ok = True
+    print(f'{"benchmark":<36} {"time":>8} {"peak":>8} {"requests":>17}')
+    for name in sorted(set(old['results']) | set(new['results'])):
+        if name not in old['results'] or name not in new['results']:
+            print(f'{name:<36} (only in one file)')
+            continue
+        o, n = old['results'][name], new['results'][name]
+        timeRatio = n['seconds'] / max(o['seconds'], 1e-9)
+        peakRatio = n['peakKB'] / max(o['peakKB'], 1)
+        oCalls, nCalls = sum(o['apiCalls'].values()), \
+            sum(n['apiCalls'].values())
+        flag = ''
+        if timeRatio > threshold or nCalls > oCalls:
+            flag = '  <-- REGRESSION'
+            ok = False
+        print(f'{name:<36} {timeRatio:7.2f}x {peakRatio:7.2f}x '
+              f'{oCalls:8d}→{nCalls:<8d}{flag}')
+    return ok
+
+
+def main() -> None:
+    """Parse arguments and run the suite or compare results."""
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Offline benchmarks on a synthetic corpus.')
+    parser.add_argument('--articles', type=int, default=2000,
+                        help='number of journal articles in the corpus')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timed runs per benchmark (the best is kept)')
+    parser.add_argument('--only', nargs='+', metavar='NAME',
+                        help='run only the named benchmarks')
+    parser.add_argument('--output', metavar='FILE',
+                        help='where to save results '
+                             '(default: benchmarks-<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two saved results instead of running')
+    parser.add_argument('--threshold', type=float, default=1.1,
+                        help='time ratio counted as a regression')
+    args = parser.parse_args()
+    if args.compare:
+        sys.exit(0 if compare(*args.compare, args.threshold) else 1)
+    result = runSuite(args)
+    output = args.output or f'benchmarks-{result["commit"][:10]}.json'
+    with open(output, 'wt') as f:
+        json.dump(result, f, indent=1)
+    print(f'Saved results to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""A stub abbreviation worker, abbreviating like the synthetic corpus does.
+
+It speaks the JSON-lines protocol of `state.WorkerAbbrevProvider`, so a run
+can compute abbrevs without abbrevIso.js, e.g.:
+    TOKENZERO_ABBREV_WORKER='python3 -m benchmarks.abbrevWorker' \\
+        python3 -m abbrevIsoBot scrape
+Titles containing 'FAIL' get no abbreviations; a request for a title
+containing 'CRASH' makes the worker exit, and one containing 'HANG' makes it
+stop answering, to test error handling (see the benchmark of this worker).
+"""
+import json
+import sys
+from typing import Dict, List, Optional
+
+from benchmarks.corpus import abbreviate, matchingPatterns
+
+
+def computeAbbrevs(title: str, languages: List[str]) \
+        -> Dict[str, Optional[str]]:
+    """Return the response entry for one title."""
+    if 'FAIL' in title:
+        return dict.fromkeys(languages + ['matchingPatterns'])
+    result: Dict[str, Optional[str]] = {
+        language: abbreviate(title, 'eng' if language == 'eng' else 'all')
+        for language in languages}
+    result['matchingPatterns'] = matchingPatterns(title)
+    return result
+
+
+def main() -> None:
+    """Answer requests from stdin until it is closed."""
+    for line in sys.stdin:
+        try:
+            titles = json.loads(line)['titles']
+        except (ValueError, KeyError) as e:
+            print(json.dumps({'error': f'Bad request: {e!r}'}), flush=True)
+            continue
+        if any('CRASH' in title for title in titles):
+            sys.exit(1)
+        if any('HANG' in title for title in titles):
+            sys.stdin.read()
+            return
+        print(json.dumps({'abbrevs': {
+            title: computeAbbrevs(title, languages)
+            for title, languages in titles.items()}}), flush=True)
+
+
+if __name__ == '__main__':
+    main()
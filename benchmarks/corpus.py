@@ -0,0 +1,438 @@
+"""Synthetic corpus of journal articles, their redirects and databases.
+
+The corpus imitates what the bots see on Wikipedia: articles with one or more
+{{infobox journal}}s (with correct, empty, wrong, language-dependent or
+commented abbreviations), redirects with assorted rcats and rcat shells,
+NLM/MathSciNet database entries for some ISSNs, and a state with the
+abbreviations abbrevIso.js would compute. It's generated from a seed, so the
+same arguments always give the same corpus.
+"""
+import csv
+import io
+import json
+import os
+import random
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+
+# Title words with their ISO 4 abbreviations (equal if not abbreviated).
+HEADS = {'Journal': 'J.', 'Annals': 'Ann.', 'Review': 'Rev.',
+         'Letters': 'Lett.', 'Proceedings': 'Proc.', 'Bulletin': 'Bull.',
+         'Archives': 'Arch.', 'Transactions': 'Trans.', 'Acta': 'Acta',
+         'Reports': 'Rep.', 'Quarterly': 'Q.', 'Advances': 'Adv.'}
+ADJECTIVES = {'International': 'Int.', 'American': 'Am.',
+              'European': 'Eur.', 'British': 'Br.', 'Royal': 'R.',
+              'Applied': 'Appl.', 'Clinical': 'Clin.', 'Political': 'Polit.',
+              'Special': 'Spec.', 'Atmospheric': 'Atmos.', 'Animal': 'Anim.',
+              'Molecular': 'Mol.', 'Environmental': 'Environ.',
+              'Experimental': 'Exp.', 'Theoretical': 'Theor.',
+              'Contributions': 'Contrib.'}
+SUBJECTS = {'Mathematics': 'Math.', 'Physics': 'Phys.', 'Chemistry': 'Chem.',
+            'Biology': 'Biol.', 'Medicine': 'Med.', 'Research': 'Res.',
+            'Science': 'Sci.', 'Engineering': 'Eng.', 'Economics': 'Econ.',
+            'Philosophy': 'Philos.', 'History': 'Hist.',
+            'Psychology': 'Psychol.', 'Sociology': 'Sociol.',
+            'Communications': 'Commun.', 'Entomology': 'Entomol.',
+            'Radiation': 'Radiat.', 'Investigation': 'Investig.',
+            'Administration': 'Adm.', 'Geology': 'Geol.', 'Ecology': 'Ecol.',
+            'Linguistics': 'Linguist.', 'Statistics': 'Stat.',
+            'Astronomy': 'Astron.', 'Neuroscience': 'Neurosci.',
+            'Oncology': 'Oncol.', 'Cardiology': 'Cardiol.',
+            'Genetics': 'Genet.', 'Botany': 'Bot.', 'Zoology': 'Zool.',
+            'Law': 'Law', 'Education': 'Educ.', 'Management': 'Manag.',
+            'Energy': 'Energy', 'Technology': 'Technol.',
+            'London': 'Lond.', 'California': 'Calif.'}
+# Words that abbrevIso.js abbreviates only with all (not just English)
+# LTWA rules, so their titles get different 'eng' and 'all' abbreviations.
+LANGUAGE_DEPENDENT = {'Animal', 'Atmospheric', 'Contributions', 'Royal',
+                      'Special'}
+# Words ISO 4 omits.
+OMITTED = {'of', 'and', 'the', 'The', 'for', 'in', '&'}
+# One-word titles, which are not abbreviated at all.
+SHORT_TITLES = ['Nature', 'Cell', 'Blood', 'Gut', 'Brain', 'Heart', 'Chaos',
+                'Oikos', 'Ibis', 'Auk', 'Nano', 'Evolution', 'Nucleus',
+                'Antiquity', 'Fuel', 'Icarus', 'Genome', 'Neuron', 'Lipids',
+                'Toxins', 'Viruses', 'Polymers', 'Minerals', 'Forests']
+COUNTRIES = ['United States', 'United Kingdom', 'USA', 'Australia',
+             'Netherlands', 'Germany', 'France', 'Poland', 'Japan', 'Brazil']
+LANGUAGES = ['English', 'English', 'English', 'German', 'French', 'Polish',
+             'Portuguese', 'Multilingual']
+PUBLISHERS = ['Elsevier', 'Springer Science+Business Media', 'Wiley-Blackwell',
+              'Taylor & Francis', 'Oxford University Press',
+              'Cambridge University Press', 'SAGE Publications']
+
+# Wikitext of a redirect to {0}, by the kind of redirect.
+REDIRECT_FORMATS = {
+    'iso4': ['#REDIRECT [[{0}]]\n{{{{R from ISO 4}}}}',
+             '#REDIRECT [[{0}]]\n\n{{{{Redirect category shell|\n'
+             '{{{{R from ISO 4 abbreviation}}}}\n}}}}',
+             '#redirect [[{0}]] {{{{R from ISO4}}}} {{{{R printworthy}}}}',
+             '#REDIRECT [[{0}]]\n\n{{{{Redirect shell |\n'
+             '  {{{{R from ISO 4}}}}\n  {{{{R unprintworthy}}}}\n}}}}'],
+    'replaceable': ['#REDIRECT [[{0}]]\n{{{{R from abbreviation}}}}',
+                    '#REDIRECT [[{0}]]',
+                    '#REDIRECT [[{0}]] R from abbreviation'],
+    'dubious': ['#REDIRECT [[{0}#History]]\n{{{{R from ISO 4}}}}',
+                '#REDIRECT [[{0}]]\n{{{{R from move}}}}\n{{{{R from ISO 4}}}}',
+                '#REDIRECT [[{0}]]\n{{{{R from abbreviation|manual}}}}'],
+    'nlm': ['#REDIRECT [[{0}]]\n{{{{R from NLM}}}}',
+            '#REDIRECT [[{0}]]\n\n{{{{Redirect shell |\n'
+            '  {{{{R from ISO 4}}}}\n  {{{{R from NLM}}}}\n}}}}',
+            '#REDIRECT [[{0}]]\n{{{{R from MEDLINE abbreviation}}}}'],
+    'msn': ['#REDIRECT [[{0}]]\n{{{{R from MathSciNet}}}}',
+            '#REDIRECT [[{0}]]\n\n{{{{Redirect shell |\n'
+            '  {{{{R from ISO 4}}}}\n  {{{{R from MathSciNet}}}}\n}}}}'],
+    'former': ['#REDIRECT [[{0}]]\n{{{{R from former name}}}}',
+               '#REDIRECT [[{0}]]\n\n{{{{Redirect category shell|\n'
+               '{{{{R from former name}}}}\n{{{{R printworthy}}}}\n}}}}'],
+    'other': ['#REDIRECT [[{0}]]\n{{{{R from modification}}}}',
+              '#REDIRECT [[{0}]]\n{{{{R from alternative spelling}}}}'],
+}
+
+# Kinds of the `abbreviation` param of an infobox, with their weights.
+ABBREV_KINDS = {'correct': 70, 'empty': 8, 'eng': 6, 'wrong': 6,
+                'comment': 5, 'colon': 2, 'no': 1, 'nodots': 2}
+
+
+class Corpus(NamedTuple):
+    """A generated corpus, see `makeCorpus()`."""
+
+    # Wikitext of all existing mainspace pages (articles and redirects).
+    pages: Dict[str, str]
+    # Titles of pages with an {{infobox journal}}.
+    articles: List[str]
+    # Initial abbrevIsoBot state: computed abbrevs of all titles in the corpus.
+    state: Dict[str, Any]
+    # NLM/PubMed database in J_Entrez.txt format, see `databases.parseNLM()`.
+    nlmText: str
+    # MathSciNet database in csv format, see `databases.parseMSN()`.
+    msnText: str
+    # Casefolded words used in titles (the andBot dictionary).
+    vocabulary: Set[str]
+    # Titles of non-English journals (like andBot's `foreign`).
+    foreign: Set[str]
+
+
+def abbreviate(title: str, language: str = 'all') -> str:
+    """Return the abbreviation abbrevIso.js would compute for our titles."""
+    words = []
+    for word in title.split():
+        if word in OMITTED:
+            continue
+        if language == 'eng' and word in LANGUAGE_DEPENDENT:
+            words.append(word)
+            continue
+        words.append(HEADS.get(word) or ADJECTIVES.get(word)
+                     or SUBJECTS.get(word) or word)
+    return ' '.join(words)
+
+
+def matchingPatterns(title: str) -> str:
+    """Return a description of LTWA patterns matching words of `title`."""
+    lines = []
+    for word in title.split():
+        abbrev = abbreviate(word)
+        if abbrev != word and word not in OMITTED:
+            lines.append(f'{word.lower()[:len(abbrev) - 1]}- → {abbrev}\t*')
+    return '\n'.join(lines)
+
+
+def makeLTWAText() -> str:
+    """Return an LTWA (see `abbrevIsoBot.ltwa`) with the rules used here."""
+    out = io.StringIO()
+    writer = csv.writer(out, delimiter='\t', lineterminator='\n')
+    writer.writerow(['WORD', 'ABBREVIATIONS', 'LANGUAGES'])
+    for word, abbrev in {**HEADS, **ADJECTIVES, **SUBJECTS}.items():
+        writer.writerow([word.lower(),
+                         abbrev.lower() if abbrev != word else 'n.a.',
+                         'fre' if word in LANGUAGE_DEPENDENT else 'mul'])
+    return out.getvalue()
+
+
+def makeIssn(rng: random.Random) -> str:
+    """Return a random ISSN with a valid check digit."""
+    digits = [rng.randrange(10) for _ in range(7)]
+    check = (11 - sum((8 - i) * d for i, d in enumerate(digits)) % 11) % 11
+    s = ''.join(map(str, digits)) + ('X' if check == 10 else str(check))
+    return s[:4] + '-' + s[4:]
+
+
+class _Generator:
+    """State of a corpus being generated (to avoid threading it around)."""
+
+    def __init__(self, seed: int) -> None:
+        self.rng = random.Random(seed)
+        self.pages: Dict[str, str] = {}
+        self.articles: List[str] = []
+        self.names: Set[str] = set()
+        self.issns: Set[str] = set()
+        self.foreign: Set[str] = set()
+        self.nlm: List[Dict[str, str]] = []
+        self.msn: List[List[str]] = []
+
+    def newTitle(self) -> str:
+        """Return a title not used by any page nor infobox yet."""
+        while True:
+            title = self.randomTitle()
+            if title not in self.names and title not in self.pages:
+                self.names.add(title)
+                return title
+
+    def randomTitle(self) -> str:
+        """Return a random, plausible journal title."""
+        rng = self.rng
+        if rng.random() < 0.04:
+            title = rng.choice(SHORT_TITLES)
+            if rng.random() < 0.7:
+                title += ' ' + rng.choice(SHORT_TITLES)
+            return title
+        adjective = rng.choice(list(ADJECTIVES)) + ' ' \
+            if rng.random() < 0.5 else ''
+        subject = rng.choice(list(SUBJECTS))
+        if rng.random() < 0.3:
+            subject += rng.choice([' and ', ' and ', ' & ']) \
+                + rng.choice(list(SUBJECTS))
+        head = rng.choice(list(HEADS))
+        if rng.random() < 0.6:
+            return f'{adjective}{head} of {subject}'
+        return f'{adjective}{subject} {head}'
+
+    def newIssn(self) -> str:
+        """Return an ISSN not used yet."""
+        while True:
+            issn = makeIssn(self.rng)
+            if issn not in self.issns:
+                self.issns.add(issn)
+                return issn
+
+    def addRedirect(self, rTitle: str, target: str, kind: str) -> None:
+        """Add a redirect of given kind, unless `rTitle` already exists."""
+        if rTitle and rTitle != target and rTitle not in self.pages:
+            rFormat = self.rng.choice(REDIRECT_FORMATS[kind])
+            self.pages[rTitle] = rFormat.format(target)
+
+    def makeInfobox(self, name: str) -> Dict[str, str]:
+        """Return infobox params of a journal titled `name`."""
+        rng = self.rng
+        kind = rng.choices(list(ABBREV_KINDS),
+                           weights=list(ABBREV_KINDS.values()))[0]
+        abbrev = abbreviate(name)
+        if kind == 'empty':
+            abbrev = ''
+        elif kind == 'eng':
+            abbrev = abbreviate(name, 'eng')
+        elif kind == 'wrong':
+            words = abbrev.split()
+            words[rng.randrange(len(words))] = \
+                rng.choice(list(SUBJECTS.values()))
+            abbrev = ' '.join(words)
+        elif kind == 'comment':
+            abbrev += ' <!-- ISO 4 -->'
+        elif kind == 'colon':
+            abbrev = 'Sb.: ' + abbrev
+        elif kind == 'no':
+            abbrev = 'no'
+        elif kind == 'nodots':
+            abbrev = abbrev.replace('.', '')
+        english = rng.random() < 0.75
+        infobox = {
+            'title': name,
+            'abbreviation': abbrev,
+            'language': 'English' if english else rng.choice(LANGUAGES),
+            'country': rng.choice(COUNTRIES[:4] if english else COUNTRIES),
+            'publisher': rng.choice(PUBLISHERS),
+            'issn': self.newIssn() if rng.random() < 0.9 else '',
+            'eissn': self.newIssn() if rng.random() < 0.6 else '',
+        }
+        if rng.random() < 0.15:
+            del infobox['title']
+        return infobox
+
+    def addDatabaseEntries(self, name: str, infobox: Dict[str, str]) -> None:
+        """Add NLM/MathSciNet entries for the infobox's ISSNs, sometimes."""
+        rng = self.rng
+        computed = abbreviate(name)
+        if (infobox['issn'] or infobox['eissn']) and rng.random() < 0.3:
+            medAbbr = computed.replace('.', '')
+            if rng.random() < 0.1:
+                medAbbr = rng.choice(list(SUBJECTS.values())) + ' ' + medAbbr
+            self.nlm.append({'title': name, 'medAbbr': medAbbr,
+                             'isoAbbr': computed, 'issnPrint': infobox['issn'],
+                             'issnOnline': infobox['eissn']})
+            if rng.random() < 0.3:
+                infobox['nlm'] = medAbbr
+        if infobox['issn'] and rng.random() < 0.12 \
+                and all(c not in computed for c in '&:'):
+            msnAbbr = computed
+            if rng.random() < 0.1:
+                msnAbbr = computed.replace('.', '')
+            self.msn.append([str(rng.randrange(1950, 2020)), infobox['issn'],
+                             msnAbbr, infobox['publisher'].replace('&', 'and')])
+            if rng.random() < 0.3:
+                infobox['mathscinet'] = msnAbbr
+
+    def addArticle(self) -> None:
+        """Add an article with its infoboxes and redirects."""
+        rng = self.rng
+        name = self.newTitle()
+        title = name
+        if rng.random() < 0.1:
+            title += rng.choice([' (journal)', ' (magazine)'])
+            self.names.add(title)
+        infoboxes = []
+        names = [name]
+        for _ in range(rng.choices([1, 2, 3], weights=[85, 12, 3])[0]):
+            if infoboxes:
+                names.append(self.newTitle())
+            infobox = self.makeInfobox(names[-1])
+            self.addDatabaseEntries(names[-1], infobox)
+            infoboxes.append(infobox)
+        if infoboxes[0]['language'] not in ['English', 'Multilingual']:
+            self.foreign.add(title)
+        self.pages[title] = self.makeArticleText(name, infoboxes)
+        self.articles.append(title)
+        # Redirects, as users and bots made them.
+        for otherName in names[1:]:
+            self.addRedirect(otherName, title, 'former')
+        if rng.random() < 0.1:
+            self.addRedirect(self.newTitle(), title, 'former')
+        if ' and ' in name and rng.random() < 0.3:
+            self.addRedirect(name.replace(' and ', ' & '), title, 'other')
+        for infobox in infoboxes:
+            abbrev = infobox['abbreviation'].replace(' <!-- ISO 4 -->', '')
+            if abbrev in ['', 'no'] or ':' in abbrev:
+                continue
+            dotless = abbrev.replace('.', '')
+            r = rng.random()
+            if r < 0.03:
+                # Some unrelated page already took the title.
+                if dotless not in self.pages:
+                    self.pages[dotless] = \
+                        f"'''{dotless}''' may refer to a company.\n"
+            elif r < 0.06:
+                self.addRedirect(dotless, self.newTitle(), 'other')
+            for rTitle in [abbrev, dotless]:
+                r = rng.random()
+                if r < 0.55:
+                    self.addRedirect(rTitle, title, 'iso4')
+                elif r < 0.65:
+                    self.addRedirect(rTitle, title, 'replaceable')
+                elif r < 0.7:
+                    self.addRedirect(rTitle, title, 'dubious')
+            if rng.random() < 0.05:
+                # A redirect wrongly marked as ISO 4, one word off.
+                words = abbrev.split()
+                words[-1] = rng.choice(list(SUBJECTS.values()))
+                self.addRedirect(' '.join(words), title, 'iso4')
+            if infobox.get('nlm'):
+                self.addRedirect(infobox['nlm'], title, 'nlm')
+            if infobox.get('mathscinet'):
+                self.addRedirect(infobox['mathscinet'], title, 'msn')
+
+    def makeArticleText(self, name: str,
+                        infoboxes: List[Dict[str, str]]) -> str:
+        """Return wikitext of an article with given infobox params."""
+        rng = self.rng
+        text = ''
+        if rng.random() < 0.2:
+            text += '{{Short description|Academic journal}}\n'
+        for i, infobox in enumerate(infoboxes):
+            if i > 0:
+                text += f'\n== {infobox.get("title", "History")} ==\n'
+            text += '{{' + rng.choice(['Infobox journal', 'infobox journal',
+                                       'Infobox Journal']) + '\n'
+            for param, value in infobox.items():
+                text += f'| {param:<12} = {value}\n'
+            text += '| website      = https://example.org/\n}}\n'
+            text += (f"'''{infobox.get('title', name)}''' is a "
+                     f"[[peer review|peer-reviewed]] [[academic journal]] "
+                     f"published by [[{infobox['publisher']}]]. It covers "
+                     f"research in {rng.choice(list(SUBJECTS)).lower()}."
+                     f"<ref>{{{{cite web |title=About |publisher="
+                     f"{infobox['publisher']}}}}}</ref>\n")
+        text += ('\n== Abstracting and indexing ==\nThe journal is abstracted '
+                 'and indexed in:\n* [[Scopus]]\n* [[Web of Science]]\n'
+                 '\n== References ==\n{{Reflist}}\n\n'
+                 '[[Category:Academic journals]]\n')
+        language = infoboxes[0]['language']
+        text += f'[[Category:{language}-language journals]]\n'
+        return text
+
+    def makeNLMText(self) -> str:
+        """Return the NLM database, with some unrelated entries."""
+        entries = list(self.nlm)
+        for _ in range(len(self.articles) // 2):
+            name = self.randomTitle()
+            entries.append({'title': name,
+                            'medAbbr': abbreviate(name).replace('.', ''),
+                            'isoAbbr': abbreviate(name),
+                            'issnPrint': self.newIssn(),
+                            'issnOnline': ''})
+        self.rng.shuffle(entries)
+        separator = '-' * 56 + '\n'
+        out = io.StringIO()
+        out.write(separator)
+        for i, e in enumerate(entries, start=1):
+            out.write(f"JrId: {i}\nJournalTitle: {e['title']}\n"
+                      f"MedAbbr: {e['medAbbr']}\n"
+                      f"ISSN (Print): {e['issnPrint']}\n"
+                      f"ISSN (Online): {e['issnOnline']}\n"
+                      f"IsoAbbr: {e['isoAbbr']}\nNlmId: {1000000 + i}\n")
+            out.write(separator)
+        return out.getvalue()
+
+    def makeMSNText(self) -> str:
+        """Return the MathSciNet csv database, with some unrelated entries."""
+        rows = list(self.msn)
+        for _ in range(len(self.articles) // 4):
+            name = self.randomTitle()
+            if '&' not in name:
+                rows.append(['2001', self.newIssn(), abbreviate(name),
+                             self.rng.choice(PUBLISHERS).replace('&', 'and')])
+        self.rng.shuffle(rows)
+        url = 'https://mathscinet.ams.org/mathscinet/search/journaldoc.html?cn='
+        out = io.StringIO()
+        writer = csv.writer(out, dialect='excel', lineterminator='\n')
+        writer.writerow(['Year', 'ISSN', 'Abbreviation', 'Publisher', 'URL'])
+        for row in rows:
+            writer.writerow(row + [url + row[1].replace('-', '')])
+        return out.getvalue()
+
+
+def makeCorpus(nArticles: int, seed: int = 0) -> Corpus:
+    """Generate a corpus of `nArticles` journal articles (and redirects)."""
+    gen = _Generator(seed)
+    for _ in range(nArticles):
+        gen.addArticle()
+    abbrevs: Dict[str, Optional[Dict[str, str]]] = {}
+    for name in gen.names:
+        name = name.replace(' (journal)', '').replace(' (magazine)', '')
+        abbrevs[name] = {'all': abbreviate(name),
+                         'eng': abbreviate(name, 'eng'),
+                         'matchingPatterns': matchingPatterns(name)}
+    vocabulary = set()
+    for title in gen.pages:
+        vocabulary.update(w.casefold() for w in title.split())
+    return Corpus(pages=gen.pages,
+                  articles=gen.articles,
+                  state={'pages': {}, 'abbrevs': abbrevs},
+                  nlmText=gen.makeNLMText(),
+                  msnText=gen.makeMSNText(),
+                  vocabulary=vocabulary,
+                  foreign=gen.foreign)
+
+
+def writeCorpus(corpus: Corpus, directory: str) -> Dict[str, str]:
+    """Write the corpus' state, databases and LTWA, return dict of paths."""
+    paths = {'state': os.path.join(directory, 'abbrevBotState.json'),
+             'nlm': os.path.join(directory, 'databaseNLM.txt'),
+             'msn': os.path.join(directory, 'databaseMathSciNet.csv'),
+             'ltwa': os.path.join(directory, 'LTWA.csv')}
+    with open(paths['state'], 'wt') as f:
+        json.dump(corpus.state, f)
+    with open(paths['nlm'], 'wt') as f:
+        f.write(corpus.nlmText)
+    with open(paths['msn'], 'wt') as f:
+        f.write(corpus.msnText)
+    with open(paths['ltwa'], 'wt') as f:
+        f.write(makeLTWAText())
+    return paths
@@ -0,0 +1,261 @@
+"""An in-process fake of the few pywikibot Site/Page features the bots use.
+
+`install(site)` replaces `pywikibot.Page` and `Site()` (also where the bots
+imported it) so that all pages come from a dict of wikitexts. Instead of
+sending requests, the fake counts in `site.calls` the API requests that
+pywikibot would send, by module (e.g. 'redirects', 'revisions', 'edit').
+"""
+import math
+import re
+import sys
+from collections import Counter
+from datetime import timedelta
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+import pywikibot
+import pywikibot.exceptions
+
+import utils
+
+# Pages every run of the bots expects to exist.
+SITE_PAGES = {
+    'Template:Infobox journal': '<includeonly>{{Infobox}}</includeonly>',
+    'Template:Infobox Journal': '#REDIRECT [[Template:Infobox journal]]',
+    'MediaWiki:Titleblacklist': ('.*(?:[Jj]\\.){4,}.*\n'
+                                 '^[Tt]est[ _]+page.*\n'
+                                 '.*\\.(?:com|net)\\b.* <casesensitive>\n'),
+    'MediaWiki:Titlewhitelist': '^Test page \\(journal\\)$\n',
+    'Wikipedia:Bots/Requests for approval/TokenzeroBot 2': 'Approved.',
+    'Wikipedia:Bots/Requests for approval/TokenzeroBot 6': 'Approved.',
+}
+# Max number of pages per request, with and without content.
+CONTENT_LIMIT = 50
+LIMIT = 500
+
+
+class Namespace(NamedTuple):
+    """Like pywikibot's Namespace, with the fields `utils` uses."""
+
+    id: int
+    canonical_name: str
+    custom_name: str
+    aliases: List[str]
+
+
+class Namespaces(Dict[int, Namespace]):
+    """Dict from namespace id to Namespace, also indexable by name."""
+
+    def __missing__(self, key: Any) -> Namespace:
+        for ns in self.values():
+            if key in (ns.canonical_name, ns.custom_name):
+                return ns
+        raise KeyError(key)
+
+
+class FakeSite:
+    """A wiki that serves given pages, counting would-be API requests."""
+
+    code = 'en'
+
+    def __init__(self, pages: Dict[str, str]) -> None:
+        self.namespaces = Namespaces({
+            0: Namespace(0, '', '', []),
+            4: Namespace(4, 'Project', 'Wikipedia', ['WP']),
+            8: Namespace(8, 'MediaWiki', 'MediaWiki', []),
+            10: Namespace(10, 'Template', 'Template', ['T']),
+            14: Namespace(14, 'Category', 'Category', []),
+        })
+        self.siteinfo = {'case': 'first-letter',
+                         'interwikimap': [{'prefix': 'wikt'},
+                                          {'prefix': 'commons'}]}
+        # Dict from title to (revid, wikitext).
+        self.pages: Dict[str, Any] = {}
+        # Dict from target title to titles of redirects to it.
+        self.redirects: Dict[str, List[str]] = {}
+        self.calls: Counter = Counter()
+        self.lastRevid = 0
+        for title, text in {**pages, **SITE_PAGES}.items():
+            self.setText(utils.normalizeTitle(title), text)
+
+    def setText(self, title: str, text: str) -> None:
+        """Create or edit a page, keeping the redirects index updated."""
+        old = self.pages.get(title)
+        if old is not None:
+            oldTarget = utils.parseRedirectTarget(old[1])
+            if oldTarget is not None:
+                self.redirects[oldTarget.partition('#')[0]].remove(title)
+        self.lastRevid += 1
+        self.pages[title] = (self.lastRevid, text)
+        target = utils.parseRedirectTarget(text)
+        if target is not None:
+            self.redirects.setdefault(target.partition('#')[0], []) \
+                .append(title)
+
+    def namespaceOf(self, title: str) -> int:
+        """Return the namespace id of a title, from its prefix."""
+        prefix, colon, _ = title.partition(':')
+        if colon:
+            for ns in self.namespaces.values():
+                if ns.id and prefix in (ns.canonical_name, ns.custom_name):
+                    return ns.id
+        return 0
+
+    def countRequests(self, module: str, nPages: int, limit: int) -> None:
+        """Count requests needed to get `nPages` results (at least one)."""
+        self.calls[module] += max(1, math.ceil(nPages / limit))
+
+    def _generator(self, genClass: Any, type_arg: str,
+                   titles: Any = None, namespaces: Any = None,
+                   total: Optional[int] = None, g_content: bool = False,
+                   **kwargs: Any) -> Iterator['FakePage']:
+        """Like `site._generator()`, only for `type_arg='redirects'`."""
+        assert type_arg == 'redirects', type_arg
+        if isinstance(titles, str):
+            titles = [titles]
+        results = []
+        for title in titles:
+            results.extend(self.redirects.get(utils.normalizeTitle(title), []))
+        results = results[:total]
+        self.countRequests(type_arg, len(results),
+                           CONTENT_LIMIT if g_content else LIMIT)
+        for rTitle in results:
+            yield FakePage(self, rTitle, loaded=True, content=g_content)
+
+    def preloadpages(self, pages: Iterable['FakePage'], content: bool = False,
+                     categories: bool = False) -> Iterator['FakePage']:
+        """Like `site.preloadpages()`: load pages in batches."""
+        pages = list(pages)
+        self.countRequests('pages', len(pages),
+                           CONTENT_LIMIT if content else LIMIT)
+        for page in pages:
+            yield FakePage(self, page.title(), loaded=True, content=content)
+
+    def server_time(self) -> pywikibot.Timestamp:
+        """Return the current time (pretending to ask the server)."""
+        self.calls['siteinfo'] += 1
+        return pywikibot.Timestamp.nowutc()
+
+
+class FakePage:
+    """Like `pywikibot.Page`, for pages of a FakeSite."""
+
+    def __init__(self, source: FakeSite, title: str = '', ns: Any = 0,
+                 loaded: bool = False, content: bool = False) -> None:
+        if isinstance(ns, Namespace):
+            ns = ns.id
+        if ns and source.namespaceOf(title) != ns:
+            title = source.namespaces[ns].canonical_name + ':' + title
+        if re.search(r'[\[\]{}|<>]', title):
+            raise pywikibot.exceptions.InvalidTitleError(title)
+        self.site = source
+        self._title = utils.normalizeTitle(title)
+        self._loaded = loaded
+        self._text: Optional[str] = None
+        if content:
+            self._text = self.site.pages.get(self._title, (None, None))[1]
+
+    def __repr__(self) -> str:
+        return f'FakePage({self._title!r})'
+
+    def title(self) -> str:
+        """Return the title."""
+        return self._title
+
+    def namespace(self) -> Namespace:
+        """Return the namespace."""
+        return self.site.namespaces[self.site.namespaceOf(self._title)]
+
+    def _loadInfo(self) -> None:
+        if not self._loaded:
+            self.site.calls['info'] += 1
+            self._loaded = True
+
+    def exists(self) -> bool:
+        """Return whether the page exists."""
+        self._loadInfo()
+        return self._title in self.site.pages
+
+    def has_content(self) -> bool:  # pylint: disable=invalid-name
+        """Return whether the content was loaded already."""
+        return self._text is not None
+
+    @property
+    def text(self) -> str:
+        """Return the wikitext (loading it if needed), '' if missing."""
+        if self._text is None:
+            self.site.calls['revisions'] += 1
+            self._loaded = True
+            self._text = self.site.pages.get(self._title, (None, ''))[1]
+        return self._text
+
+    @text.setter
+    def text(self, value: str) -> None:
+        self._text = value
+
+    @property
+    def latest_revision_id(self) -> int:  # pylint: disable=invalid-name
+        """Return the id of the latest revision."""
+        if not self.exists():
+            raise pywikibot.exceptions.NoPageError(self)
+        return self.site.pages[self._title][0]
+
+    @property
+    def latest_revision(self) -> SimpleNamespace:
+        """Return the latest revision (revid, timestamp and text)."""
+        if self._text is None:
+            self.site.calls['revisions'] += 1
+        revid, text = self.site.pages[self._title]
+        # Pretend revisions were made a minute apart, a long time ago.
+        timestamp = pywikibot.Timestamp(2020, 1, 1) + timedelta(minutes=revid)
+        return SimpleNamespace(revid=revid, timestamp=timestamp, text=text)
+
+    def isRedirectPage(self) -> bool:
+        """Return whether the page is a redirect."""
+        return utils.parseRedirectTarget(self.text) is not None
+
+    def categories(self) -> List['FakePage']:
+        """Return the categories in the wikitext (ignoring templates)."""
+        return [FakePage(self.site, 'Category:' + name)
+                for name in re.findall(r'\[\[Category:([^\]|]+)', self.text)]
+
+    def embeddedin(self, filter_redirects: Optional[bool] = None,
+                   namespaces: Any = None, total: Optional[int] = None,
+                   content: bool = False) -> Iterator['FakePage']:
+        """Yield mainspace pages transcluding this template (or redirects)."""
+        names = [re.escape(title.partition(':')[2]) for title
+                 in [self._title] + self.site.redirects.get(self._title, [])]
+        regex = re.compile(r'{{\s*(' + '|'.join(
+            '(?i:' + name[0] + ')' + name[1:] for name in names)
+            + r')\s*[|}\n]')
+        titles = [title for title, (_, text) in self.site.pages.items()
+                  if self.site.namespaceOf(title) == 0 and regex.search(text)]
+        titles = titles[:total]
+        self.site.countRequests('embeddedin', len(titles),
+                                CONTENT_LIMIT if content else LIMIT)
+        for title in titles:
+            yield FakePage(self.site, title, loaded=True, content=content)
+
+    def save(self, summary: str = '', createonly: bool = False,
+             nocreate: bool = False, **kwargs: Any) -> None:
+        """Save the text set with `page.text = ...`."""
+        self.site.calls['edit'] += 1
+        exists = self._title in self.site.pages
+        if createonly and exists:
+            raise pywikibot.exceptions.PageCreatedConflictError(self)
+        if nocreate and not exists:
+            raise pywikibot.exceptions.NoCreateError(self)
+        self.site.setText(self._title, self._text or '')
+
+
+def install(site: FakeSite) -> None:
+    """Make pywikibot and the bots use `site` (for the rest of the run)."""
+    pywikibot.Page = FakePage
+    pywikibot.Site = lambda *args, **kwargs: site
+    for name in ['utils', 'andBot', 'variantBot', 'abbrevIsoBot.__main__',
+                 'abbrevIsoBot.fill']:
+        if name in sys.modules:
+            sys.modules[name].Site = pywikibot.Site  # type: ignore
+    # No need to parse the blacklist for each benchmark.
+    utils._titleBlacklist = None  # pylint: disable=protected-access
+    utils.loadTitleBlacklist()
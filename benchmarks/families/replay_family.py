@@ -0,0 +1,20 @@
+"""Pywikibot family of the local replay server, see `benchmarks/replay.py`."""
+import os
+
+from pywikibot import family
+
+
+class Family(family.SingleSiteFamily):
+    """The replay server on localhost, posing as the English Wikipedia."""
+
+    name = 'replay'
+    code = 'en'
+    domain = 'localhost:' + os.environ.get('TOKENZERO_REPLAY_PORT', '8765')
+
+    def protocol(self, code: str) -> str:
+        """Return 'http', the replay server has no TLS."""
+        return 'http'
+
+    def scriptpath(self, code: str) -> str:
+        """Return the path of api.php, as on Wikipedia."""
+        return '/w'
@@ -0,0 +1,200 @@
+"""A local stand-in for the MediaWiki API, replaying a recorded cassette.
+
+Record the read requests of a real run by naming a cassette file:
+    TOKENZERO_CASSETTE_FILE=scrape.jsonl.gz python3 -m abbrevIsoBot scrape
+Then serve it:
+    python -m benchmarks.replay scrape.jsonl.gz [--port 8765]
+        [--latency MS | --latency recorded] [--rate N] [--workers N]
+        [--maxlag-every N]
+and point pywikibot at it, with the family in `benchmarks/families`,
+by putting in user-config.py:
+    user_families_paths = ['benchmarks/families']
+    family = 'replay'
+    mylang = 'en'
+    usernames['replay']['en'] = 'TokenzeroBot'
+(set $TOKENZERO_REPLAY_PORT if not using the default port). The bots then run
+unchanged, e.g. with `--profile` or $TOKENZERO_STATS_FILE to measure them.
+
+Requests are matched by their params (see `utils.cassetteKey()`); a request
+recorded several times gets its responses in the recorded order, repeating
+the last one. Requests not in the cassette (e.g. edits) get an API error.
+"""
+import argparse
+import gzip
+import json
+import os
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault('PYWIKIBOT_NO_USER_CONFIG', '2')
+
+# pylint: disable=wrong-import-position
+from utils import cassetteKey  # noqa: E402
+
+DEFAULT_PORT = 8765
+
+
+class Cassette:
+    """Recorded responses, by request key."""
+
+    def __init__(self, fileName: str) -> None:
+        self.entries: Dict[str, List[Dict[str, Any]]] = {}
+        self.next: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'repeats': 0, 'misses': 0}
+        with gzip.open(fileName, 'rt', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                self.entries.setdefault(entry['key'], []).append(entry)
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the next response recorded for `key`, or None."""
+        with self.lock:
+            entries = self.entries.get(key)
+            if not entries:
+                self.stats['misses'] += 1
+                return None
+            i = self.next.get(key, 0)
+            if i < len(entries):
+                self.stats['hits'] += 1
+                self.next[key] = i + 1
+            else:
+                self.stats['repeats'] += 1
+                i = len(entries) - 1
+            return entries[i]
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """HTTP server answering API requests from a cassette."""
+
+    daemon_threads = True
+
+    def __init__(self, port: int, cassette: Cassette,
+                 latency: Optional[float], rate: Optional[float],
+                 workers: Optional[int], maxlagEvery: Optional[int]) -> None:
+        super().__init__(('localhost', port), ReplayHandler)
+        self.cassette = cassette
+        # Added seconds per response, None to use the recorded latency.
+        self.latency = latency
+        # Min seconds between the starts of two responses, if any.
+        self.interval = 1 / rate if rate else 0
+        self.nextStart = time.monotonic()
+        self.rateLock = threading.Lock()
+        # Max number of requests handled at once, like a server pool.
+        self.slots = threading.BoundedSemaphore(workers) if workers else None
+        self.maxlagEvery = maxlagEvery
+        self.nRequests = 0
+
+    def waitForTurn(self) -> int:
+        """Wait as the rate limit requires, return the request's number."""
+        with self.rateLock:
+            self.nRequests += 1
+            n = self.nRequests
+            start = max(time.monotonic(), self.nextStart)
+            self.nextStart = start + self.interval
+        delay = start - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return n
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Answers a single API request."""
+
+    server: ReplayServer
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Handle a GET request, with params in the query string."""
+        self.reply(urllib.parse.urlsplit(self.path).query)
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        """Handle a POST request, with urlencoded params in the body."""
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8', 'replace')
+        self.reply(body)
+
+    def reply(self, paramstring: str) -> None:
+        """Send the recorded response, after the configured delays."""
+        server = self.server
+        n = server.waitForTurn()
+        if server.slots:
+            server.slots.acquire()
+        try:
+            if server.maxlagEvery and n % server.maxlagEvery == 0:
+                self.send(200, 'application/json', json.dumps({'error': {
+                    'code': 'maxlag', 'info': 'Waiting for replica: 1 seconds '
+                    'lagged', 'host': 'replica', 'lag': 1}}),
+                    {'Retry-After': '1'})
+                return
+            entry = server.cassette.lookup(cassetteKey(paramstring))
+            if entry is None:
+                print(f'Not in cassette: {paramstring}', flush=True)
+                self.send(200, 'application/json', json.dumps({'error': {
+                    'code': 'notincassette',
+                    'info': 'This request was not recorded.'}}))
+                return
+            latency = entry['seconds'] if server.latency is None \
+                else server.latency
+            time.sleep(latency)
+            self.send(entry['status'], entry['contentType'], entry['body'])
+        finally:
+            if server.slots:
+                server.slots.release()
+
+    def send(self, status: int, contentType: str, body: str,
+             headers: Optional[Dict[str, str]] = None) -> None:
+        """Send a response."""
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    # pylint: disable-next=arguments-differ
+    def log_message(self, *args: Any) -> None:
+        """Don't log every request."""
+
+
+def main() -> None:
+    """Parse arguments and serve until interrupted."""
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.replay',
+        description='Replay a recorded cassette as a MediaWiki API.')
+    parser.add_argument('cassette', help='gzipped JSON-lines file')
+    parser.add_argument('--port', type=int, default=int(os.environ.get(
+        'TOKENZERO_REPLAY_PORT', DEFAULT_PORT)))
+    parser.add_argument('--latency', default='0',
+                        help="milliseconds to wait before each response, "
+                             "or 'recorded' to use the recorded ones")
+    parser.add_argument('--rate', type=float,
+                        help='max responses started per second')
+    parser.add_argument('--workers', type=int,
+                        help='max requests handled at once')
+    parser.add_argument('--maxlag-every', type=int, metavar='N',
+                        help='answer every N-th request with a maxlag error')
+    args = parser.parse_args()
+    latency = None if args.latency == 'recorded' \
+        else float(args.latency) / 1000
+    cassette = Cassette(args.cassette)
+    print(f'Loaded {sum(map(len, cassette.entries.values()))} responses '
+          f'to {len(cassette.entries)} distinct requests.', flush=True)
+    server = ReplayServer(args.port, cassette, latency, args.rate,
+                          args.workers, args.maxlag_every)
+    print(f'Serving on http://localhost:{args.port}/w/api.php', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f'Served {server.nRequests} requests: {cassette.stats}')
+
+
+if __name__ == '__main__':
+    main()
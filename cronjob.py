@@ -4,21 +4,35 @@
 The script:
 - checks if no other instance of the script is running (using UNIX flock),
 - remembers (in a file) when each job last started and finished successfully,
-- runs the first job that should be run (synchronously) and then terminates.
+- runs all jobs that should be run, at most MAX_PARALLEL at a time, each only
+  after the jobs it depends on are done, and then terminates,
+- skips a due job (marking it as finished) if its prechecks give the same
+  fingerprint as before its last successful run, see `prechecks`,
+- records metrics of each run (wall and CPU time, peak memory, counters
+  reported by the bot) in HISTORY_FILE_NAME; `cronjob.py stats` prints them.
 A job should be run if between now and the last time it finished there was a
-'running moment'. 'Running moments' are 19th and last day of each month.
+'running moment'. 'Running moments' are ~every week (see `shouldRunJob`).
+If a job fails, jobs depending on it are not run, other jobs still are,
+and the error is raised at the end.
 """
 import typing
-from typing import List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
 import collections
 import json
 import fcntl
+import threading
 
 OrderedDict = dict
 
 LOCK_FILE_NAME = ".cronjob.lock"
 STATE_FILE_NAME = ".cronState.json"
+# Dict from job id-key to {'fingerprint': ..., 'ran': start time of last run}.
+FINGERPRINTS_FILE_NAME = ".cronFingerprints.json"
+# JSON-lines file with metrics of each job run (see `runJob()`).
+HISTORY_FILE_NAME = ".cronHistory.jsonl"
+historyLock = threading.Lock()
 # Dict from job id-key to time we last started and finished it.
 State = OrderedDict[str, Tuple[Optional[datetime], Optional[datetime]]]
 # Representation of State as a JSON object
@@ -36,6 +50,34 @@ jobs: OrderedDict[str, List[str]] = OrderedDict(
     abbrevIsoPost=PYTHON + ['-m', 'abbrevIsoBot', 'report'],
     fillBot=PYTHON + ['-m', 'abbrevIsoBot', 'fill']
 )
+# Dict from job id-key to ids of jobs that have to finish before it starts.
+dependencies: Dict[str, List[str]] = dict(
+    abbrevIso=['abbrevIsoBot'],
+    abbrevIsoPost=['abbrevIso'],
+    fillBot=['abbrevIsoPost']
+)
+# Maximum number of jobs running at the same time.
+MAX_PARALLEL = 2
+# Dict from job id-key to cheap checks of whatever the job depends on,
+# as (kind, argument) pairs, see `runPrecheck()`. If none of the results
+# changed since the job last ran successfully, it is skipped.
+prechecks: Dict[str, List[Tuple[str, str]]] = dict(
+    andBot=[('embeddedin', 'Template:Infobox journal'),
+            ('embeddedin', 'Template:Infobox magazine'),
+            ('categorysize', 'Category:English-language journals'),
+            ('categorysize', 'Category:Multilingual journals')],
+    variantBot=[('categorymembers',
+                 'Category:Redirects from ISO 4 abbreviations')],
+    abbrevIsoBot=[('embeddedin', 'Template:Infobox journal'),
+                  ('mtime', 'databaseNLM.txt'),
+                  ('mtime', 'databaseMathSciNet.csv'),
+                  ('mtime', 'databaseMathSciNet.html')],
+    abbrevIso=[('dependencies', '')],
+    abbrevIsoPost=[('dependencies', ''),
+                   ('embeddedin', 'Template:Infobox journal')],
+    fillBot=[('dependencies', '')]
+)
+API_URL = 'https://en.wikipedia.org/w/api.php'
 
 
 def main() -> None:
@@ -45,24 +87,172 @@ def main() -> None:
     _lock = ExclusiveInstanceLock(os.getcwd() + '/' + LOCK_FILE_NAME)
 
     lastRunTimes: State = loadState()
+    fingerprints = loadFingerprints()
+
+    def isDue(jobId: str) -> bool:
+        """Return whether job should run (or is running) now."""
+        s, t = lastRunTimes.get(jobId, (None, None))
+        return not s or bool(t and shouldRunJob(max(s, t)))
 
+    failed: Set[str] = set()
+    errors: List[Exception] = []
     for jobId, jobArgs in jobs.items():
         s, t = lastRunTimes.get(jobId, (None, None))
         if s and ((not t) or t < s):
             send_notification(f'bad times {jobId} s={s} t={t} {jobArgs}')
-            raise Exception(f'ERROR: {jobId}: last end time < start time, job killed?')
-        if not s or (t and shouldRunJob(max(s, t))):
-            s = datetime.now(timezone.utc)
-            lastRunTimes[jobId] = (s, t)
-            saveState(lastRunTimes)
+            failed.add(jobId)
+            errors.append(Exception(
+                f'ERROR: {jobId}: last end time < start time, job killed?'))
+
+    # Dict from future of each running job to its id-key.
+    running: Dict[Future, str] = {}
+
+    def isReady(jobId: str) -> bool:
+        """Return whether job is due and all its dependencies are done."""
+        return (jobId not in failed and jobId not in running.values()
+                and isDue(jobId)
+                and not any(d in failed or d in running.values() or isDue(d)
+                            for d in dependencies.get(jobId, [])))
 
-            runJob(jobId, jobArgs)
+    nStarted = 0
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL) as executor:
+        while True:
+            for jobId, jobArgs in jobs.items():
+                if len(running) >= MAX_PARALLEL:
+                    break
+                if isReady(jobId):
+                    _, t = lastRunTimes.get(jobId, (None, None))
+                    s = datetime.now(timezone.utc)
+                    lastRunTimes[jobId] = (s, t)
+                    saveState(lastRunTimes)
+                    running[executor.submit(runGatedJob, jobId, jobArgs,
+                                            fingerprints)] = jobId
+                    nStarted += 1
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                jobId = running.pop(future)
+                try:
+                    ran, fingerprint = future.result()
+                except Exception as e:  # pylint: disable=broad-except
+                    print(f'Failed: {jobId} ({e}).')
+                    failed.add(jobId)
+                    errors.append(e)
+                    continue
+                s = lastRunTimes[jobId][0]
+                t = datetime.now(timezone.utc)
+                lastRunTimes[jobId] = (s, t)
+                saveState(lastRunTimes)
+                entry = fingerprints.setdefault(jobId, {})
+                if ran:
+                    entry['ran'] = s.isoformat(" ")
+                if fingerprint is not None:
+                    entry['fingerprint'] = fingerprint
+                saveFingerprints(fingerprints)
+    if not nStarted:
+        print('No jobs to run.')
+    if errors:
+        raise errors[0]
+
+
+def runGatedJob(jobId: str, jobArgs: List[str],
+                fingerprints: Dict[str, dict]) -> Tuple[bool, Optional[dict]]:
+    """Run job unless its prechecks show nothing changed since it last ran.
+
+    Return whether it ran, and the fingerprint (None if there are no
+    prechecks or they failed, in which case the job is run).
+    """
+    fingerprint = None
+    if jobId in prechecks:
+        try:
+            fingerprint = {f'{kind}:{arg}' if arg else kind:
+                           runPrecheck(kind, arg, jobId, fingerprints)
+                           for kind, arg in prechecks[jobId]}
+        except Exception as e:  # pylint: disable=broad-except
+            print(f'Precheck failed for {jobId}, running anyway ({e}).')
+    if fingerprint is not None \
+            and fingerprint == fingerprints.get(jobId, {}).get('fingerprint'):
+        print(f'Skipping: {jobId} (nothing changed since last run).')
+        return False, fingerprint
+    runJob(jobId, jobArgs)
+    return True, fingerprint
 
-            t = datetime.now(timezone.utc)
-            lastRunTimes[jobId] = (s, t)
-            saveState(lastRunTimes)
+
+def runPrecheck(kind: str, arg: str, jobId: str,
+                fingerprints: Dict[str, dict]) -> object:
+    """Return a json-serializable result of a cheap check for changes.
+
+    Kinds of checks:
+    - 'embeddedin': max lastrevid of mainspace pages transcluding template
+        `arg` (edits, moves and new transclusions all increase it),
+    - 'categorymembers': max lastrevid of mainspace pages in category `arg`,
+    - 'categorysize': number of members of category `arg`,
+    - 'mtime': modification time of file `arg` (None if missing),
+    - 'dependencies': start times of the last actual (not skipped) runs
+        of the jobs `jobId` depends on.
+    """
+    import os
+    if kind == 'embeddedin':
+        return maxLastRevid(dict(generator='embeddedin', geititle=arg,
+                                 geinamespace=0, geilimit='max'))
+    if kind == 'categorymembers':
+        return maxLastRevid(dict(generator='categorymembers', gcmtitle=arg,
+                                 gcmnamespace=0, gcmlimit='max'))
+    if kind == 'categorysize':
+        data = next(queryApi(dict(prop='categoryinfo', titles=arg)))
+        return data['query']['pages'][0].get('categoryinfo', {}).get('size', 0)
+    if kind == 'mtime':
+        return os.path.getmtime(arg) if os.path.exists(arg) else None
+    if kind == 'dependencies':
+        return {d: fingerprints.get(d, {}).get('ran')
+                for d in dependencies.get(jobId, [])}
+    raise ValueError(f'Unknown precheck kind: {kind}')
+
+
+def maxLastRevid(generatorParams: Dict[str, object]) -> int:
+    """Return max lastrevid over pages given by an API query generator."""
+    result = 0
+    for data in queryApi(dict(generatorParams, prop='info')):
+        for page in data.get('query', {}).get('pages', []):
+            result = max(result, page.get('lastrevid', 0))
+    return result
+
+
+def queryApi(params: Dict[str, object]) -> Iterator[dict]:
+    """Yield responses to an API query, following continuations."""
+    import urllib.parse
+    import urllib.request
+    params = dict(params, action='query', format='json', formatversion=2)
+    while True:
+        request = urllib.request.Request(
+            API_URL + '?' + urllib.parse.urlencode(params),
+            headers={'User-Agent': 'TokenzeroBot cronjob '
+                     '(https://en.wikipedia.org/wiki/User:TokenzeroBot)'})
+        with urllib.request.urlopen(request, timeout=60) as response:
+            data = json.load(response)
+        if 'error' in data:
+            raise Exception(f'API error: {data["error"]}')
+        yield data
+        if 'continue' not in data:
             return
-    print('No jobs to run.')
+        params.update(data['continue'])
+
+
+def loadFingerprints() -> Dict[str, dict]:
+    """Load fingerprints from FINGERPRINTS_FILE_NAME."""
+    try:
+        with open(FINGERPRINTS_FILE_NAME, 'rt') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def saveFingerprints(fingerprints: Dict[str, dict]) -> None:
+    """Save fingerprints to FINGERPRINTS_FILE_NAME."""
+    with open(FINGERPRINTS_FILE_NAME, 'wt') as f:
+        json.dump(fingerprints, f, indent="\t")
+        f.write("\n")
 
 
 def send_notification(message="ERROR"):
@@ -106,9 +296,12 @@ def runJob(jobId: str, jobArgs: List[str], timeout: int = 8 * 60 * 60) -> None:
     """Run job with same stdout/err, return when done.
 
     Throw if non-zero return code or killed by timeout (in seconds).
+    Metrics of the run are appended to HISTORY_FILE_NAME in any case.
     """
     import subprocess
     import os
+    import threading
+    import time
     print(f'Running: {jobId} ({" ".join(jobArgs)}).')
     d = datetime.now(timezone.utc).date().isoformat()
     fp = open(f'logs/cron-{jobId}-{d}.txt', 'a')
@@ -116,11 +309,101 @@ def runJob(jobId: str, jobArgs: List[str], timeout: int = 8 * 60 * 60) -> None:
     fp.flush()
     if jobArgs[0].startswith('.'):
         jobArgs[0] = os.getcwd() + '/' + jobArgs[0]
-    env = os.environ  # | {"PYTHONPATH": "/home/token0/workspace/wikipedia/pywikibot/core/:" + os.environ.get("PYTHONPATH", "")}
-    subprocess.run(jobArgs, timeout=timeout, check=True, stdout=fp, stderr=fp, env=env)
+    statsFileName = f'{os.getcwd()}/.cronStats-{jobId}.json'
+    # | {"PYTHONPATH": "/home/token0/workspace/wikipedia/pywikibot/core/:" + os.environ.get("PYTHONPATH", "")}
+    env = os.environ | {'TOKENZERO_STATS_FILE': statsFileName}
+    start = datetime.now(timezone.utc)
+    startTime = time.monotonic()
+    proc = subprocess.Popen(jobArgs, stdout=fp, stderr=fp, env=env)
+    timedOut = threading.Event()
+
+    def kill() -> None:
+        timedOut.set()
+        proc.kill()
+
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    # Wait with wait4 to get the resources used by this child only
+    # (other jobs may be running in parallel).
+    _, status, rusage = os.wait4(proc.pid, 0)
+    timer.cancel()
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    record = {
+        'job': jobId,
+        'start': start.isoformat(" "),
+        'wall': round(time.monotonic() - startTime, 3),
+        'cpu': round(rusage.ru_utime + rusage.ru_stime, 3),
+        'maxrssKB': rusage.ru_maxrss,
+        'exit': proc.returncode,
+        'timedOut': timedOut.is_set(),
+        'stats': loadJobStats(statsFileName)
+    }
+    appendHistory(record)
     fp.flush()
     fp.write(f'[cronjob finished {datetime.now(timezone.utc).isoformat()}]\n')
     fp.flush()
+    if timedOut.is_set():
+        raise subprocess.TimeoutExpired(jobArgs, timeout)
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, jobArgs)
+
+
+def loadJobStats(statsFileName: str) -> Optional[dict]:
+    """Load and remove counters written by the job (see utils.dumpRunStats)."""
+    import os
+    try:
+        with open(statsFileName, 'rt') as f:
+            stats = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    os.remove(statsFileName)
+    return stats
+
+
+def appendHistory(record: dict) -> None:
+    """Append a record of a job run to HISTORY_FILE_NAME."""
+    with historyLock:
+        with open(HISTORY_FILE_NAME, 'at') as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def loadHistory() -> List[dict]:
+    """Load all records of job runs from HISTORY_FILE_NAME."""
+    try:
+        with open(HISTORY_FILE_NAME, 'rt') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def printStats(trailing: int = 5, slowdown: float = 1.3) -> None:
+    """Print recent metrics of each job and flag regressions.
+
+    A run is flagged if its wall time is more than `slowdown` times the
+    median of the `trailing` successful runs before it.
+    """
+    import statistics
+    history = loadHistory()
+    for jobId in jobs:
+        runs = [r for r in history if r['job'] == jobId]
+        if not runs:
+            continue
+        print(f'== {jobId} ({len(runs)} runs) ==')
+        for i in range(max(0, len(runs) - trailing), len(runs)):
+            r = runs[i]
+            previous = [p['wall'] for p in runs[max(0, i - trailing):i]
+                        if p['exit'] == 0]
+            flag = ''
+            if r['exit'] != 0:
+                flag = 'TIMEOUT' if r['timedOut'] else f'FAILED ({r["exit"]})'
+            elif previous and r['wall'] > slowdown * statistics.median(previous):
+                ratio = r['wall'] / statistics.median(previous)
+                flag = f'SLOWER x{ratio:.2f} than trailing median'
+            counters = (r.get('stats') or {}).get('counters', {})
+            print(f"{r['start'][:16]}  wall={r['wall'] / 60:7.1f}min"
+                  f"  cpu={r['cpu'] / 60:7.1f}min"
+                  f"  rss={r['maxrssKB'] / 1024:6.0f}MB"
+                  f"  {counters}  {flag}")
 
 
 class ExclusiveInstanceLock:
@@ -171,4 +454,10 @@ def saveState(state: State) -> None:
 
 
 if __name__ == "__main__":
-    main()
+    import sys
+    if sys.argv[1:] == ['stats']:
+        import os
+        os.chdir(os.path.dirname(__file__))
+        printStats()
+    else:
+        main()
@@ -11,28 +11,46 @@ For example:
     Journal of Foos
     Journal of Bar: International Research
     ...
+
+Run with `index [filename.txt ...]` (all of omicsLists/ by default) instead to
+check the lists offline for errors, duplicates and colliding redirect titles.
 """
 import logging
+import glob
 import re
 import sys
-from typing import List, Optional
+from collections import defaultdict
+from typing import DefaultDict, Dict, List, NamedTuple, Optional, Set, Tuple
 
 import pywikibot
 import pywikibot.data.api
 from pywikibot import Site
 
-from utils import initLimits, trySaving
-from abbrevIsoBot import state
+from utils import initLimits, isAllowedTitle, normalizeTitle, \
+    printRunStats, trySaving, getPageState, prefetchPageStates, \
+    initProfiling, phase
+from abbrevIsoBot import ltwa, state
 
 # We share the state (with computed ISO-4 abbrevs) with abbrevIsoBot.
 STATE_FILE_NAME = 'abbrevIsoBot/abbrevBotState.json'
+# Command of a worker computing missing abbrevs, see abbrevIsoBot.
+ABBREV_WORKER_COMMAND: Optional[List[str]] = None
+LTWA_FILE_NAME: Optional[str] = None
 
 
 def main() -> None:
     """Execute the bot."""
     logging.basicConfig(level=logging.WARNING)
+    initProfiling('omicsBot')
+    if len(sys.argv) >= 2 and sys.argv[1] == 'index':
+        filenames = sys.argv[2:] or sorted(glob.glob('omicsLists/*.txt'))
+        state.loadOrInitState(STATE_FILE_NAME)
+        if not doIndex(filenames):
+            sys.exit(1)
+        return
     if len(sys.argv) != 2:
         print(f'Usage: {sys.argv[0]} filename.txt')
+        print(f'       {sys.argv[0]} index [filename.txt ...]')
         return
     filename = sys.argv[1]
 
@@ -46,43 +64,192 @@ def main() -> None:
     )
 
     state.loadOrInitState(STATE_FILE_NAME)
+    ltwaProvider = ltwa.makeProvider(LTWA_FILE_NAME) if LTWA_FILE_NAME \
+        else None
+    if ltwaProvider is not None:
+        state.setAbbrevProvider(ltwaProvider)
+    else:
+        state.initAbbrevProvider(ABBREV_WORKER_COMMAND)
+
+    configLines, titleLines = readListFile(filename)
+    print(f'Config lines: {len(configLines)} \t [{filename}]')
+    with phase('config check'):
+        config = Config(configLines)
+    # Keep abbrevs of the list's titles in the state until it's rerun.
+    state.pinAbbrevs(filename, [getLineTitle(line, config)
+                                for _lineNumber, line in titleLines])
+    for i, (_lineNumber, line) in enumerate(titleLines):
+        print(f'Title line {i + 1}/{len(titleLines)} \t [{filename}]')
+        with phase('redirects'):
+            if config.lang:
+                parts = list(map(lambda x: x.strip(), line.split(';')))
+                assert len(parts) == 2
+                doOmicsRedirects(parts[1], config, parts[0])
+            else:
+                doOmicsRedirects(line, config)
+        if config.publisher:
+            with phase('hatnotes'):
+                doOmicsHatnotes(line, config.publisher)
+        sys.stdout.flush()
+    state.saveState(STATE_FILE_NAME)
+    printRunStats()
+
 
-    configEnd: Optional[int] = None
+def readListFile(filename: str) \
+        -> Tuple[List[str], List[Tuple[int, str]]]:
+    """Read a list file, return its config lines and its title lines.
+
+    Empty lines are skipped, the two parts are separated by a '---' line.
+    Title lines are returned with their (1-based) line number in the file.
+    """
     configLines: List[str] = []
-    numLines = sum(1 for line in open(filename) if line.rstrip())
+    titleLines: List[Tuple[int, str]] = []
+    configEnded = False
     with open(filename) as f:
-        for i, line in enumerate(f):
+        for lineNumber, line in enumerate(f, start=1):
             line = line.strip()
             if not line:
                 continue
+            if configEnded:
+                titleLines.append((lineNumber, line))
+            elif line == '---':
+                configEnded = True
+            else:
+                configLines.append(line)
+    if not configEnded:
+        raise Exception(f'No "---" line ending the config in {filename}.')
+    return configLines, titleLines
+
 
-            if configEnd is None:
-                print(f'Config line {i}/{numLines} \t [{filename}]')
-                if line == '---':
-                    configEnd = i
-                    config = Config(configLines)
-                else:
-                    configLines.append(line)
+def getLineTitle(line: str, config: 'Config') -> str:
+    """Return the journal title on a title line (no lang nor '(journal)')."""
+    if config.lang:
+        line = line.split(';')[-1]
+    return line.replace('(journal)', '').strip()
+
+
+class IndexEntry(NamedTuple):
+    """A title line from a list file that yields a redirect title variant."""
+
+    filename: str
+    lineNumber: int
+    title: str  # The journal title on that line, without '(journal)'.
+    rType: str  # Type of the variant, see `getTitleVariants()`.
+
+    def __str__(self) -> str:
+        return f'[[{self.title}]] ({self.rType}) [{self.filename}:' \
+            f'{self.lineNumber}]'
+
+
+def doIndex(filenames: List[str]) -> bool:
+    """Index redirect titles from all given list files and report conflicts.
+
+    No API calls are made: ISO-4 variants are computed using the abbrevs
+    stored in the state, existing journals are those scraped in the state.
+    Reports config errors, titles listed more than once (also across lists),
+    redirect titles that would be created for two different journal titles
+    and ones that collide with an existing journal (or redirect to it).
+    Returns whether nothing was reported.
+    """
+    # Dict from normalized redirect title to its sources.
+    index: DefaultDict[str, List[IndexEntry]] = defaultdict(list)
+    # Dict from normalized journal title to its list lines.
+    titleIndex: DefaultDict[str, List[IndexEntry]] = defaultdict(list)
+    nErrors = 0
+    nMissingAbbrevs = 0
+    for filename in filenames:
+        try:
+            configLines, titleLines = readListFile(filename)
+            config = Config(configLines, checkPages=False)
+        except Exception as err:  # pylint: disable=broad-except
+            print(f'Config error [{filename}]: {err}')
+            nErrors += 1
+            continue
+        for lineNumber, line in titleLines:
+            lang: Optional[str] = None
+            title = line
+            if config.lang:
+                parts = list(map(lambda x: x.strip(), line.split(';')))
+                if len(parts) != 2 or not parts[0] or not parts[1]:
+                    print(f'Line error [{filename}:{lineNumber}]: '
+                          f'expected "lang;title", got "{line}".')
+                    nErrors += 1
+                    continue
+                lang, title = parts
+            elif re.match(r'[a-z]{3}(,[a-z]{3})*;', line):
+                print(f'Config error [{filename}:{lineNumber}]: line looks '
+                      f'like "lang;title", but "lang" is not configured.')
+                nErrors += 1
+                break
+            addJournal = '(journal)' in title
+            title = title.replace('(journal)', '').strip()
+            if '(' in title:
+                print(f'Line error [{filename}:{lineNumber}]: '
+                      f'[[{title}]] has unexpected disambuig.')
+                nErrors += 1
+            rTitles = getTitleVariants(title, lang)
+            cLang = getAbbrevLanguage(lang) or 'all'
+            if state.hasAbbrev(title, cLang):
+                rTitles |= getAbbrevVariants(title,
+                                             state.getAbbrev(title, cLang))
             else:
-                print(f'Title line {i - configEnd}/{numLines - configEnd} \t '
-                      f'[{filename}]')
-                if config.lang:
-                    parts = list(map(lambda x: x.strip(), line.split(';')))
-                    assert len(parts) == 2
-                    doOmicsRedirects(parts[1], config, parts[0])
-                else:
-                    doOmicsRedirects(line, config)
-                if config.publisher:
-                    doOmicsHatnotes(line, config.publisher)
-            sys.stdout.flush()
-    state.saveState(STATE_FILE_NAME)
+                nMissingAbbrevs += 1
+            titleIndex[normalizeTitle(title)].append(
+                IndexEntry(filename, lineNumber, title, 'plain'))
+            for rTitle, rType in rTitles:
+                if addJournal and rType != 'iso4':
+                    rTitle = rTitle + ' (journal)'
+                index[normalizeTitle(rTitle)].append(
+                    IndexEntry(filename, lineNumber, title, rType))
+
+    nDuplicates = 0
+    for entries in titleIndex.values():
+        if len(entries) > 1:
+            nDuplicates += 1
+            where = 'Cross-list duplicate' \
+                if len(set(e.filename for e in entries)) > 1 else 'Duplicate'
+            print(f'{where}: ' + ', '.join(map(str, entries)))
+
+    nCollisions = 0
+    for rTitle, entries in sorted(index.items()):
+        titles = set(normalizeTitle(e.title) for e in entries)
+        if len(titles) > 1:
+            nCollisions += 1
+            print(f'Collision: [[{rTitle}]] from '
+                  + ', '.join(map(str, entries)))
+
+    # Existing journal articles and redirects to them, as last scraped.
+    existing: Dict[str, str] = {}
+    for pageTitle, pageData in state.getPagesDict().items():
+        for rTitle in pageData['redirects']:
+            existing[normalizeTitle(rTitle)] = pageTitle
+        existing[normalizeTitle(pageTitle)] = pageTitle
+    nExisting = 0
+    for rTitle, entries in sorted(index.items()):
+        if rTitle in existing:
+            nExisting += 1
+            print(f'Existing journal: [[{rTitle}]] (to [[{existing[rTitle]}]])'
+                  f' from ' + ', '.join(map(str, entries)))
+
+    print(f'Indexed {len(index)} redirect titles from {len(titleIndex)} '
+          f'journal titles in {len(filenames)} files.')
+    print(f'Errors: {nErrors}, duplicates: {nDuplicates}, '
+          f'collisions: {nCollisions}, existing journals: {nExisting}.')
+    if nMissingAbbrevs:
+        print(f'No computed abbreviation stored for {nMissingAbbrevs} titles '
+              f'(their ISO-4 variants are not indexed).')
+    return not (nErrors or nDuplicates or nCollisions or nExisting)
 
 
 class Config:
     """Configuration read from the list file."""
 
-    def __init__(self, lines: List[str]):
-        """Parse the config part of the input file and check sanity."""
+    def __init__(self, lines: List[str], checkPages: bool = True):
+        """Parse the config part of the input file and check sanity.
+
+        If `checkPages` is false, the target, category and publisher pages
+        are not checked to exist (so no API calls are made).
+        """
         self.rTarget: str
         self.rCat: str
         self.publisher: Optional[str] = None
@@ -116,6 +283,13 @@ class Config:
         if not rCat:
             raise Exception(f'No category configured!')
         self.rCat = rCat
+        if checkPages:
+            self.checkPages()
+
+    def checkPages(self) -> None:
+        """Check that the configured target, category and publisher exist."""
+        rTarget = self.rTarget
+        rCat = self.rCat
         targetPage = pywikibot.Page(Site(), rTarget)
         if (not targetPage.exists()
                 or targetPage.isRedirectPage()
@@ -153,42 +327,25 @@ def doOmicsRedirects(title: str,
         addJournal = True
     if '(' in title:
         print(f'Skip: [[{title}]] has unexpected disambuig.')
-    page = pywikibot.Page(Site(), title)
-    if page.exists() and not page.isRedirectPage():
+    pageState = getPageState(title)
+    if pageState.exists and not pageState.isRedirect():
         addJournal = True
         if 'journal' in title.lower():
             print(f'Skip: [[{title}]] already exists, '
                   'title already has "journal".')
             return
-        for cat in page.categories():
+        for cat in pywikibot.Page(Site(), title).categories():
             if 'journal' in cat.title().lower():
                 print(f'Skip: [[{title}]] already exists, '
                       'has category containing "journal".')
                 return
 
     # List of redirect pages to create, together with their type.
-    rTitles = set([(title, 'plain')])
-
-    # Handle 'and' vs '&' variant.
-    if ' and ' in title:
-        rTitles.add((title.replace(' and ', ' & '), 'and'))
-    elif ' & ' in title and 'Acta' not in title:
-        rTitles.add((title.replace(' & ', ' and '), 'and'))
-
-    # Handle variant without 'The' at the beginning.
-    if title.startswith('The '):
-        rTitle = title.replace('The ', '')
-        rTitles.add((rTitle, 'the'))
-        if ' and ' in rTitle:
-            rTitles.add((rTitle.replace(' and ', ' & '), 'theand'))
-        elif ' & ' in rTitle:
-            if not lang or 'eng' in lang:
-                rTitles.add((rTitle.replace(' & ', ' and '), 'theand'))
+    rTitles = getTitleVariants(title, lang)
 
     # Handle ISO-4 abbreviated variants.
     state.saveTitleToAbbrev(title)
-    if lang == 'ger':
-        lang = 'ger,eng,fra,lat'
+    lang = getAbbrevLanguage(lang)
     if lang:
         state.saveTitleToAbbrev(title, lang)
 
@@ -199,14 +356,23 @@ def doOmicsRedirects(title: str,
     except state.NotComputedYetError as err:
         print(err.message)
         return
-    if cAbbrev != title:
-        rTitles.add((cAbbrev, 'iso4'))
-        rTitles.add((cAbbrev.replace('.', ''), 'iso4'))
+    rTitles |= getAbbrevVariants(title, cAbbrev)
     # Deprecated:
     # if cAbbrev != cEngAbbrev and cEngAbbrev != title:
     #     rTitles.add((cEngAbbrev, 'uniso4'))
     #     rTitles.add((cEngAbbrev.replace('.', ''), 'uniso4'))
 
+    # Drop disallowed titles before any query, then fetch all redirect
+    # variants (and talk pages) at once.
+    rTitles = {(rTitle, rType) for (rTitle, rType) in rTitles
+               if isAllowedTitle(rTitle + ' (journal)'
+                                 if addJournal and (rType != 'iso4')
+                                 else rTitle)}
+    rAllTitles = [rTitle + ' (journal)'
+                  if addJournal and (rType != 'iso4') else rTitle
+                  for (rTitle, rType) in rTitles]
+    prefetchPageStates(rAllTitles + ['Talk:' + t for t in rAllTitles])
+
     # Skip if any of the redirect variants exists and is unfixable.
     for (rTitle, rType) in rTitles:
         if addJournal and (rType != 'iso4'):
@@ -224,6 +390,47 @@ def doOmicsRedirects(title: str,
         createOrFixOmicsRedirect(rTitle, rType, config, tryOnly=False)
 
 
+def getTitleVariants(title: str,
+                     lang: Optional[str] = None) -> Set[Tuple[str, str]]:
+    """Return redirect titles to create for `title`, without ISO-4 ones.
+
+    Each is given together with its type ('plain', 'and', 'the', 'theand').
+    `title` should already have the '(journal)' disambiguation removed.
+    """
+    rTitles = set([(title, 'plain')])
+
+    # Handle 'and' vs '&' variant.
+    if ' and ' in title:
+        rTitles.add((title.replace(' and ', ' & '), 'and'))
+    elif ' & ' in title and 'Acta' not in title:
+        rTitles.add((title.replace(' & ', ' and '), 'and'))
+
+    # Handle variant without 'The' at the beginning.
+    if title.startswith('The '):
+        rTitle = title.replace('The ', '')
+        rTitles.add((rTitle, 'the'))
+        if ' and ' in rTitle:
+            rTitles.add((rTitle.replace(' and ', ' & '), 'theand'))
+        elif ' & ' in rTitle:
+            if not lang or 'eng' in lang:
+                rTitles.add((rTitle.replace(' & ', ' and '), 'theand'))
+    return rTitles
+
+
+def getAbbrevLanguage(lang: Optional[str]) -> Optional[str]:
+    """Return the abbrevISO language string for a list's language code."""
+    if lang == 'ger':
+        return 'ger,eng,fra,lat'
+    return lang
+
+
+def getAbbrevVariants(title: str, cAbbrev: str) -> Set[Tuple[str, str]]:
+    """Return ISO-4 redirect titles (dotted and dotless) for `title`."""
+    if cAbbrev == title:
+        return set()
+    return set([(cAbbrev, 'iso4'), (cAbbrev.replace('.', ''), 'iso4')])
+
+
 def doOmicsHatnotes(title: str, publisher: str) -> None:
     """Create hatnotes for given OMICS journal."""
     # Create hatnotes for misleading (predatory) titles.
@@ -242,20 +449,20 @@ def doOmicsHatnotes(title: str, publisher: str) -> None:
         if title.endswith(s):
             aTitle = title[:-len(s)].strip()
     if aTitle:
-        aPage = pywikibot.Page(Site(), aTitle)
-        if aPage.exists():
+        aState = getPageState(aTitle)
+        if aState.exists:
             isJournal = False
-            for cat in aPage.categories():
+            for cat in pywikibot.Page(Site(), aTitle).categories():
                 if 'journal' in cat.title().lower():
                     isJournal = True
                     break
             if isJournal:
-                if not aPage.isRedirectPage():
+                if not aState.isRedirect():
                     addOmicsHatnote(aTitle, title, publisher)
             else:
                 aTitle = aTitle + ' (journal)'
-                aPage = pywikibot.Page(Site(), aTitle)
-                if aPage.exists() and not aPage.isRedirectPage():
+                aState = getPageState(aTitle)
+                if aState.exists and not aState.isRedirect():
                     addOmicsHatnote(aTitle, title, publisher)
 
 
@@ -277,7 +484,8 @@ def createOrFixOmicsRedirect(title: str, rType: str,
     """Attempt to create or fix redirect from [[title]] to [[target]].
 
     We return 'create' if non-existing, 'done' if basically equal to what we
-    would add, 'fix' if exists but looks fixable, 'unfixable' otherwise.
+    would add, 'fix' if exists but looks fixable, 'unfixable' otherwise,
+    'ignore' if the title can't be created (e.g. it's blacklisted).
     Also create talk page with {{WPJournals}} when non-existing.
     """
     rText = '#REDIRECT[[' + config.rTarget + ']]\n'
@@ -301,9 +509,12 @@ def createOrFixOmicsRedirect(title: str, rType: str,
     if rType == 'iso4':
         rNewContent += '{{R from ISO 4}}\n'
 
+    if not isAllowedTitle(title):
+        return 'ignore'
     rPage = pywikibot.Page(Site(), title)
     rTalkPage = rPage.toggleTalkPage()
-    if not rPage.exists():
+    rState = getPageState(title)
+    if not rState.exists:
         if rType == 'uniso4':
             return 'ignore'
         if not tryOnly:
@@ -311,19 +522,20 @@ def createOrFixOmicsRedirect(title: str, rType: str,
             trySaving(rPage, rNewContent,
                       'Create redirect from journal to publisher.',
                       overwrite=False, limitType='create')
-            if rType == 'plain' and not rTalkPage.exists():
+            if rType == 'plain' \
+                    and not getPageState(rTalkPage.title()).exists:
                 content = '{{WPJournals|class=redirect}}'
                 trySaving(rTalkPage, content,
                           'Mark new redirect into {{WPJournals}}.',
                           overwrite=False, limitType='talk')
         return 'create'
     # If rPage exists, check if we would add basically the same.
-    text = rPage.text
+    text = rState.text or ''
     textStripped = re.sub(r'\s', '', text, re.M).strip()
     rNewStripped = re.sub(r'\s', '', rNewContent, re.M).strip()
     if textStripped == rNewStripped:
         if not tryOnly:
-            if rTalkPage.exists():
+            if getPageState(rTalkPage.title()).exists:
                 print(f'Done: [[{title}]].')
             elif rType == 'plain':
                 print(f'Done, but creating talk page: [[{title}]].')
@@ -346,7 +558,7 @@ def createOrFixOmicsRedirect(title: str, rType: str,
     if textStripped != rTextStripped:
         print(f'Not fixable: [[{title}]]  (type={rType}).')
         print('---IS-------------')
-        print(rPage.text)
+        print(rState.text)
         print('---SHOULD BE------')
         print(rNewContent)
         print('==================')
@@ -357,14 +569,14 @@ def createOrFixOmicsRedirect(title: str, rType: str,
             print(f'Removing iso4 tag from: [[{title}]].')
         print(f'Fixing redirect from: [[{title}]] (type={rType}).')
         print('---WAS------------')
-        print(rPage.text)
+        print(rState.text)
         print('---WILL BE--------')
         print(rNewContent)
         print('==================')
         trySaving(rPage, rNewContent,
                   'Fix redirect from journal to publisher.',
                   overwrite=True, limitType='fix')
-        if rType == 'plain' and not rTalkPage.exists():
+        if rType == 'plain' and not getPageState(rTalkPage.title()).exists:
             content = '{{WPJournals|class=redirect}}'
             trySaving(rTalkPage, content,
                       'Fix redirect from journal to publisher.',
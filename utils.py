@@ -1,12 +1,28 @@
 """Various common utils shared by the bots."""
+import atexit
+import cProfile
+import gzip
+import json
+import math
+import os
 import re
-from typing import Dict, Iterator, Optional, Set
+import sys
+import sysconfig
+import threading
+import time
+import tracemalloc
+import urllib.parse
+from contextlib import contextmanager
+from datetime import datetime
+from typing import IO, Any, Dict, Iterable, Iterator, List, NamedTuple, \
+    Optional, Pattern, Set, Tuple, TypeVar
 import unicodedata
 
 import mwparserfromhell
 import pywikibot
 import pywikibot.data.api
 import pywikibot.exceptions
+import pywikibot.throttle
 from pywikibot import Site
 
 
@@ -89,20 +105,653 @@ def trySaving(page: pywikibot.Page,
     _editsDone[limitType] += 1
     if _onlySimulateEdits:
         return False
+    invalidatePage(page.title())
     page.text = content
     summary = (f'[[Wikipedia:Bots/Requests_for_approval/'
                f'{_botName}_{_brfaNumber}|({_brfaNumber})]] '
                f'{summary} [[User talk:TokenzeroBot|Report problems]]')
-    page.save(summary,
-              minor=False,
-              botflag=True,
-              watch="nochange",
-              createonly=False if overwrite else True,
-              nocreate=True if overwrite else False,
-              tags='bot trial' if _botTrial else None)
+    with phase('save'):
+        page.save(summary,
+                  minor=False,
+                  botflag=True,
+                  watch="nochange",
+                  createonly=False if overwrite else True,
+                  nocreate=True if overwrite else False,
+                  tags='bot trial' if _botTrial else None)
     return True
 
 
+class PageState(NamedTuple):
+    """Cached state of a page at its latest revision, see `getPageState()`."""
+
+    title: str
+    exists: bool
+    # Target title (with anchor, if any) if the page is a redirect.
+    redirectTarget: Optional[str]
+    revid: Optional[int]
+    text: Optional[str]  # None if the page does not exist.
+    # Of the latest revision, None if the page does not exist.
+    timestamp: Optional[pywikibot.Timestamp] = None
+
+    def isRedirect(self) -> bool:
+        """Return whether the page is a redirect."""
+        return self.redirectTarget is not None
+
+
+# Page-state cache for this run, keyed by normalized title. Pages are only
+# cached when fetched for their state (not when enumerated, e.g. by
+# `getPagesWithTemplate()`), so it stays small even over a full scrape.
+_pageCache: Dict[str, PageState] = {}
+_pageCacheStats: Dict[str, int] = {'hits': 0, 'misses': 0, 'invalidated': 0}
+
+
+def cachePage(page: pywikibot.Page) -> Optional[PageState]:
+    """Save the state of a page whose content was already fetched.
+
+    Returns None (caching nothing) if the content was not fetched.
+    """
+    if page.exists() and not page.has_content():
+        return None
+    pageState = PageState(title=page.title(),
+                          exists=False,
+                          redirectTarget=None,
+                          revid=None,
+                          text=None)
+    if page.exists():
+        pageState = pageState._replace(
+            exists=True,
+            redirectTarget=parseRedirectTarget(page.text),
+            revid=page.latest_revision_id,
+            text=page.text,
+            timestamp=page.latest_revision.timestamp)
+    _pageCache[normalizeTitle(page.title())] = pageState
+    return pageState
+
+
+def getPageState(title: str) -> PageState:
+    """Return the state of a page, fetching it only if not cached yet."""
+    key = normalizeTitle(title)
+    if key in _pageCache:
+        _pageCacheStats['hits'] += 1
+        return _pageCache[key]
+    _pageCacheStats['misses'] += 1
+    page = pywikibot.Page(Site(), title)
+    if page.exists():
+        page.text  # pylint: disable=pointless-statement
+    pageState = cachePage(page)
+    assert pageState is not None
+    return pageState
+
+
+def prefetchPageStates(titles: Iterable[str]) -> None:
+    """Fetch the state of all given pages not cached yet, in batches."""
+    pages = []
+    for title in sorted(set(titles)):
+        if normalizeTitle(title) in _pageCache:
+            continue
+        try:
+            pages.append(pywikibot.Page(Site(), title))
+        except pywikibot.exceptions.InvalidTitle:
+            continue
+    for page in Site().preloadpages(pages, content=True):
+        cachePage(page)
+
+
+def getExistingTitles(titles: Iterable[str]) -> Set[str]:
+    """Return which of given titles exist, fetched in batches.
+
+    Cached states are used when available, other pages are only queried for
+    existence (without content) and not cached.
+    """
+    result = set()
+    # Dict from normalized title to given titles not cached.
+    uncached: Dict[str, List[str]] = {}
+    for title in sorted(set(titles)):
+        key = normalizeTitle(title)
+        if key in _pageCache:
+            if _pageCache[key].exists:
+                result.add(title)
+        else:
+            uncached.setdefault(key, []).append(title)
+    pages = []
+    for key in uncached:
+        try:
+            pages.append(pywikibot.Page(Site(), key))
+        except pywikibot.exceptions.InvalidTitle:
+            continue
+    for page in Site().preloadpages(pages, content=False):
+        if page.exists():
+            result.update(uncached.get(normalizeTitle(page.title()), []))
+    return result
+
+
+def refreshPageStates(titles: Iterable[str]) -> None:
+    """Make sure cached states of given pages are current, in batches.
+
+    Only the latest revids of cached pages are fetched: a cached state is
+    kept if the revid matches, otherwise the page is fetched again (together
+    with pages not cached yet).
+    """
+    pages = []
+    stale = []
+    for title in sorted(set(titles)):
+        if normalizeTitle(title) not in _pageCache:
+            stale.append(title)
+            continue
+        try:
+            pages.append(pywikibot.Page(Site(), title))
+        except pywikibot.exceptions.InvalidTitle:
+            continue
+    for page in Site().preloadpages(pages, content=False):
+        revid = page.latest_revision_id if page.exists() else None
+        if _pageCache[normalizeTitle(page.title())].revid == revid:
+            countStat('pageStatesReused')
+        else:
+            invalidatePage(page.title())
+            stale.append(page.title())
+    prefetchPageStates(stale)
+
+
+def invalidatePage(title: str) -> None:
+    """Forget the cached state of a page, e.g. because we edited it."""
+    if _pageCache.pop(normalizeTitle(title), None) is not None:
+        _pageCacheStats['invalidated'] += 1
+
+
+# Title filter, see `isAllowedTitle()`, loaded once per run.
+_titleBlacklist: Optional['TitleBlacklist'] = None
+# Dict from reason to titles rejected by `isAllowedTitle()`.
+_titlesRejected: Dict[str, Set[str]] = {}
+
+
+class TitleBlacklist:
+    """Title blacklist and local title rules, compiled into regexes.
+
+    Parses MediaWiki:Titleblacklist and MediaWiki:Titlewhitelist, see:
+        https://www.mediawiki.org/wiki/Extension:TitleBlacklist
+    Entries are matched like MediaWiki does, against the whole title
+    (with the first letter capitalized, on first-letter wikis),
+    case-insensitively unless <casesensitive>; a whitelist match overrides
+    a blacklist one. Entries that only apply to moves, uploads, new accounts
+    or non-autoconfirmed users are ignored, as are ones that Python's `re`
+    can't compile (e.g. using \\p{..}).
+    """
+
+    def __init__(self, blacklistText: str,
+                 namespacePrefixes: Iterable[str],
+                 firstLetterCase: bool = True,
+                 whitelistText: str = '') -> None:
+        self.firstLetterCase = firstLetterCase
+        self.nEntries = 0
+        self.nSkipped = 0
+        self.blacklist = self._compile(blacklistText)
+        self.whitelist = self._compile(whitelistText)
+        prefixes = sorted(set(p.lower() for p in namespacePrefixes if p))
+        self.prefixes = re.compile(
+            r'(?i)^\s*(' + '|'.join(map(re.escape, prefixes)) + r')\s*:')
+
+    def _compile(self, text: str) -> List[Pattern[str]]:
+        """Compile a list's entries into a combined regex and separate ones.
+
+        Returns the regexes; a title is on the list iff one of them matches.
+        """
+        entries: List[str] = []
+        separate: List[Pattern[str]] = []
+        for line in text.splitlines():
+            line = re.sub(r'(?<!\\)#.*', '', line).strip()
+            m = re.fullmatch(r'(.*?)\s*(?:<([^<>]*)>)?', line)
+            if not m or not m.group(1):
+                continue
+            regex = m.group(1)
+            flags = [f.strip().lower() for f in (m.group(2) or '').split('|')]
+            if any(f in ('autoconfirmed', 'moveonly', 'newaccountonly',
+                         'reupload') for f in flags):
+                continue
+            if 'casesensitive' not in flags:
+                regex = '(?i:' + regex + ')'
+            try:
+                compiled = re.compile('(?s)^(?:' + regex + ')$')
+            except re.error:
+                self.nSkipped += 1
+                continue
+            # Backreferences would be renumbered in the combined regex.
+            if re.search(r'\\[1-9]|\(\?P?<', regex):
+                separate.append(compiled)
+            else:
+                entries.append(regex)
+        self.nEntries += len(entries) + len(separate)
+        if entries:
+            separate.insert(
+                0, re.compile('(?s)^(?:' + '|'.join(entries) + ')$'))
+        return separate
+
+    def getRejectReason(self, title: str) -> Optional[str]:
+        """Return why `title` can't be created (in mainspace), or None."""
+        if not title.strip():
+            return 'empty'
+        if len(title.encode('utf-8')) > 255:
+            return 'length'
+        if re.search(r'[#<>\[\]|{}\x00-\x1f\x7f\ufffd]|~~~|%[0-9A-Fa-f]{2}'
+                     r'|&[A-Za-z0-9#\x80-\uffff]+;'
+                     r'|^\.\.?(/|$)|/\.\.?(/|$)|^:', title):
+            return 'illegal characters'
+        # The first letter is capitalized by MediaWiki, so the blacklist
+        # is matched against the title that would actually be created.
+        if self.firstLetterCase:
+            title = capitalizeFirst(title)
+        if self.prefixes.match(title):
+            return 'namespace prefix'
+        if any(p.match(title) for p in self.blacklist) \
+                and not any(p.match(title) for p in self.whitelist):
+            return 'blacklist'
+        return None
+
+
+def loadTitleBlacklist() -> 'TitleBlacklist':
+    """Fetch and compile the title blacklist and whitelist, once per run."""
+    global _titleBlacklist  # pylint: disable=global-statement
+    if _titleBlacklist is None:
+        text = pywikibot.Page(Site(), 'MediaWiki:Titleblacklist').text
+        whitelistText = pywikibot.Page(Site(), 'MediaWiki:Titlewhitelist').text
+        prefixes: List[str] = []
+        for ns in Site().namespaces.values():
+            if ns.id != 0:
+                prefixes.extend([ns.custom_name, ns.canonical_name])
+                prefixes.extend(ns.aliases)
+        prefixes.extend(i['prefix'] for i in Site().siteinfo['interwikimap'])
+        _titleBlacklist = TitleBlacklist(
+            text, prefixes, Site().siteinfo['case'] == 'first-letter',
+            whitelistText)
+        print(f'Loaded title blacklist: {_titleBlacklist.nEntries} entries '
+              f'({_titleBlacklist.nSkipped} skipped).', flush=True)
+    return _titleBlacklist
+
+
+def isAllowedTitle(title: str) -> bool:
+    """Return whether the bot may create a mainspace page titled `title`.
+
+    This is checked locally (against the title blacklist and MediaWiki's
+    title rules), so call it before any existence query or save.
+    Rejected titles are printed and counted, see `printRunStats()`.
+    """
+    reason = loadTitleBlacklist().getRejectReason(title)
+    if reason is None:
+        return True
+    print(f'Skipping (title {reason}): {title}')
+    _titlesRejected.setdefault(reason, set()).add(title)
+    return False
+
+
+# Counters of work done in this run (pages scanned, API requests, ...).
+_counters: Dict[str, int] = {}
+# Environment variable naming a file to which `dumpRunStats()` writes.
+STATS_FILE_ENV = 'TOKENZERO_STATS_FILE'
+
+
+def countStat(name: str, n: int = 1) -> None:
+    """Add `n` to counter `name`, see `printRunStats()`."""
+    _counters[name] = _counters.get(name, 0) + n
+
+
+def getRunStats() -> Dict[str, object]:
+    """Return statistics of the run as a json-serializable dict."""
+    return {
+        'editsDone': _editsDone,
+        'counters': _counters,
+        'titlesRejected': {reason: len(titles)
+                           for reason, titles in _titlesRejected.items()},
+        'pageCache': dict(_pageCacheStats, size=len(_pageCache)),
+        'api': _apiStats,
+        'phases': _phaseStats
+    }
+
+
+@atexit.register
+def dumpRunStats() -> None:
+    """Write run statistics to the file named in $TOKENZERO_STATS_FILE.
+
+    Registered to run at exit, so that the cron script can collect counters
+    of each job. Does nothing if the variable is not set.
+    """
+    fileName = os.environ.get(STATS_FILE_ENV)
+    if not fileName:
+        return
+    with open(fileName, 'wt') as f, _apiStatsLock:
+        json.dump(getRunStats(), f)
+
+
+# API request stats, by calling bot function and by kind of request,
+# see `_instrumentApi()`.
+_apiStats: Dict[str, Dict[str, Dict[str, Any]]] = {}
+_apiStatsLock = threading.Lock()
+# The stats record of the request being submitted in the current thread.
+_apiLocal = threading.local()
+_PYWIKIBOT_DIR = os.path.dirname(pywikibot.__file__)
+_STDLIB_DIR = sysconfig.get_paths()['stdlib']
+
+
+def _apiCaller() -> str:
+    """Return name of the innermost function outside pywikibot and utils."""
+    frame = sys._getframe(2)  # pylint: disable=protected-access
+    while frame is not None:
+        fileName = frame.f_code.co_filename
+        if not (fileName == __file__
+                or fileName.startswith(_PYWIKIBOT_DIR)
+                or fileName.startswith(_STDLIB_DIR)):
+            return frame.f_code.co_name
+        frame = frame.f_back
+    return '?'
+
+
+def _apiRequestKind(request: pywikibot.data.api.Request) -> str:
+    """Return short description of request, like 'query(list=embeddedin)'."""
+    if request.action != 'query':
+        return request.action
+    modules = []
+    for key in ['generator', 'list', 'prop', 'meta']:
+        values = request._params.get(key)  # pylint: disable=protected-access
+        if values:
+            modules.append(f'{key}={"|".join(sorted(map(str, values)))}')
+    return f'query({", ".join(modules)})'
+
+
+def _apiRecord(caller: str, kind: str) -> Dict[str, Any]:
+    """Return the (mutable) stats record for given caller and kind."""
+    with _apiStatsLock:
+        byKind = _apiStats.setdefault(caller, {})
+        if kind not in byKind:
+            byKind[kind] = {
+                'requests': 0,  # Calls to Request.submit().
+                'errors': 0,  # Of which raised.
+                'retries': 0,  # HTTP requests beyond one per submit().
+                'seconds': 0.0,  # Total in submit(), including waits.
+                'httpSeconds': 0.0,  # Total in HTTP requests.
+                'throttleSeconds': 0.0,  # Total waiting for the throttle.
+                'maxlagWaits': 0,
+                'maxlagSeconds': 0.0,
+                'bytes': 0,  # Total size of response bodies.
+                # Number of HTTP requests that took at most k milliseconds,
+                # for k a power of two.
+                'latencyHistogram': {}
+            }
+        return byKind[kind]
+
+
+def _addToApiRecord(key: str, value: float) -> None:
+    """Add value to a field of the current thread's API stats record."""
+    record = getattr(_apiLocal, 'record', None)
+    if record is not None:
+        with _apiStatsLock:
+            record[key] += value
+
+
+# Environment variable naming a gzipped JSON-lines file (a cassette) to which
+# read requests and their responses are appended, see `benchmarks/replay.py`.
+CASSETTE_FILE_ENV = 'TOKENZERO_CASSETTE_FILE'
+# Request params that vary between runs or users, ignored when replaying.
+CASSETTE_IGNORED_PARAMS = {'assert', 'assertuser', 'curtimestamp', 'maxlag',
+                           'requestid', 'token'}
+_cassette: Optional[IO[str]] = None
+_cassetteLock = threading.Lock()
+
+
+def cassetteKey(paramstring: str) -> str:
+    """Return the urlencoded request params, sorted, without ignored ones."""
+    params = [(k, v) for k, v in urllib.parse.parse_qsl(
+        paramstring, keep_blank_values=True)
+        if k not in CASSETTE_IGNORED_PARAMS]
+    return urllib.parse.urlencode(sorted(params))
+
+
+def _isRecordable(request: pywikibot.data.api.Request) -> bool:
+    """Return whether the request only reads and returns no secrets."""
+    if request.write or request.action in ['login', 'clientlogin', 'logout']:
+        return False
+    meta = request._params.get('meta')  # pylint: disable=protected-access
+    return 'tokens' not in map(str, meta or [])
+
+
+def _recordToCassette(paramstring: str, useGet: bool, response: Any,
+                      seconds: float) -> None:
+    """Append a request and its response to $TOKENZERO_CASSETTE_FILE."""
+    global _cassette  # pylint: disable=global-statement
+    entry = {'key': cassetteKey(paramstring),
+             'method': 'GET' if useGet else 'POST',
+             'seconds': round(seconds, 4),
+             'status': response.status_code,
+             'contentType': response.headers.get('Content-Type', ''),
+             'body': response.text}
+    with _cassetteLock:
+        if _cassette is None:
+            _cassette = gzip.open(os.environ[CASSETTE_FILE_ENV], 'at',
+                                  encoding='utf-8')
+            atexit.register(_cassette.close)
+        _cassette.write(json.dumps(entry) + '\n')
+
+
+def _instrumentApi() -> None:
+    """Wrap pywikibot's API request path to collect stats, see `_apiStats`.
+
+    Each `Request.submit()` is attributed to the innermost calling function
+    outside pywikibot and this module (e.g. `scrapePage`), so requests made
+    by generators are attributed to the function iterating them.
+    If $TOKENZERO_CASSETTE_FILE is set, read requests are also recorded there.
+    """
+    api = pywikibot.data.api
+    throttle = pywikibot.throttle.Throttle
+    submit = api.Request.submit
+    # pylint: disable=protected-access
+    httpRequest = api.Request._http_request
+    throttleCall = throttle.__call__
+    throttleLag = throttle.lag
+
+    def instrumentedSubmit(self: api.Request) -> dict:
+        countStat('apiRequests')
+        record = _apiRecord(_apiCaller(), _apiRequestKind(self))
+        outerRecord = getattr(_apiLocal, 'record', None)
+        outerHttpCount = getattr(_apiLocal, 'httpCount', 0)
+        _apiLocal.record, _apiLocal.httpCount = record, 0
+        start = time.perf_counter()
+        try:
+            return submit(self)
+        except Exception:
+            _addToApiRecord('errors', 1)
+            raise
+        finally:
+            with _apiStatsLock:
+                record['requests'] += 1
+                record['seconds'] += time.perf_counter() - start
+                record['retries'] += max(0, _apiLocal.httpCount - 1)
+            _apiLocal.record = outerRecord
+            _apiLocal.httpCount = outerHttpCount
+
+    def instrumentedHttpRequest(self: api.Request, useGet: bool, uri: str,
+                                data: Any, headers: Any,
+                                paramstring: str) -> Any:
+        start = time.perf_counter()
+        response, newUseGet = httpRequest(self, useGet, uri, data, headers,
+                                          paramstring)
+        seconds = time.perf_counter() - start
+        if response is not None and os.environ.get(CASSETTE_FILE_ENV) \
+                and _isRecordable(self):
+            _recordToCassette(paramstring, useGet, response, seconds)
+        _apiLocal.httpCount = getattr(_apiLocal, 'httpCount', 0) + 1
+        record = getattr(_apiLocal, 'record', None)
+        if record is not None:
+            ms = max(1.0, seconds * 1000)
+            bucket = str(2 ** math.ceil(math.log2(ms)))
+            with _apiStatsLock:
+                record['httpSeconds'] += seconds
+                if response is not None:
+                    record['bytes'] += len(response.content)
+                histogram = record['latencyHistogram']
+                histogram[bucket] = histogram.get(bucket, 0) + 1
+        return response, newUseGet
+
+    def instrumentedThrottleCall(self: throttle, *args: Any,
+                                 **kwargs: Any) -> None:
+        start = time.perf_counter()
+        throttleCall(self, *args, **kwargs)
+        _addToApiRecord('throttleSeconds', time.perf_counter() - start)
+
+    def instrumentedThrottleLag(self: throttle, *args: Any,
+                                **kwargs: Any) -> None:
+        start = time.perf_counter()
+        throttleLag(self, *args, **kwargs)
+        _addToApiRecord('maxlagWaits', 1)
+        _addToApiRecord('maxlagSeconds', time.perf_counter() - start)
+
+    api.Request.submit = instrumentedSubmit
+    api.Request._http_request = instrumentedHttpRequest
+    throttle.__call__ = instrumentedThrottleCall
+    throttle.lag = instrumentedThrottleLag
+
+
+_instrumentApi()
+
+
+# Stats of named phases of the run, see `phase()`.
+_phaseStats: Dict[str, Dict[str, float]] = {}
+_runStart = time.perf_counter()
+# Profiler started by `initProfiling()`, if any, and the script name.
+_profiler: Optional[cProfile.Profile] = None
+_profileName = ''
+PROFILE_DIR = 'profiles'
+
+T = TypeVar('T')
+
+
+def initProfiling(scriptName: str) -> None:
+    """Handle the `--profile[=cpu,mem]` option of a bot entry point.
+
+    Removes the option from `sys.argv`. If given, runs cProfile ('cpu',
+    the default) and/or tracemalloc ('mem'), and writes the profile and the
+    table of phases (see `phase()`) to PROFILE_DIR at exit.
+    """
+    global _profiler, _profileName  # pylint: disable=global-statement
+    modes: Optional[List[str]] = None
+    for arg in sys.argv[1:]:
+        if arg == '--profile':
+            modes = ['cpu']
+        elif arg.startswith('--profile='):
+            modes = arg[len('--profile='):].split(',')
+    if modes is None:
+        return
+    sys.argv[1:] = [a for a in sys.argv[1:]
+                    if a != '--profile' and not a.startswith('--profile=')]
+    _profileName = scriptName
+    if 'mem' in modes:
+        tracemalloc.start()
+    if 'cpu' in modes:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    atexit.register(_writeProfile)
+
+
+def _writeProfile() -> None:
+    """Write profile, phase table and memory stats to PROFILE_DIR."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    baseName = f'{PROFILE_DIR}/{_profileName}-{stamp}'
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(baseName + '.prof')
+        print(f'Profile written: {baseName}.prof')
+    with open(baseName + '.txt', 'wt') as f:
+        f.write('\n'.join(formatPhaseStats()) + '\n')
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            f.write(f'\ntraced memory: current={current / 2**20:.1f}MB '
+                    f'peak={peak / 2**20:.1f}MB\n')
+            snapshot = tracemalloc.take_snapshot()
+            for stat in snapshot.statistics('lineno')[:25]:
+                f.write(f'{stat}\n')
+    print(f'Phase table written: {baseName}.txt')
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time the enclosed code as part of the phase `name`.
+
+    Phases may be nested; times are inclusive. Memory allocated (net) is
+    recorded only when tracemalloc is running (`--profile=mem`).
+    """
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    mem = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+    try:
+        yield
+    finally:
+        record = _phaseStats.setdefault(
+            name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'allocated': 0})
+        record['calls'] += 1
+        record['wall'] += time.perf_counter() - wall
+        record['cpu'] += time.process_time() - cpu
+        if mem:
+            record['allocated'] += tracemalloc.get_traced_memory()[0] - mem
+
+
+def timedIter(iterable: Iterable[T], name: str) -> Iterator[T]:
+    """Yield from `iterable`, timing each step as part of phase `name`.
+
+    Useful for generators that fetch lazily, like `getPagesWithTemplate()`.
+    """
+    iterator = iter(iterable)
+    while True:
+        with phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def formatPhaseStats() -> List[str]:
+    """Return lines of a table of phase stats (see `phase()`)."""
+    total = time.perf_counter() - _runStart
+    lines = [f'{"phase":<24} {"calls":>7} {"wall s":>9} {"cpu s":>9} '
+             f'{"% run":>6} {"alloc MB":>9}']
+    for name, r in sorted(_phaseStats.items(), key=lambda x: -x[1]['wall']):
+        lines.append(f'{name[:24]:<24} {r["calls"]:>7} {r["wall"]:>9.1f} '
+                     f'{r["cpu"]:>9.1f} {100 * r["wall"] / total:>6.1f} '
+                     f'{r["allocated"] / 2**20:>9.1f}')
+    lines.append(f'{"(total run)":<24} {"":>7} {total:>9.1f} '
+                 f'{time.process_time():>9.1f}')
+    return lines
+
+
+def printApiStats() -> None:
+    """Print a table of API request stats, by caller and kind."""
+    if not _apiStats:
+        return
+    print(f'{"caller":<24} {"request":<48} {"n":>6} {"retry":>5} '
+          f'{"lag":>4} {"avg ms":>7} {"wait s":>7} {"MB":>7}')
+    with _apiStatsLock:
+        for caller, byKind in sorted(_apiStats.items()):
+            for kind, r in sorted(byKind.items()):
+                nHttp = max(1, r['requests'] + r['retries'])
+                avg = 1000 * r['httpSeconds'] / nHttp
+                wait = r['throttleSeconds'] + r['maxlagSeconds']
+                print(f'{caller[:24]:<24} {kind[:48]:<48} {r["requests"]:>6} '
+                      f'{r["retries"]:>5} {r["maxlagWaits"]:>4} {avg:>7.0f} '
+                      f'{wait:>7.1f} {r["bytes"] / 2**20:>7.2f}')
+
+
+def printRunStats() -> None:
+    """Print statistics of the run: edits, rejected titles, cache, API."""
+    print('-----------STATS-------------')
+    print('editsDone', _editsDone)
+    print('counters', _counters)
+    print('titlesRejected',
+          {reason: len(titles) for reason, titles in _titlesRejected.items()})
+    nQueries = _pageCacheStats['hits'] + _pageCacheStats['misses']
+    print('pageCache', _pageCacheStats, f'size={len(_pageCache)}',
+          f'hitRate={_pageCacheStats["hits"] / (nQueries or 1):.1%}')
+    printApiStats()
+    print('\n'.join(formatPhaseStats()))
+    print('-----------------------------')
+
+
 def tryPurging(page: pywikibot.Page) -> bool:
     """Purge page cache at Wikipedia, unless _onlySimulateEdits."""
     if _onlySimulateEdits:
@@ -114,6 +763,28 @@ def tryPurging(page: pywikibot.Page) -> bool:
         return False
 
 
+def normalizeTitle(title: str) -> str:
+    """Normalize a mainspace title like MediaWiki does, without API calls.
+
+    That is, underscores become spaces, whitespace is collapsed and stripped,
+    and the first letter is capitalized.
+    """
+    title = re.sub(r'[\s_]+', ' ', title).strip()
+    return capitalizeFirst(title)
+
+
+def capitalizeFirst(title: str) -> str:
+    """Capitalize the first letter, like MediaWiki does for titles.
+
+    Unlike `str.upper()`, this never changes the length: letters whose
+    uppercase is several characters (e.g. 'ß' -> 'SS') are kept as is.
+    """
+    first = title[:1].upper()
+    if len(first) != 1:
+        return title
+    return first + title[1:]
+
+
 def getCategoryAsSet(name: str, recurse: bool = True, namespaces: int = 0) \
         -> Set[str]:
     """Get all titles of pages in given category as a set().
@@ -152,11 +823,14 @@ def getPagesWithTemplate(name: str, content: bool = False) \
     ns = Site().namespaces['Template']
     template = pywikibot.Page(Site(), name, ns=ns)
     assert template.exists()
-    return template.embeddedin(
+    pages = template.embeddedin(
         filter_redirects=False,  # Omit redirects
         namespaces=0,            # Mainspace only
         total=_listLimit,       # Limit total number of pages outputed
         content=content)         # Whether to immediately fetch content
+    for page in pages:
+        countStat('pagesScanned')
+        yield page
     # Another way to get pages including a template is the following wrapper:
     #   from pywikibot import pagegenerators as pg
     #   gen = pg.ReferringPageGenerator(template, onlyTemplateInclusion=True)
@@ -188,9 +862,60 @@ def getRedirectsToPage(
     # Workaround bug: https://phabricator.wikimedia.org/T224246
     for page in gen:
         if page.namespace().id == namespaces:
+            countStat('redirectsScanned')
             yield page
 
 
+def getRedirectsToPages(
+        pageTitles: Iterable[str], namespaces: int = 0,
+        content: bool = False, groupSize: int = 50) \
+        -> Iterator[pywikibot.Page]:
+    """Yield all pages that are redirects to any of `pageTitles`.
+
+    Same as `getRedirectsToPage()`, but querying `groupSize` titles at a time.
+    The page each redirect points to is not given, get it from the content
+    with `parseRedirectTarget()`.
+    """
+    pageTitles = list(pageTitles)
+    for i in range(0, len(pageTitles), groupSize):
+        gen = Site()._generator(  # pylint: disable=protected-access
+            pywikibot.data.api.PageGenerator,
+            type_arg="redirects",
+            titles=pageTitles[i:i + groupSize],
+            grdprop="pageid|title|fragment",
+            namespaces=namespaces,
+            g_content=content)
+        # Workaround bug: https://phabricator.wikimedia.org/T224246
+        for page in gen:
+            if page.namespace().id == namespaces:
+                countStat('redirectsScanned')
+                yield page
+
+
+def parseRedirectTarget(text: str) -> Optional[str]:
+    """Return the normalized target of a redirect's wikitext, or None.
+
+    The target includes the anchor (after '#'), if the redirect has one.
+    """
+    m = re.match(r'\s*#\s*REDIRECT\s*:?\s*\[\[([^\[\]\|]+)(\|[^\]]*)?\]\]',
+                 text, re.IGNORECASE)
+    if not m:
+        return None
+    target, _, anchor = m.group(1).partition('#')
+    target = normalizeTitle(target.lstrip().lstrip(':'))
+    return target + '#' + anchor.strip() if anchor else target
+
+
+def preloadPages(titles: Iterable[str], content: bool = False,
+                 categories: bool = False) -> Iterator[pywikibot.Page]:
+    """Yield pages with given titles, querying their info in batches.
+
+    With `categories`, page.categories() also needs no further API calls.
+    """
+    pages = [pywikibot.Page(Site(), title) for title in titles]
+    return Site().preloadpages(pages, content=content, categories=categories)
+
+
 def getInfoboxJournals(page: pywikibot.Page) \
         -> Iterator[Dict[str, str]]:
     """Yield all {{infobox journal}}s used in `page`.
@@ -204,14 +929,24 @@ def getInfoboxJournals(page: pywikibot.Page) \
     #   p = pywikibot.textlib.extract_templates_and_params(page.text)
     #   text = pywikibot.textlib.glue_template_and_params(p)
     p = mwparserfromhell.parse(unicodedata.normalize('NFC', page.text))
+    for _, infobox in getInfoboxJournalTemplates(p):
+        yield infobox
+
 
+def getInfoboxJournalTemplates(code: mwparserfromhell.wikicode.Wikicode) \
+        -> Iterator[Tuple[mwparserfromhell.nodes.Template, Dict[str, str]]]:
+    """Yield all {{infobox journal}}s in parsed wikitext, with their params.
+
+    Params are given as in `getInfoboxJournals()`; the templates can be
+    edited in place, to then save `str(code)`.
+    """
     # Iterate over {{infobox journal}} template instances on `page`.
     # We ignore synonims of [[Template:Infobox journals]], see:
     # https://en.wikipedia.org/w/index.php?title=Special:WhatLinksHere/Template:Infobox_journal&hidetrans=1&hidelinks=1
     # except for the other capitalization 'Infobox Journal'.
     # Note 'Infobox journal' is equivalent to 'infobox journal' to mediawiki
     # and hence mwpfh normalizes it (to capitalize the fisrt letter).
-    for t in p.filter_templates():
+    for t in code.filter_templates():
         if t.name.matches('infobox journal') or \
            t.name.matches('Infobox Journal'):
             infobox = {}
@@ -219,4 +954,4 @@ def getInfoboxJournals(page: pywikibot.Page) \
                 paramName = str(param.name).lower().strip()
                 infobox[paramName] = re.sub(r'<!--.*-->', '',
                                             str(param.value)).strip()
-            yield infobox
+            yield t, infobox
@@ -23,6 +23,7 @@ import utils
 def main() -> None:
     """Run the bot."""
     logging.basicConfig(level=logging.WARNING)
+    utils.initProfiling('variantBot')
     # Initialize pywikibot.
     assert Site().code == 'en'
     utils.initLimits(
@@ -32,9 +33,12 @@ def main() -> None:
         botTrial=False
     )
 
-    redirects = utils.getCategoryAsSet('Redirects from ISO 4 abbreviations',
-                                       recurse=False)
+    with utils.phase('enumeration'):
+        redirects = utils.getCategoryAsSet(
+            'Redirects from ISO 4 abbreviations', recurse=False)
     redirects = set(r for r in redirects if '.' in r)
+    with utils.phase('existence checks'):
+        utils.prefetchPageStates(redirects)
     for i, rTitle in enumerate(redirects):
         print(f'Doing {i}/{len(redirects)}: {rTitle}', flush=True)
         variants = getVariantRedirects(rTitle)
@@ -42,14 +46,14 @@ def main() -> None:
             print('Skip: no variants')
             continue
         print(f'Variants: {len(variants) - 2}')
-        rPage = pywikibot.Page(Site(), rTitle)
-        if not rPage.isRedirectPage():
+        rState = utils.getPageState(rTitle)
+        if not rState.isRedirect():
             print('Skip: not a redirect')
             continue
         if ':' in rTitle[:5]:
             print('Skip: colon in title.')
             continue
-        targetArticle = rPage.getRedirectTarget().title()
+        targetArticle = rState.redirectTarget or ''
         if 'Category:' in targetArticle:
             # goodVariants = getVariantRedirects(rTitle, True)
             # if len(goodVariants) == 4:
@@ -62,6 +66,7 @@ def main() -> None:
         for variant in variants:
             if variant != rTitle and variant != rTitle.replace('.', ''):
                 makeVariantRedirect(variant, targetArticle)
+    utils.printRunStats()
 
 
 def getVariantRedirects(rTitle: str, onlyGood: bool = False) -> List[str]:
@@ -123,9 +128,12 @@ def getVariantRedirects(rTitle: str, onlyGood: bool = False) -> List[str]:
         if replBad in rTitle:
             s = []
             t = []
-            for v in badVariantTitles:
-                rPage = pywikibot.Page(Site(), v)
-                if rPage.exists() and 'ISO' in rPage.text:
+            allowedTitles = [v for v in badVariantTitles
+                             if utils.isAllowedTitle(v)]
+            utils.prefetchPageStates(allowedTitles)
+            for v in allowedTitles:
+                rState = utils.getPageState(v)
+                if rState.exists and 'ISO' in (rState.text or ''):
                     s.append(v)
                 else:
                     t.append(v)
@@ -139,9 +147,10 @@ def getVariantRedirects(rTitle: str, onlyGood: bool = False) -> List[str]:
 
 def makeVariantRedirect(vTitle: str, targetArticle: str) -> bool:
     """Try creating a redirect from vTitle to targetArticle."""
-    rPage = pywikibot.Page(Site(), vTitle)
+    if not utils.isAllowedTitle(vTitle):
+        return False
     # Skip if the page already exists.
-    if rPage.exists():
+    if utils.getPageState(vTitle).exists:
         print('Skipping variant (already exists): ', vTitle)
         return False
     # Create the redirect.
@@ -181,6 +190,7 @@ def makeVariantRedirect(vTitle: str, targetArticle: str) -> bool:
     rNewContent = '#REDIRECT [[' + targetArticle + ']]\n'
     rNewContent += '{{R from abbreviation}}\n'
     summary = 'Redirect from variant abbreviation.'
+    rPage = pywikibot.Page(Site(), vTitle)
     return utils.trySaving(rPage, rNewContent, summary, overwrite=False)
 
 